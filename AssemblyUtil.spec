@@ -83,6 +83,43 @@ module AssemblyUtil {
     funcdef export_assembly_as_fasta(ExportParams params)
                 returns (ExportOutput output) authentication required;
 
+    /*
+        Parameters for get_contigs_as_fasta.
+
+        Required arguments:
+        ref - a reference to a KBaseGenomeAnnotations.Assembly object.
+
+        Optional arguments:
+        contig_ids - the IDs of the contigs to return, in the order they will be written to the
+            file. All the IDs must exist in the assembly. If not set, the contigs are written in
+            the order of the assembly's FASTA file.
+        min_length - only return contigs with at least this many bases.
+        max_length - only return contigs with at most this many bases.
+        min_gc - only return contigs with at least this GC content, from 0 to 1.
+        max_gc - only return contigs with at most this GC content, from 0 to 1.
+        filename - the name of the output file. Defaults to the assembly name followed by
+            '.contigs.fa'.
+
+        @optional contig_ids min_length max_length min_gc max_gc filename
+    */
+    typedef structure {
+        string ref;
+        list<string> contig_ids;
+        int min_length;
+        int max_length;
+        float min_gc;
+        float max_gc;
+        string filename;
+    } GetContigsParams;
+
+    /*
+        Given a reference to an Assembly and a set of contig IDs and / or filters, construct a
+        local FASTA file with only the selected contigs. The Assembly's FASTA file is cached and
+        indexed in the scratch space, so repeated calls only read the selected sequences.
+    */
+    funcdef get_contigs_as_fasta(GetContigsParams params)
+                returns (FastaAssemblyFile file) authentication required;
+
 
     typedef string ShockNodeId;
 
@@ -6,6 +6,7 @@ from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 from Bio.Alphabet import SingleLetterAlphabet
 
+from AssemblyUtil.ServiceClient import use_shared_session
 from installed_clients.DataFileUtilClient import DataFileUtil
 
 
@@ -13,7 +14,7 @@ class AssemblyToFasta:
 
     def __init__(self, callback_url, scratch):
         self.scratch = scratch
-        self.dfu = DataFileUtil(callback_url)
+        self.dfu = use_shared_session(DataFileUtil(callback_url))
 
 
     def export_as_fasta(self, params):
@@ -86,10 +87,14 @@ class AssemblyToFasta:
                     "fasta")
 
     def process_assembly(self, output_fasta_path, data):
-        self.dfu.shock_to_file({'handle_id': data['fasta_handle_ref'],
-                                'file_path': output_fasta_path,
-                                'unpack': 'uncompress'
-                                })
+        # the file may have been uploaded gzipped, in which case DFU uncompresses it and may
+        # change the file name
+        dl = self.dfu.shock_to_file({'handle_id': data['fasta_handle_ref'],
+                                     'file_path': output_fasta_path,
+                                     'unpack': 'uncompress'
+                                     })
+        if os.path.abspath(dl['file_path']) != os.path.abspath(output_fasta_path):
+            shutil.move(dl['file_path'], output_fasta_path)
 
     def validate_params(self, params):
         for key in ['ref']:
@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 #BEGIN_HEADER
 
+import atexit
 import os
 from pathlib import Path
 
-from AssemblyUtil.FastaToAssembly import FastaToAssembly, MAX_THREADS, THREADS_PER_CPU
+from AssemblyUtil.FastaToAssembly import (
+    FastaToAssembly, ImportWorkerPool, MAX_THREADS, THREADS_PER_CPU
+)
 from AssemblyUtil.AssemblyToFasta import AssemblyToFasta
+from AssemblyUtil.ContigExtractor import ContigExtractor, DEFAULT_CACHE_SIZE
+from AssemblyUtil.ServiceClient import DEFAULT_POOL_SIZE, set_pool_size, use_shared_session
 from AssemblyUtil.TypeToFasta import TypeToFasta
+from AssemblyUtil.WorkerPlan import available_cpus, max_workers
 from installed_clients.DataFileUtilClient import DataFileUtil
 from installed_clients.WorkspaceClient import Workspace
 
@@ -33,6 +39,16 @@ def _validate_threads_per_cpu_type(threads_count, var_name, default_val):
     except ValueError as e:
         raise ValueError(f"{var_name} must be an integer or decimal") from e
     return threads_count
+
+
+def _validate_bool_type(value, var_name, default_val):
+    if value is None:
+        print(f"Cannot retrieve {var_name} from the catalog, set {var_name}={default_val}")
+        return default_val
+    print(f"Successfully retrieve {var_name} from the catalog!")
+    if value.strip().lower() not in ('true', 'false', '1', '0'):
+        raise ValueError(f"{var_name} must be true, false, 1 or 0")
+    return value.strip().lower() in ('true', '1')
 #END_HEADER
 
 
@@ -51,7 +67,7 @@ class AssemblyUtil:
     # state. A method could easily clobber the state set by another while
     # the latter method is running.
     ######################################### noqa
-    VERSION = "3.1.1"
+    VERSION = "3.2.0"
     GIT_URL = "git@github.com:kbaseapps/AssemblyUtil.git"
     GIT_COMMIT_HASH = "b8ec572828e81b81be9f434b8189c2e8771bca33"
 
@@ -71,6 +87,71 @@ class AssemblyUtil:
         threads_per_cpu = os.environ.get("KBASE_SECURE_CONFIG_PARAM_THREADS_PER_CPU")
         self.max_threads = _validate_max_threads_type(max_threads, "MAX_THREADS", MAX_THREADS)
         self.threads_per_cpu = _validate_threads_per_cpu_type(threads_per_cpu, "THREADS_PER_CPU", THREADS_PER_CPU)
+        http_pool_size = os.environ.get("KBASE_SECURE_CONFIG_PARAM_HTTP_POOL_SIZE")
+        # all service clients share one keep-alive connection pool per process
+        set_pool_size(_validate_max_threads_type(
+            http_pool_size, "HTTP_POOL_SIZE", DEFAULT_POOL_SIZE))
+        parse_processes = os.environ.get("KBASE_SECURE_CONFIG_PARAM_PARSE_PROCESSES")
+        # the number of processes for parsing a single large FASTA file
+        self.parse_processes = _validate_max_threads_type(
+            parse_processes,
+            "PARSE_PROCESSES",
+            max(min(int(available_cpus()), self.max_threads), 1))
+        assembly_cache_size = os.environ.get("KBASE_SECURE_CONFIG_PARAM_ASSEMBLY_CACHE_SIZE")
+        # the maximum total size in bytes of the FASTA files cached by get_contigs_as_fasta
+        self.assembly_cache_size = _validate_max_threads_type(
+            assembly_cache_size, "ASSEMBLY_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+        import_checkpoints = os.environ.get("KBASE_SECURE_CONFIG_PARAM_IMPORT_CHECKPOINTS")
+        # whether save_assemblies_from_fastas records each input's parse results and Blobstore
+        # handle in the scratch space so a rerun can skip them. Off by default since it writes
+        # the full contig map of every input to disk
+        self.import_checkpoints = _validate_bool_type(
+            import_checkpoints, "IMPORT_CHECKPOINTS", False)
+        spill_contigs = os.environ.get("KBASE_SECURE_CONFIG_PARAM_SPILL_CONTIGS")
+        # whether save_assemblies_from_fastas writes each parsed contig map to the scratch
+        # space until its assembly is saved, rather than holding them all in memory
+        self.spill_contigs = _validate_bool_type(spill_contigs, "SPILL_CONTIGS", False)
+        reuse_uploads = os.environ.get("KBASE_SECURE_CONFIG_PARAM_REUSE_UPLOADS")
+        # whether save_assemblies_from_fastas reuses the Blobstore node of an identical FASTA
+        # file uploaded earlier by the same user, rather than uploading the file again
+        self.reuse_uploads = _validate_bool_type(reuse_uploads, "REUSE_UPLOADS", True)
+        gzip_uploads = os.environ.get("KBASE_SECURE_CONFIG_PARAM_GZIP_UPLOADS")
+        # whether save_assemblies_from_fastas uploads a gzipped copy of each FASTA file
+        self.gzip_uploads = _validate_bool_type(gzip_uploads, "GZIP_UPLOADS", False)
+        max_save_objects = os.environ.get("KBASE_SECURE_CONFIG_PARAM_MAX_SAVE_OBJECTS")
+        # the most assembly objects save_assemblies_from_fastas saves in one workspace call.
+        # Unset by default, so batches are only limited by their size
+        self.max_save_objects = _validate_max_threads_type(
+            max_save_objects, "MAX_SAVE_OBJECTS", None)
+        stream_decompress = os.environ.get("KBASE_SECURE_CONFIG_PARAM_STREAM_DECOMPRESS")
+        # whether save_assemblies_from_fastas parses compressed inputs while decompressing
+        # them, rather than having DataFileUtil decompress them to the scratch space first
+        self.stream_decompress = _validate_bool_type(
+            stream_decompress, "STREAM_DECOMPRESS", False)
+        decompress_threads = os.environ.get("KBASE_SECURE_CONFIG_PARAM_DECOMPRESS_THREADS")
+        # the threads for decompressing each BGZF (bgzip) input when streaming decompression
+        self.decompress_threads = _validate_max_threads_type(
+            decompress_threads, "DECOMPRESS_THREADS", 1)
+        pipeline_queue_size = os.environ.get("KBASE_SECURE_CONFIG_PARAM_PIPELINE_QUEUE_SIZE")
+        # if > 0, save_assemblies_from_fastas stages, parses, uploads and saves each input
+        # independently, allowing at most this many inputs to wait between the stages
+        self.pipeline_queue_size = _validate_max_threads_type(
+            pipeline_queue_size, "PIPELINE_QUEUE_SIZE", 0)
+        parse_workers = os.environ.get("KBASE_SECURE_CONFIG_PARAM_PARSE_WORKERS")
+        # if > 0, the pipelined import parses inputs in this many processes rather than
+        # running in the import worker pool
+        self.parse_workers = _validate_max_threads_type(parse_workers, "PARSE_WORKERS", 0)
+        io_threads = os.environ.get("KBASE_SECURE_CONFIG_PARAM_IO_THREADS")
+        # the threads for the staging and Blobstore upload stages of the pipelined import
+        self.io_threads = _validate_max_threads_type(io_threads, "IO_THREADS", 1)
+        # the worker processes are started on the first parallel import and reused afterwards.
+        # The pool is sized for the most workers an import can use, and each import limits how
+        # many of them it uses
+        self.import_pool = ImportWorkerPool(
+            self.callback_url,
+            Path(self.sharedFolder),
+            max_workers(self.threads_per_cpu, self.max_threads))
+        atexit.register(self.import_pool.close)
         #END_CONSTRUCTOR
         pass
 
@@ -151,7 +232,7 @@ class AssemblyUtil:
 
         ref_lst = params.get("ref_lst")
 
-        ws = Workspace(url=self.ws_url, token=ctx["token"])
+        ws = use_shared_session(Workspace(url=self.ws_url, token=ctx["token"]))
 
         ttf = TypeToFasta(self.callback_url, self.sharedFolder, ws, ctx["token"])
         output = ttf.type_to_fasta(ref_lst)
@@ -191,6 +272,49 @@ class AssemblyUtil:
         # return the results
         return [output]
 
+    def get_contigs_as_fasta(self, ctx, params):
+        """
+        Given a reference to an Assembly and a set of contig IDs and / or filters, construct a
+        local FASTA file with only the selected contigs. The Assembly's FASTA file is cached and
+        indexed in the scratch space, so repeated calls only read the selected sequences.
+        :param params: instance of type "GetContigsParams" (Parameters for
+           get_contigs_as_fasta. Required arguments: ref - a reference to a
+           KBaseGenomeAnnotations.Assembly object. Optional arguments:
+           contig_ids - the IDs of the contigs to return, in the order they
+           will be written to the file. All the IDs must exist in the
+           assembly. If not set, the contigs are written in the order of the
+           assembly's FASTA file. min_length - only return contigs with at
+           least this many bases. max_length - only return contigs with at
+           most this many bases. min_gc - only return contigs with at least
+           this GC content, from 0 to 1. max_gc - only return contigs with at
+           most this GC content, from 0 to 1. filename - the name of the
+           output file. Defaults to the assembly name followed by
+           '.contigs.fa'. @optional contig_ids min_length max_length min_gc
+           max_gc filename) -> structure: parameter "ref" of String,
+           parameter "contig_ids" of list of String, parameter "min_length"
+           of Long, parameter "max_length" of Long, parameter "min_gc" of
+           Double, parameter "max_gc" of Double, parameter "filename" of
+           String
+        :returns: instance of type "FastaAssemblyFile" -> structure:
+           parameter "path" of String, parameter "assembly_name" of String
+        """
+        # ctx is the context object
+        # return variables are: file
+        #BEGIN get_contigs_as_fasta
+        file = ContigExtractor(
+            use_shared_session(DataFileUtil(self.callback_url, token=ctx['token'])),
+            Path(self.sharedFolder),
+            max_cache_size=self.assembly_cache_size
+        ).contigs_as_fasta(params)
+        #END get_contigs_as_fasta
+
+        # At some point might do deeper type checking...
+        if not isinstance(file, dict):
+            raise ValueError('Method get_contigs_as_fasta return value ' +
+                             'file is not type dict as required.')
+        # return the results
+        return [file]
+
     def save_assembly_from_fasta2(self, ctx, params):
         """
         Save a KBase Workspace assembly object from a FASTA file.
@@ -251,8 +375,9 @@ class AssemblyUtil:
         # return variables are: result
         #BEGIN save_assembly_from_fasta2
         result = FastaToAssembly(
-            DataFileUtil(self.callback_url, token=ctx['token']),
-            Path(self.sharedFolder)
+            use_shared_session(DataFileUtil(self.callback_url, token=ctx['token'])),
+            Path(self.sharedFolder),
+            parse_processes=self.parse_processes,
         ).import_fasta(params)
         #END save_assembly_from_fasta2
 
@@ -395,8 +520,21 @@ class AssemblyUtil:
         #BEGIN save_assemblies_from_fastas
         results = {
             'results': FastaToAssembly(
-                DataFileUtil(self.callback_url, token=ctx['token']),
-                Path(self.sharedFolder)
+                use_shared_session(DataFileUtil(self.callback_url, token=ctx['token'])),
+                Path(self.sharedFolder),
+                worker_pool=self.import_pool,
+                token=ctx['token'],
+                checkpoint=self.import_checkpoints,
+                spill_contigs=self.spill_contigs,
+                max_save_objects=self.max_save_objects,
+                gzip_uploads=self.gzip_uploads,
+                stream_decompress=self.stream_decompress,
+                decompress_threads=self.decompress_threads,
+                reuse_uploads=self.reuse_uploads,
+                parse_processes=self.parse_processes,
+                pipeline_queue_size=self.pipeline_queue_size,
+                parse_workers=self.parse_workers,
+                io_threads=self.io_threads,
             ).import_fasta_mass(params, self.threads_per_cpu, self.max_threads)
         }
         #END save_assemblies_from_fastas
@@ -0,0 +1,125 @@
+'''
+Checkpoints for FASTA imports, so that an import that fails part way through can be rerun
+without repeating the parsing and Blobstore uploads that already completed.
+
+Checkpoints are stored in a directory in the scratch space as two files per input, one with
+the parse results and one with the Blobstore handle once the file is uploaded. Each file is
+written to a temporary file and renamed into place, so a checkpoint is never partially written.
+'''
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+from AssemblyUtil.ContigTable import ContigTable, dump_json
+
+_PARSED = '.parsed.json'
+_HANDLE = '.handle.json'
+
+
+def token_owner(token: str) -> str:
+    ''' Get an identifier for the owner of a token that doesn't reveal the token. '''
+    return hashlib.sha256(token.encode('utf-8')).hexdigest() if token else ''
+
+
+class ImportCheckpoints:
+    '''
+    Stores the progress of FASTA imports keyed by the input and the options that affect the
+    parse results.
+    '''
+
+    def __init__(self, directory: Path, token: str = None):
+        '''
+        directory - the directory for the checkpoint files. It is created if necessary.
+        token - the user's token. Checkpoints are only shared between imports with the same
+            token, so that Blobstore handles are never reused by a different user.
+        '''
+        self._dir = directory
+        self._owner = token_owner(token)
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, inp, file_field: str, node_field: str, min_contig_length,
+            gzip_uploads: bool = False):
+        '''
+        Get the checkpoint key for an input, or None if the input file doesn't exist.
+        File inputs are identified by their path, size and modification time, and Blobstore
+        inputs by the node ID. gzip_uploads is whether a gzipped copy of the file is uploaded.
+        '''
+        if inp.get(file_field):
+            try:
+                st = os.stat(inp[file_field])
+            except OSError:
+                return None  # the missing file is reported when staging the input
+            source = [os.path.abspath(inp[file_field]), st.st_size, st.st_mtime_ns]
+        else:
+            source = inp[node_field]
+        key = json.dumps(
+            [source, min_contig_length, inp.get('contig_info'), gzip_uploads, self._owner],
+            sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def load(self, key: str):
+        '''
+        Get the checkpoint for a key as a dict with the path to the parsed file, the path to
+        the file to upload, the parsed assembly data, and the Blobstore handle info if the file
+        was uploaded. Returns None if there is no checkpoint, or if the file to upload hasn't
+        been uploaded and no longer exists.
+        '''
+        parsed = self._read(key + _PARSED)
+        if parsed is None:
+            return None
+        handle = self._read(key + _HANDLE)
+        path = Path(parsed['upload_file'])
+        if handle is None and not (path.is_file() and path.stat().st_size == parsed['size']):
+            return None
+        assembly_data = parsed['assembly_data']
+        contigs = ContigTable()
+        for contig_id, contig_info in assembly_data['contigs'].items():
+            contigs.add(contig_id, contig_info)
+        assembly_data['contigs'] = contigs
+        return {
+            'file': Path(parsed['file']),
+            'upload_file': path,
+            'assembly_data': assembly_data,
+            'handle': handle,
+        }
+
+    def save_parsed(self, key: str, file: Path, assembly_data, upload_file: Path = None):
+        '''
+        Record the parse results for an input, the path to the parsed file, and the path to
+        the file to upload if it's not the parsed file.
+        '''
+        upload_file = upload_file or file
+        self._write(key + _PARSED, {
+            'file': str(file),
+            'upload_file': str(upload_file),
+            'size': os.path.getsize(upload_file),
+            'assembly_data': assembly_data,
+        })
+
+    def save_handle(self, key: str, handle):
+        ''' Record the Blobstore handle info for an uploaded input file. '''
+        self._write(key + _HANDLE, handle)
+
+    def remove(self, key: str):
+        ''' Remove the checkpoint for a key once the import is complete. '''
+        for suffix in (_PARSED, _HANDLE):
+            try:
+                os.remove(self._dir / (key + suffix))
+            except FileNotFoundError:
+                pass
+
+    def _read(self, name):
+        try:
+            with open(self._dir / name) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, name, data):
+        tmp = self._dir / f'tmp_{uuid.uuid4()}'
+        with open(tmp, 'w') as f:
+            dump_json(data, f)
+        os.replace(tmp, self._dir / name)
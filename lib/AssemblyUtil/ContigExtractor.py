@@ -0,0 +1,187 @@
+'''
+Extracts selected contigs from an Assembly's FASTA file.
+
+The FASTA file is downloaded once per handle into the scratch space and indexed, so later
+extractions from the same Assembly only read the selected contigs. The least recently used
+files are removed from the cache when it grows past a size limit.
+'''
+
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Callable
+
+from AssemblyUtil.FastaIndex import extract_contigs, fai_path, read_fai, write_fai
+from AssemblyUtil.FastaScanner import index_fasta_file, normalize_fasta_file
+from installed_clients.DataFileUtilClient import DataFileUtil
+
+_CACHE_DIR = 'assembly_cache'
+_CACHED_FASTA = 'assembly.fa'
+_TMP_PREFIX = 'tmp_'
+
+# the default limit on the total size of the cached FASTA files and indexes
+DEFAULT_CACHE_SIZE = 10 * 1024 ** 3
+
+_REF = 'ref'
+_CONTIG_IDS = 'contig_ids'
+_MIN_LENGTH = 'min_length'
+_MAX_LENGTH = 'max_length'
+_MIN_GC = 'min_gc'
+_MAX_GC = 'max_gc'
+_FILENAME = 'filename'
+
+
+def _check_number(params, key, types, max_val=None):
+    val = params.get(key)
+    if val is None:
+        return
+    # bools are ints
+    if type(val) not in types:
+        raise ValueError(f'{key} must be a number')
+    if val < 0 or (max_val is not None and val > max_val):
+        raise ValueError(f'{key} must be >= 0' + (f' and <= {max_val}' if max_val else ''))
+
+
+def _in_range(val, min_val, max_val):
+    if min_val is None and max_val is None:
+        return True
+    if val is None:
+        return False
+    return (min_val is None or val >= min_val) and (max_val is None or val <= max_val)
+
+
+class ContigExtractor:
+
+    def __init__(self,
+                 dfu: DataFileUtil,
+                 scratch: Path,
+                 uuid_gen: Callable[[], uuid.UUID] = lambda: uuid.uuid4(),
+                 max_cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        dfu - the DataFileUtil client.
+        scratch - the scratch directory. Downloaded FASTA files and their indexes are cached
+            here.
+        uuid_gen - a generator of UUIDs for temporary directory names.
+        max_cache_size - the maximum total size in bytes of the cached files. The least
+            recently used files are removed when the cache is larger. The file for the current
+            call is always kept, even if it's larger on its own.
+        """
+        if max_cache_size < 0:
+            raise ValueError('max_cache_size must be >= 0')
+        self._dfu = dfu
+        self._scratch = scratch
+        self._uuid_gen = uuid_gen
+        self._max_cache_size = max_cache_size
+
+    def contigs_as_fasta(self, params):
+        """ Write the selected contigs in an Assembly to a FASTA file. """
+        self._validate_params(params)
+        print(f'downloading ws object data ({params[_REF]})')
+        assembly_object = self._dfu.get_objects({'object_refs': [params[_REF]]})['data'][0]
+        ws_type = assembly_object['info'][2]
+        obj_name = assembly_object['info'][1]
+        if 'KBaseGenomeAnnotations.Assembly' not in ws_type:
+            raise ValueError(f'Cannot extract contigs; invalid WS type ({ws_type}). '
+                             + 'Supported types are KBaseGenomeAnnotations.Assembly')
+        data = assembly_object['data']
+        fasta_path, index = self._get_indexed_fasta(data['fasta_handle_ref'])
+        contig_ids = self._select_contigs(params, data.get('contigs', {}), index)
+        output_path = self._scratch / (params.get(_FILENAME) or obj_name + '.contigs.fa')
+        print(f'writing {len(contig_ids)} contigs to {output_path}')
+        with open(output_path, 'wb') as f:
+            extract_contigs(fasta_path, [index[c] for c in contig_ids], f)
+        return {'path': str(output_path), 'assembly_name': obj_name}
+
+    def _validate_params(self, params):
+        if not params.get(_REF):
+            raise ValueError(f'required "{_REF}" field was not defined')
+        contig_ids = params.get(_CONTIG_IDS)
+        if contig_ids is not None and (
+                type(contig_ids) != list or not all(type(c) == str for c in contig_ids)):
+            raise ValueError(f'{_CONTIG_IDS} must be a list of strings')
+        _check_number(params, _MIN_LENGTH, (int,))
+        _check_number(params, _MAX_LENGTH, (int,))
+        _check_number(params, _MIN_GC, (int, float), 1)
+        _check_number(params, _MAX_GC, (int, float), 1)
+
+    def _select_contigs(self, params, contigs, index):
+        contig_ids = params.get(_CONTIG_IDS)
+        if contig_ids is None:
+            contig_ids = list(index)
+        else:
+            missing = [c for c in contig_ids if c not in index]
+            if missing:
+                raise ValueError('The following contig IDs are not in the assembly: '
+                                 + ', '.join(missing))
+            # drop repeated IDs but keep the requested order
+            contig_ids = list(dict.fromkeys(contig_ids))
+        return [c for c in contig_ids
+                if _in_range(index[c].length, params.get(_MIN_LENGTH), params.get(_MAX_LENGTH))
+                and _in_range(contigs.get(c, {}).get('gc_content'),
+                              params.get(_MIN_GC), params.get(_MAX_GC))]
+
+    def _get_indexed_fasta(self, handle_ref):
+        """
+        Get the path to the cached FASTA file for a handle, downloading and indexing it if
+        necessary, and the index as a mapping of contig ID to index entry.
+        """
+        cache_dir = self._scratch / _CACHE_DIR / handle_ref.replace('/', '_')
+        fasta_path = cache_dir / _CACHED_FASTA
+        if not fai_path(fasta_path).exists():
+            self._cache_fasta(handle_ref, cache_dir)
+        else:
+            print(f'using cached FASTA file for handle {handle_ref}')
+            # the modification time of the directory records when the file was last used
+            os.utime(cache_dir)
+        index = {e.name: e for e in read_fai(fai_path(fasta_path))}
+        self._evict(cache_dir)
+        return fasta_path, index
+
+    def _evict(self, keep):
+        # remove the least recently used cache entries, other than keep, until the cache fits
+        # in the size limit. Temporary directories are other calls' downloads in progress
+        entries = []
+        for d in (self._scratch / _CACHE_DIR).iterdir():
+            if d.is_dir() and not d.name.startswith(_TMP_PREFIX):
+                try:
+                    size = sum(f.stat().st_size for f in d.iterdir())
+                    entries.append((d.stat().st_mtime, size, d))
+                except FileNotFoundError:
+                    pass  # removed by another call
+        total = sum(size for _, size, _ in entries)
+        for _, size, d in sorted(entries):  # oldest first
+            if total <= self._max_cache_size:
+                break
+            if d != keep:
+                print(f'removing {d.name} from the FASTA file cache')
+                shutil.rmtree(d, ignore_errors=True)
+                total -= size
+
+    def _cache_fasta(self, handle_ref, cache_dir):
+        # build the cache entry in a temporary directory and move it into place when complete
+        # so an interrupted download is never mistaken for a cached file
+        tmp_dir = cache_dir.parent / f'{_TMP_PREFIX}{self._uuid_gen()}'
+        os.makedirs(tmp_dir)
+        print(f'downloading FASTA file for handle {handle_ref}')
+        dl = self._dfu.shock_to_file({
+            'handle_id': handle_ref,
+            'file_path': str(tmp_dir / 'download.fa'),
+            'unpack': 'uncompress'
+        })
+        downloaded = Path(dl['file_path'])
+        fasta_path = tmp_dir / _CACHED_FASTA
+        print('indexing FASTA file')
+        index = index_fasta_file(downloaded)
+        if index is None:
+            print(' - the FASTA file has inconsistent line lengths, rewriting it for indexing')
+            index = normalize_fasta_file(downloaded, fasta_path)
+            os.remove(downloaded)
+        else:
+            os.rename(downloaded, fasta_path)
+        write_fai(fai_path(fasta_path), index)
+        try:
+            os.rename(tmp_dir, cache_dir)
+        except OSError:
+            # another call cached the same file first
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,80 @@
+'''
+A disk backed store for assembly contig maps, so that the contig data for many assemblies
+doesn't need to be held in memory until the assemblies are saved.
+
+Each contig map is written to a file in the scratch space as the columns of a ContigTable, and
+read back as a ContigTable, so a loaded contig map takes no more memory than the parsed one.
+'''
+
+import os
+import threading
+from pathlib import Path
+
+from AssemblyUtil.ContigTable import ContigTable, dump_contig_table, load_contig_table
+
+
+class SpilledContigs:
+    '''
+    A reference to a contig map in a ContigStore, used in place of the contig map in an
+    assembly object until the object is saved.
+    '''
+
+    def __init__(self, store, descriptor, json_size: int, count: int):
+        self._store = store
+        self._descriptor = descriptor
+        # the size of the serialized contig map, matching the contig map from FastaToAssembly
+        self.json_size = json_size
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def load(self) -> ContigTable:
+        ''' Read the contig map from the store. '''
+        return self._store._read(self._descriptor)
+
+
+class ContigStore:
+    '''
+    Stores contig maps as ContigTable columns in a file. Reads may happen concurrently with
+    each other and with writes.
+    '''
+
+    def __init__(self, path: Path):
+        '''
+        path - the file for the contig data. It is created, or truncated if it exists.
+        '''
+        self.path = path
+        self._file = open(path, 'wb')
+        self._lock = threading.Lock()
+
+    def put(self, contigs) -> SpilledContigs:
+        '''
+        Write a contig map to the store, returning a reference to it. Contig maps other than
+        ContigTables are converted to ContigTables.
+        '''
+        if not isinstance(contigs, ContigTable):
+            table = ContigTable()
+            for contig_id, contig_info in contigs.items():
+                table.add(contig_id, contig_info)
+            contigs = table
+        with self._lock:
+            descriptor = dump_contig_table(contigs, self._file)
+            self._file.flush()
+        return SpilledContigs(self, descriptor, contigs.json_size, len(contigs))
+
+    def _read(self, descriptor):
+        with open(self.path, 'rb') as f:
+            return load_contig_table(f, descriptor)
+
+    def close(self):
+        ''' Close and delete the store. References to its contents are no longer valid. '''
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
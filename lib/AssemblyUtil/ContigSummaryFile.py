@@ -0,0 +1,150 @@
+'''
+Transfers contig summaries from FASTA parsing processes to the parent process through files in
+the scratch space, rather than pickling them through the pool's pipes.
+
+A parsing process writes the summaries of the contigs it scans to a file as a few columns of
+packed values and returns a small descriptor of the file. The parent memory maps the columns,
+so it only builds one ContigSummary at a time while merging the results, and only the pages
+being read are in memory.
+'''
+
+import os
+from array import array
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from AssemblyUtil.FastaIndex import FaiEntry
+from AssemblyUtil.FastaScanner import ContigSummary
+
+# stands in for None in the integer columns
+_NONE = -1
+
+# the columns of a summary file, in order, and their types
+_COLUMNS = (
+    ('title_ends', 'q'),  # the end of each title in titles
+    ('titles', 'B'),  # UTF-8 encoded titles
+    ('positions', 'q'),  # offset, sequence offset, end and length of each contig
+    ('invalid_chars', 'q'),  # the code point of the invalid character of each contig
+    ('digests', 'B'),  # the 16 byte md5 digest of each contig
+    ('count_ends', 'q'),  # the end of each contig's counts in count_chars and count_values
+    ('count_chars', 'B'),
+    ('count_values', 'q'),
+    ('index_entries', 'q'),  # length, offset, line bases and line width of each index entry
+)
+_POSITIONS = 4
+_INDEX_FIELDS = 4
+
+
+def _int(value):
+    return _NONE if value is None else value
+
+
+def _optional(value):
+    return None if value == _NONE else int(value)
+
+
+class ContigSummaryWriter:
+    '''
+    Writes contig summaries to a file. The summaries are held in packed columns until the
+    writer is closed.
+    '''
+
+    def __init__(self, path: Path):
+        '''
+        path - the file for the summaries. It is created, or truncated if it exists, when the
+            writer is closed.
+        '''
+        self._path = path
+        self._count = 0
+        self._columns = {name: array(typecode) for name, typecode in _COLUMNS}
+
+    def add(self, contig: ContigSummary):
+        ''' Add the summary for a contig. '''
+        cols = self._columns
+        self._count += 1
+        cols['titles'].frombytes(contig.title.encode())
+        cols['title_ends'].append(len(cols['titles']))
+        cols['positions'].extend((_int(contig.offset), _int(contig.sequence_offset),
+                                  _int(contig.end), contig.length))
+        cols['invalid_chars'].append(_int(contig.invalid_char and ord(contig.invalid_char)))
+        cols['digests'].frombytes(contig.digest())
+        for char, count in contig.counts.items():
+            cols['count_chars'].append(ord(char))
+            cols['count_values'].append(count)
+        cols['count_ends'].append(len(cols['count_chars']))
+        e = contig.index_entry
+        cols['index_entries'].extend(
+            (e.length, e.offset, e.line_bases, e.line_width) if e else [_NONE] * _INDEX_FIELDS)
+
+    def close(self):
+        '''
+        Write the summaries to the file, returning a descriptor of the file for
+        read_contig_summaries.
+        '''
+        columns = []
+        offset = 0
+        with open(self._path, 'wb') as f:
+            for name, _ in _COLUMNS:
+                col = self._columns[name]
+                col.tofile(f)
+                size = len(col) * col.itemsize
+                columns.append((name, np.dtype(col.typecode).str, offset, len(col)))
+                offset += size
+        return {'path': str(self._path), 'count': self._count, 'columns': columns}
+
+
+def _map_column(path, dtype, offset, length):
+    if not length:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(length,))
+
+
+def read_contig_summaries(descriptor, index=False) -> Iterator[ContigSummary]:
+    '''
+    Read the contig summaries from a file written by a ContigSummaryWriter.
+
+    descriptor - the descriptor returned when the writer was closed.
+    index - whether to include the index entries of the contigs.
+    '''
+    cols = {name: _map_column(descriptor['path'], dtype, offset, length)
+            for name, dtype, offset, length in descriptor['columns']}
+    positions = cols['positions'].reshape(-1, _POSITIONS)
+    index_entries = cols['index_entries'].reshape(-1, _INDEX_FIELDS)
+    title_start = 0
+    count_start = 0
+    for i in range(descriptor['count']):
+        title_end = int(cols['title_ends'][i])
+        title = cols['titles'][title_start:title_end].tobytes().decode()
+        title_start = title_end
+        count_end = int(cols['count_ends'][i])
+        counts = {chr(c): int(v) for c, v in zip(
+            cols['count_chars'][count_start:count_end].tolist(),
+            cols['count_values'][count_start:count_end].tolist())}
+        count_start = count_end
+        offset, sequence_offset, end, length = positions[i].tolist()
+        invalid_char = _optional(cols['invalid_chars'][i])
+        summary = ContigSummary(
+            title,
+            _optional(offset),
+            _optional(sequence_offset),
+            _optional(end),
+            length,
+            None if invalid_char is None else chr(invalid_char),
+            counts,
+            cols['digests'][i * 16:(i + 1) * 16].tobytes())
+        if index:
+            entry_length, entry_offset, line_bases, line_width = index_entries[i].tolist()
+            if entry_length != _NONE:
+                summary.index_entry = FaiEntry(
+                    summary.id, entry_length, entry_offset, line_bases, line_width)
+        yield summary
+
+
+def remove_contig_summaries(descriptor):
+    ''' Delete a summary file. '''
+    try:
+        os.remove(descriptor['path'])
+    except FileNotFoundError:
+        pass
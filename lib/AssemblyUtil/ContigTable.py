@@ -0,0 +1,508 @@
+'''
+A compact, column oriented contig map for assembly objects.
+
+Holding a dict per contig costs around a kilobyte per contig, which adds up to gigabytes for
+metagenomes with millions of contigs. ContigTable stores the contig fields in parallel arrays
+and only builds the dict for a contig when it is accessed, e.g. when the assembly object is
+serialized.
+'''
+
+import json
+import math
+from array import array
+from collections.abc import ItemsView, Mapping
+from pathlib import Path
+from typing import BinaryIO
+
+# matches the encoder used by json.dumps with the default arguments
+_JSON_ENCODER = json.JSONEncoder()
+
+# the keys of a contig entry in the order they're written
+_CONTIG_ID = 'contig_id'
+_NAME = 'name'
+_DESCRIPTION = 'description'
+_LENGTH = 'length'
+_NCOUNT = 'Ncount'
+_IS_CIRC = 'is_circ'
+_MD5 = 'md5'
+_GC_CONTENT = 'gc_content'
+_KEYS = (_CONTIG_ID, _NAME, _DESCRIPTION, _LENGTH, _NCOUNT, _IS_CIRC, _MD5, _GC_CONTENT)
+
+# marks a missing Ncount
+_NO_NCOUNT = -1
+
+_HEX_DIGITS = '0123456789abcdef'
+
+# the column values for entries that are stored as is
+_PLACEHOLDER = {_DESCRIPTION: '', _LENGTH: 0, _GC_CONTENT: 0.0, _MD5: '0' * 32}
+
+# the key orders that can be stored in the columns
+_LAYOUTS = {
+    tuple(k for k in _KEYS if k not in skip)
+    for skip in ((), (_NCOUNT,), (_IS_CIRC,), (_NCOUNT, _IS_CIRC))
+}
+
+# the size of a JSON encoded entry with all the keys, less the size of the values other than
+# the md5
+_ENTRY_SIZE = len(_JSON_ENCODER.encode({k: '0' * 32 if k == _MD5 else '' for k in _KEYS})) - 14
+# the size of the key and separators of optional fields
+_OPTIONAL_SIZES = {k: len(_JSON_ENCODER.encode(k)) + 4 for k in (_NCOUNT, _IS_CIRC)}
+# the number of values whose sizes are summed at once when computing the JSON size
+_SIZE_CHUNK = 64 * 1024
+# bytes other than printable ASCII, which need escaping in JSON
+_ESCAPED = bytes(range(32)) + bytes(range(127, 256))
+
+
+def _is_compact(contig_id, contig_info):
+    # whether a contig entry has the standard layout and so can be stored in the columns
+    if tuple(contig_info) not in _LAYOUTS:
+        return False
+    ncount = contig_info.get(_NCOUNT, 0)
+    md5 = contig_info[_MD5]
+    return (contig_info[_CONTIG_ID] == contig_id
+            and contig_info[_NAME] == contig_id
+            and type(contig_info[_DESCRIPTION]) == str
+            and type(contig_info[_LENGTH]) == int
+            and type(contig_info[_GC_CONTENT]) == float
+            and type(ncount) == int and ncount >= 0
+            and type(contig_info.get(_IS_CIRC, 0)) == int
+            # strip removes everything if and only if all the characters are hex digits
+            and type(md5) == str and len(md5) == 32 and not md5.strip(_HEX_DIGITS))
+
+
+def _json_str_size(s: str):
+    # the size of a JSON encoded string. Printable ASCII only needs quotes and backslashes
+    # escaped
+    # (a UTF-8 encoding only has one byte per character for ASCII strings)
+    if s.isprintable() and len(s.encode('utf-8')) == len(s):
+        return len(s) + 2 + s.count('"') + s.count('\\')
+    return len(_JSON_ENCODER.encode(s))
+
+
+def _reprs_size(values):
+    # the total size of the reprs of the values in an array. The repr of a list is the reprs
+    # of its items separated by ', ' in brackets, so this avoids a call per value
+    size = 0
+    for i in range(0, len(values), _SIZE_CHUNK):
+        chunk = values[i:i + _SIZE_CHUNK].tolist()
+        size += len(repr(chunk)) - 2 * len(chunk)
+    return size
+
+
+class _PackedStrings:
+    ''' A list of strings stored as UTF-8 in a single buffer. '''
+
+    def __init__(self):
+        self._data = bytearray()
+        self._ends = array('q')
+
+    def append(self, s: str):
+        # surrogatepass round trips any str, including lone surrogates
+        self._data += s.encode('utf-8', 'surrogatepass')
+        self._ends.append(len(self._data))
+
+    def __getitem__(self, i: int) -> str:
+        start = self._ends[i - 1] if i else 0
+        return self._data[start:self._ends[i]].decode('utf-8', 'surrogatepass')
+
+    def __len__(self):
+        return len(self._ends)
+
+    def json_size(self):
+        ''' Get the total size of the strings when JSON encoded. '''
+        data = self._data
+        size = 2 * len(self)
+        for i in range(0, len(data), _SIZE_CHUNK):
+            chunk = data[i:i + _SIZE_CHUNK]
+            if len(chunk.translate(None, _ESCAPED)) != len(chunk):
+                # characters that need escaping other than quotes and backslashes
+                return sum(_json_str_size(self[j]) for j in range(len(self)))
+            size += len(chunk) + chunk.count(b'"') + chunk.count(b'\\')
+        return size
+
+    def pop(self):
+        ''' Remove the last string. '''
+        self._ends.pop()
+        del self._data[self._ends[-1] if self._ends else 0:]
+
+
+def _index_size(count):
+    # the number of slots needed to index count strings, keeping the index at most half full
+    size = 16
+    while count * 2 > size:
+        size *= 2
+    return size
+
+
+class _StringIndex:
+    '''
+    An open addressing hash index from the strings in a _PackedStrings to their position, which
+    avoids keeping a str object and a dict entry per string.
+    '''
+
+    def __init__(self, strings: _PackedStrings, count: int = 0):
+        '''
+        strings - the strings to index.
+        count - the number of strings already in strings, which are indexed immediately.
+        '''
+        self._strings = strings
+        self._count = count
+        self._rebuild(_index_size(count))
+
+    def _probe(self, s: str):
+        # returns the slot holding s, or the empty slot where s would go
+        mask = len(self._slots) - 1
+        slot = hash(s) & mask
+        while True:
+            row = self._slots[slot]
+            if row == -1 or self._strings[row] == s:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _rebuild(self, size):
+        self._slots = array('i', [-1]) * size
+        for r in range(self._count):
+            self._slots[self._probe(self._strings[r])] = r
+
+    def __getstate__(self):
+        # str hashes are randomized per process unless PYTHONHASHSEED is set, so the slots
+        # are only valid in the process that built them. Rebuild them when unpickled
+        return {'_strings': self._strings, '_count': self._count}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rebuild(_index_size(self._count))
+
+    def find(self, s: str) -> int:
+        ''' Get the position of a string, or -1 if it's not in the index. '''
+        return self._slots[self._probe(s)]
+
+    def add(self, s: str, row: int) -> bool:
+        '''
+        Add the position of a string, which must already be appended to the strings.
+        Returns False without adding it if the string is already in the index.
+        '''
+        if (self._count + 1) * 2 > len(self._slots):
+            self._rebuild(len(self._slots) * 2)
+        slot = self._probe(s)
+        if self._slots[slot] != -1:
+            return False
+        self._slots[slot] = row
+        self._count += 1
+        return True
+
+
+class ContigTable(Mapping):
+    '''
+    A read only mapping of contig ID to contig entry, where the entries are stored in columns
+    and built on access. Entries are added with add().
+
+    '''
+
+    def __init__(self):
+        self._ids = _PackedStrings()
+        self._rows = _StringIndex(self._ids)
+        self._descriptions = _PackedStrings()
+        self._lengths = array('q')
+        self._ncounts = array('q')
+        self._gc = array('d')
+        self._md5s = bytearray()
+        # is_circ is rarely set, so it's stored sparsely
+        self._is_circ = {}
+        # entries that don't have the standard layout are stored as is
+        self._other = {}
+        self._json_size = None
+
+    def add(self, contig_id: str, contig_info):
+        '''
+        Add a contig entry. The entry is copied into the table, so later changes to the entry
+        are not reflected in the table.
+        '''
+        row = len(self._ids)
+        self._ids.append(contig_id)
+        if not self._rows.add(contig_id, row):
+            self._ids.pop()
+            raise ValueError(f'Contig {contig_id} is already in the table')
+        self._json_size = None
+        if not _is_compact(contig_id, contig_info):
+            self._other[row] = dict(contig_info)
+            # keep the columns aligned
+            contig_info = _PLACEHOLDER
+        self._descriptions.append(contig_info[_DESCRIPTION])
+        self._lengths.append(contig_info[_LENGTH])
+        self._ncounts.append(contig_info.get(_NCOUNT, _NO_NCOUNT))
+        self._gc.append(contig_info[_GC_CONTENT])
+        self._md5s += bytes.fromhex(contig_info[_MD5])
+        if _IS_CIRC in contig_info:
+            self._is_circ[row] = contig_info[_IS_CIRC]
+
+    def add_contig(
+            self,
+            contig_id: str,
+            description: str,
+            length: int,
+            ncount: int,
+            digest: bytes,
+            gc_content: float,
+            is_circ: int = None):
+        '''
+        Add a contig entry with the standard layout from its fields, which is the same as
+        adding the entry built from the fields but skips building and checking the entry.
+
+        ncount - the Ncount, or None if the entry has no Ncount.
+        digest - the raw md5 digest of the sequence.
+        is_circ - the is_circ value, or None if the entry has no is_circ.
+        '''
+        row = len(self._ids)
+        self._ids.append(contig_id)
+        if not self._rows.add(contig_id, row):
+            self._ids.pop()
+            raise ValueError(f'Contig {contig_id} is already in the table')
+        self._json_size = None
+        self._descriptions.append(description)
+        self._lengths.append(length)
+        self._ncounts.append(_NO_NCOUNT if ncount is None else ncount)
+        self._gc.append(gc_content)
+        self._md5s += digest
+        if is_circ is not None:
+            self._is_circ[row] = is_circ
+
+    @property
+    def json_size(self):
+        '''
+        The size of the table when serialized with json.dumps. Computed from the columns when
+        first requested after an entry is added.
+        '''
+        if self._json_size is None:
+            self._json_size = self._compute_json_size()
+        return self._json_size
+
+    def _compute_json_size(self):
+        count = len(self)
+        if not count:
+            return 2  # {}
+        ids_size = self._ids.json_size()
+        # braces, separators between items, and the key and separator of each item
+        size = 2 + 2 * (count - 1) + ids_size + 2 * count
+        # each row as a compact entry, including rows that are stored as is
+        gc = self._gc
+        no_ncount = self._ncounts.count(_NO_NCOUNT)
+        size += (count * _ENTRY_SIZE
+                 + 2 * ids_size + self._descriptions.json_size()
+                 + _reprs_size(self._lengths)
+                 # _NO_NCOUNT's repr is 2 characters
+                 + _reprs_size(self._ncounts) - 2 * no_ncount
+                 - no_ncount * _OPTIONAL_SIZES[_NCOUNT]
+                 + sum(len(repr(v)) for v in self._is_circ.values())
+                 - (count - len(self._is_circ)) * _OPTIONAL_SIZES[_IS_CIRC]
+                 + _reprs_size(gc)
+                 # the encoder writes inf as Infinity rather than its repr, inf
+                 + 5 * (gc.count(math.inf) + gc.count(-math.inf)))
+        # replace the sizes of the placeholders for rows that are stored as is
+        placeholder = (_ENTRY_SIZE + 2 + 1 + 3  # description, length and gc content
+                       - _OPTIONAL_SIZES[_NCOUNT] - _OPTIONAL_SIZES[_IS_CIRC])
+        for row, contig_info in self._other.items():
+            size += (len(_JSON_ENCODER.encode(contig_info))
+                     - placeholder - 2 * _json_str_size(self._ids[row]))
+        return size
+
+    def __getitem__(self, contig_id):
+        row = self._rows.find(contig_id) if isinstance(contig_id, str) else -1
+        if row == -1:
+            raise KeyError(contig_id)
+        return self._entry(contig_id, row)
+
+    def _entry(self, contig_id, row):
+        if row in self._other:
+            return dict(self._other[row])
+        contig_info = {
+            _CONTIG_ID: contig_id,
+            _NAME: contig_id,
+            _DESCRIPTION: self._descriptions[row],
+            _LENGTH: self._lengths[row],
+        }
+        if self._ncounts[row] != _NO_NCOUNT:
+            contig_info[_NCOUNT] = self._ncounts[row]
+        if row in self._is_circ:
+            contig_info[_IS_CIRC] = self._is_circ[row]
+        contig_info[_MD5] = self._md5s[row * 16:(row + 1) * 16].hex()
+        contig_info[_GC_CONTENT] = self._gc[row]
+        return contig_info
+
+    def __contains__(self, contig_id):
+        return isinstance(contig_id, str) and self._rows.find(contig_id) != -1
+
+    def __iter__(self):
+        return (self._ids[i] for i in range(len(self._ids)))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def items(self):
+        return _ContigTableItems(self)
+
+    def to_dict(self):
+        ''' Get the table as a dict of contig ID to contig entry. '''
+        return dict(self.items())
+
+
+def _columns(table: ContigTable):
+    # the columns of a table in the order they're written to a file
+    return (
+        ('ids', table._ids._data),
+        ('id_ends', table._ids._ends),
+        ('descriptions', table._descriptions._data),
+        ('description_ends', table._descriptions._ends),
+        ('lengths', table._lengths),
+        ('ncounts', table._ncounts),
+        ('gc', table._gc),
+        ('md5s', table._md5s),
+    )
+
+
+def dump_contig_table(table: ContigTable, handle: BinaryIO):
+    '''
+    Write a table's columns to a file handle opened in binary mode at its current position,
+    returning a small descriptor of the data for load_contig_table.
+    '''
+    offset = handle.tell()
+    columns = []
+    for name, col in _columns(table):
+        if isinstance(col, array):
+            col.tofile(handle)
+            columns.append((name, col.typecode, len(col)))
+        else:
+            handle.write(col)
+            columns.append((name, None, len(col)))
+    # is_circ and the entries stored as is are rarely set, so they go in the descriptor
+    return {'offset': offset, 'size': handle.tell() - offset, 'columns': columns,
+            'is_circ': dict(table._is_circ), 'other': dict(table._other)}
+
+
+def load_contig_table(handle: BinaryIO, descriptor) -> ContigTable:
+    '''
+    Read a table written by dump_contig_table from a file handle opened in binary mode.
+
+    descriptor - the descriptor returned when the table was written.
+    '''
+    handle.seek(descriptor['offset'])
+    cols = {}
+    for name, typecode, length in descriptor['columns']:
+        if typecode is None:
+            cols[name] = bytearray(handle.read(length))
+        else:
+            cols[name] = array(typecode)
+            cols[name].fromfile(handle, length)
+    table = ContigTable()
+    table._ids._data = cols['ids']
+    table._ids._ends = cols['id_ends']
+    table._rows = _StringIndex(table._ids, len(table._ids))
+    table._descriptions._data = cols['descriptions']
+    table._descriptions._ends = cols['description_ends']
+    table._lengths = cols['lengths']
+    table._ncounts = cols['ncounts']
+    table._gc = cols['gc']
+    table._md5s = cols['md5s']
+    table._is_circ = dict(descriptor['is_circ'])
+    table._other = dict(descriptor['other'])
+    return table
+
+
+def write_contig_table(table: ContigTable, path: Path):
+    '''
+    Write a table's columns to a file, returning a small descriptor of the file for
+    read_contig_table. Used to return tables from worker processes through the scratch space
+    rather than pickling them through the pool's pipes.
+
+    table - the table to write.
+    path - the file for the table. It is created, or truncated if it exists.
+    '''
+    with open(path, 'wb') as f:
+        descriptor = dump_contig_table(table, f)
+    descriptor['path'] = str(path)
+    return descriptor
+
+
+def read_contig_table(descriptor) -> ContigTable:
+    '''
+    Read a table from a file written by write_contig_table.
+
+    descriptor - the descriptor returned when the table was written.
+    '''
+    with open(descriptor['path'], 'rb') as f:
+        return load_contig_table(f, descriptor)
+
+
+class _ContigTableItems(ItemsView):
+    # iterates without looking up each ID in the index
+
+    def __iter__(self):
+        table = self._mapping
+        for row in range(len(table)):
+            contig_id = table._ids[row]
+            yield contig_id, table._entry(contig_id, row)
+
+
+def json_default(obj):
+    '''
+    A default function for json.dumps and similar that serializes ContigTables as their dict
+    equivalent. Prefer iterencode_json or dump_json for large tables, which don't build the dict.
+    '''
+    if isinstance(obj, ContigTable):
+        return obj.to_dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+# matches json.dumps(obj, default=json_default)
+_DEFAULT_ENCODER = json.JSONEncoder(default=json_default)
+# the approximate size of the pieces yielded by iterencode_json
+_JSON_CHUNK_SIZE = 1024 * 1024
+
+
+def _iter_json(obj):
+    # walks dicts and lists down to the ContigTables and encodes everything else in one go
+    # with the fast one shot encoder. ContigTables are encoded an entry at a time
+    if isinstance(obj, ContigTable) or (
+            isinstance(obj, dict) and obj and all(type(k) == str for k in obj)):
+        yield '{'
+        for i, (k, v) in enumerate(obj.items()):
+            yield (', ' if i else '') + _JSON_ENCODER.encode(k) + ': '
+            yield from _iter_json(v)
+        yield '}'
+    elif isinstance(obj, (list, tuple)) and obj:
+        yield '['
+        for i, v in enumerate(obj):
+            if i:
+                yield ', '
+            yield from _iter_json(v)
+        yield ']'
+    else:
+        yield _DEFAULT_ENCODER.encode(obj)
+
+
+def iterencode_json(obj, chunk_size=_JSON_CHUNK_SIZE):
+    '''
+    Encode an object as JSON in pieces of around chunk_size characters, giving the same
+    output as json.dumps(obj, default=json_default) without building the dict equivalent of
+    the ContigTables in the object.
+    '''
+    buf = []
+    size = 0
+    for piece in _iter_json(obj):
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def dump_json(obj, handle):
+    '''
+    Write an object as JSON to a text file, as json.dump(obj, handle, default=json_default)
+    would, without building the dict equivalent of the ContigTables in the object.
+    '''
+    for chunk in iterencode_json(obj):
+        handle.write(chunk)
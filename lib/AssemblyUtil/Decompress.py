@@ -0,0 +1,249 @@
+'''
+Streaming decompression of gzip, bzip2 and xz files, so compressed FASTA files can be parsed
+without first writing the decompressed file to disk.
+
+Decompression runs in a background thread that reads ahead of the consumer. zlib, bz2 and lzma
+release the GIL, so decompression runs in parallel with parsing. BGZF files (block gzip, as
+written by bgzip) can also be decompressed with several threads, since the blocks are
+independent.
+'''
+
+import bz2
+import gzip
+import lzma
+import queue
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+GZIP = 'gzip'
+BZIP2 = 'bzip2'
+XZ = 'xz'
+
+_MAGIC = (
+    (b'\x1f\x8b', GZIP),
+    (b'BZh', BZIP2),
+    (b'\xfd7zXZ\x00', XZ),
+)
+_OPENERS = {GZIP: gzip.open, BZIP2: bz2.open, XZ: lzma.open}
+_SUFFIXES = {
+    GZIP: ('.gz', '.gzip'),
+    BZIP2: ('.bz2', '.bzip2', '.bz'),
+    XZ: ('.xz',),
+}
+
+# tar archives have 'ustar' at this offset of the first header, and are usually named .tar
+# when decompressed, or with one of the combined suffixes
+_TAR_MAGIC = b'ustar'
+_TAR_MAGIC_OFFSET = 257
+_TAR_SUFFIXES = ('.tgz', '.tbz', '.tbz2', '.txz')
+
+_CHUNK_SIZE = 1024 * 1024
+# the number of chunks the background thread may read ahead
+_READ_AHEAD = 4
+
+# a BGZF block starts with a gzip header with the FEXTRA flag and a 'BC' extra subfield
+_BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+_BGZF_HEADER = 12
+# the number of BGZF blocks, at most 64KB each, decompressed per batch for each thread
+_BGZF_BLOCKS_PER_THREAD = 16
+
+# marks the end of the data in a read ahead queue
+_DONE = object()
+
+
+def compression_type(path: Path):
+    ''' Get the compression type of a file from its magic bytes, or None if not compressed. '''
+    with open(path, 'rb') as f:
+        start = f.read(6)
+    for magic, ctype in _MAGIC:
+        if start.startswith(magic):
+            return ctype
+    return None
+
+
+def decompressed_path(path: Path, ctype: str) -> Path:
+    '''
+    Get the path for the decompressed version of a compressed file, removing the compression
+    suffix if present.
+    '''
+    for suffix in _SUFFIXES[ctype]:
+        if path.name.lower().endswith(suffix) and len(path.name) > len(suffix):
+            return path.with_name(path.name[:-len(suffix)])
+    return path.with_name(path.name + '.decompressed')
+
+
+def is_tar_archive(path: Path, ctype: str):
+    '''
+    Check whether a compressed file holds a tar archive, from its name or the tar magic in the
+    decompressed data.
+
+    ctype - the compression type from compression_type().
+    '''
+    name = path.name.lower()
+    if name.endswith(_TAR_SUFFIXES) or decompressed_path(path, ctype).suffix.lower() == '.tar':
+        return True
+    try:
+        with _OPENERS[ctype](path, 'rb') as f:
+            header = f.read(_TAR_MAGIC_OFFSET + len(_TAR_MAGIC))
+    except (OSError, EOFError, lzma.LZMAError):
+        return False  # corrupt files are reported when they're parsed
+    return header[_TAR_MAGIC_OFFSET:] == _TAR_MAGIC
+
+
+def _is_bgzf(path: Path):
+    with open(path, 'rb') as f:
+        header = f.read(_BGZF_HEADER + 4)
+    return (len(header) == _BGZF_HEADER + 4 and header.startswith(_BGZF_MAGIC)
+            and header[_BGZF_HEADER:_BGZF_HEADER + 2] == b'BC')
+
+
+def _read_bgzf_blocks(f):
+    # yields the raw deflate data of each block
+    while True:
+        header = f.read(_BGZF_HEADER)
+        if not header:
+            return
+        if len(header) < _BGZF_HEADER or not header.startswith(_BGZF_MAGIC):
+            raise ValueError('Invalid BGZF block header')
+        xlen = struct.unpack('<H', header[10:12])[0]
+        extra = f.read(xlen)
+        bsize = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            slen = struct.unpack('<H', extra[pos + 2:pos + 4])[0]
+            if extra[pos:pos + 2] == b'BC' and slen == 2:
+                bsize = struct.unpack('<H', extra[pos + 4:pos + 6])[0]
+            pos += 4 + slen
+        if bsize is None:
+            raise ValueError('Invalid BGZF block header')
+        # the block size includes the header, extra field and the 8 byte CRC / size trailer
+        rest = f.read(bsize + 1 - _BGZF_HEADER - xlen)
+        yield rest[:-8], rest[-8:]
+
+
+def _inflate_bgzf_block(block):
+    data, trailer = block
+    out = zlib.decompress(data, -15)
+    crc, size = struct.unpack('<II', trailer)
+    if zlib.crc32(out) != crc or len(out) != size:
+        raise ValueError('BGZF block failed the integrity check')
+    return out
+
+
+def _bgzf_chunks(f, threads) -> Iterator[bytes]:
+    blocks = _read_bgzf_blocks(f)
+    batch_size = threads * _BGZF_BLOCKS_PER_THREAD
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            batch = [b for _, b in zip(range(batch_size), blocks)]
+            if not batch:
+                return
+            yield b''.join(executor.map(_inflate_bgzf_block, batch))
+
+
+class ReadAheadReader:
+    '''
+    A read only binary file handle over chunks of data that are produced in a background
+    thread, up to a few chunks ahead of the reader.
+    '''
+
+    def __init__(self, chunks: Iterator[bytes], closer=None):
+        '''
+        chunks - the data. The iterator is consumed in the background thread.
+        closer - a function to call when the reader is closed, e.g. to close the source file.
+        '''
+        self._queue = queue.Queue(_READ_AHEAD)
+        self._stop = threading.Event()
+        self._closer = closer
+        self._buf = b''
+        self._pos = 0
+        self._eof = False
+        self._thread = threading.Thread(target=self._produce, args=(chunks,), daemon=True)
+        self._thread.start()
+
+    def _produce(self, chunks):
+        try:
+            for chunk in chunks:
+                if self._stop.is_set():
+                    return
+                self._put(chunk)
+            self._put(_DONE)
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        # give up if the reader is closed and no longer taking items
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def read(self, size: int = -1) -> bytes:
+        # self._buf[self._pos:] is the data that hasn't been read yet
+        while not self._eof and (size < 0 or len(self._buf) - self._pos < size):
+            item = self._queue.get()
+            if item is _DONE:
+                self._eof = True
+            elif isinstance(item, Exception):
+                self._eof = True
+                raise item
+            elif self._pos == len(self._buf):
+                self._buf, self._pos = item, 0
+            else:
+                self._buf, self._pos = self._buf[self._pos:] + item, 0
+        end = len(self._buf) if size < 0 else min(self._pos + size, len(self._buf))
+        if self._pos == 0 and end == len(self._buf):
+            data = self._buf
+        else:
+            data = self._buf[self._pos:end]
+        self._pos = end
+        return data
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        if self._closer:
+            self._closer()
+            self._closer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_decompressed(path: Path, ctype: str, threads: int = 1) -> ReadAheadReader:
+    '''
+    Open a compressed file for reading the decompressed data.
+
+    ctype - the compression type from compression_type().
+    threads - the number of threads to use for decompressing BGZF files. Other files are
+        decompressed with one thread.
+    '''
+    if ctype == GZIP and threads > 1 and _is_bgzf(path):
+        f = open(path, 'rb')
+        return ReadAheadReader(_bgzf_chunks(f, threads), f.close)
+    f = _OPENERS[ctype](path, 'rb')
+    return ReadAheadReader(iter(lambda: f.read(_CHUNK_SIZE), b''), f.close)
+
+
+class TeeReader:
+    '''
+    A read only binary file handle that writes the data it reads to another handle.
+    '''
+
+    def __init__(self, source: BinaryIO, sink: BinaryIO):
+        self._source = source
+        self._sink = sink
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._source.read(size)
+        self._sink.write(data)
+        return data
@@ -0,0 +1,192 @@
+'''
+Support for samtools style FASTA index (.fai) files.
+
+Each line of a .fai file describes one contig with tab separated fields:
+NAME - the contig ID.
+LENGTH - the number of bases in the contig.
+OFFSET - the byte offset of the contig's first base.
+LINEBASES - the number of bases on each full line.
+LINEWIDTH - the number of bytes in each full line, including the line terminator.
+
+A file can only be indexed if, for every contig, all sequence lines other than the last have
+the same width and the last line is no longer than the others.
+'''
+
+import mmap
+import os
+from collections import namedtuple
+from pathlib import Path
+from typing import BinaryIO, Iterable, List
+
+import numpy as np
+
+FAI_SUFFIX = '.fai'
+
+# maximum bytes copied at once when extracting contigs
+_COPY_SIZE = 1024 * 1024
+_NEWLINE = ord('\n')
+# chunks of at least this size are split into lines with numpy
+_ARRAY_MIN_SIZE = 4096
+
+FaiEntry = namedtuple('FaiEntry', ['name', 'length', 'offset', 'line_bases', 'line_width'])
+
+
+def fai_path(fasta_file_path: Path) -> Path:
+    ''' Get the path of the index for a FASTA file. '''
+    return Path(str(fasta_file_path) + FAI_SUFFIX)
+
+
+def write_fai(path: Path, entries: Iterable[FaiEntry]):
+    ''' Write index entries to a file. '''
+    with open(path, 'w') as f:
+        for e in entries:
+            f.write(f'{e.name}\t{e.length}\t{e.offset}\t{e.line_bases}\t{e.line_width}\n')
+
+
+class LineLayout:
+    '''
+    Tracks the line layout of a contig's raw sequence data, as yielded by scan_fasta, to
+    determine whether the contig can be indexed and, if so, its bases and bytes per line.
+    '''
+
+    def __init__(self):
+        self.line_bases = None
+        self.line_width = None
+        self.valid = True
+        self._full_lines = 0
+        self._last_bases = 0
+        # whether a line shorter than the full line width has been seen. After that only empty
+        # lines are allowed
+        self._ended = False
+        self._empty_width = 1
+        self._partial = 0
+        self._prev = b''
+
+    def update(self, data: bytes):
+        ''' Add a chunk of raw sequence data. '''
+        if not self.valid or not data:
+            return
+        if len(data) < _ARRAY_MIN_SIZE:
+            self._update_small(data)
+            return
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 0x0a)
+        if not len(newlines):
+            self._partial += len(data)
+            self._prev = data[-1:]
+            return
+        if self.line_width is None:
+            first = newlines[0]
+            # a carriage return before the first newline could be in the previous chunk
+            before = data[first - 1:first] if first else self._prev
+            self.line_width = int(first) + 1 + self._partial
+            self._empty_width = 2 if before == b'\r' else 1
+            self.line_bases = self.line_width - self._empty_width
+        widths = np.diff(newlines, prepend=-1)
+        widths[0] += self._partial
+        self._partial = len(data) - int(newlines[-1]) - 1
+        self._prev = data[-1:]
+        self._add_lines(widths)
+
+    def _update_small(self, data: bytes):
+        # finds the lines with bytes.find, as the fixed cost of the numpy calls dominates for
+        # the short chunks of short contigs
+        end = data.find(b'\n')
+        if end == -1:
+            self._partial += len(data)
+            self._prev = data[-1:]
+            return
+        if self.line_width is None:
+            before = data[end - 1:end] if end else self._prev
+            self.line_width = end + 1 + self._partial
+            self._empty_width = 2 if before == b'\r' else 1
+            self.line_bases = self.line_width - self._empty_width
+        width = end + 1 + self._partial
+        while end != -1:
+            if not self._ended:
+                if width == self.line_width:
+                    self._full_lines += 1
+                elif width > self.line_width:
+                    self.valid = False
+                    return
+                else:
+                    self._last_bases = max(width - self._empty_width, 0)
+                    self._ended = True
+            elif width > self._empty_width:
+                self.valid = False
+                return
+            start = end + 1
+            end = data.find(b'\n', start)
+            width = end + 1 - start
+        self._partial = len(data) - start
+        self._prev = data[-1:]
+
+    def _add_lines(self, widths):
+        if not self._ended:
+            short = np.flatnonzero(widths != self.line_width)
+            if not len(short):
+                self._full_lines += len(widths)
+                return
+            self._full_lines += int(short[0])
+            width = int(widths[short[0]])
+            if width > self.line_width:
+                self.valid = False
+                return
+            self._last_bases = max(width - self._empty_width, 0)
+            self._ended = True
+            widths = widths[short[0] + 1:]
+        if (widths > self._empty_width).any():
+            self.valid = False
+
+    def entry(self, name: str, length: int, offset: int) -> FaiEntry:
+        '''
+        Get the index entry for the contig given its ID, number of bases, and the offset of the
+        start of its sequence data, or None if the contig cannot be indexed.
+        '''
+        if not self.valid:
+            return None
+        last_bases = self._last_bases
+        if self._partial:  # a final line with no terminator
+            if self.line_width is None:  # and the only line
+                return FaiEntry(name, length, offset, length, length + 1) if (
+                    self._partial == length) else None
+            if self._ended or self._partial > self.line_bases:
+                return None
+            last_bases = self._partial
+        if self.line_width is None:
+            return None
+        # anything else removed from the sequence, like spaces, breaks the byte arithmetic
+        if self._full_lines * self.line_bases + last_bases != length:
+            return None
+        return FaiEntry(name, length, offset, self.line_bases, self.line_width)
+
+
+def read_fai(path: Path) -> List[FaiEntry]:
+    ''' Read index entries from a file. '''
+    with open(path) as f:
+        return [FaiEntry(name, int(length), int(offset), int(bases), int(width))
+                for name, length, offset, bases, width in (
+                    line.rstrip('\n').split('\t') for line in f)]
+
+
+def extract_contigs(fasta_file_path: Path, entries: Iterable[FaiEntry], handle: BinaryIO):
+    '''
+    Write the header and sequence lines for the contigs in an indexed FASTA file to a file
+    handle opened in binary mode. Only the selected contigs are read from the file.
+    '''
+    with open(fasta_file_path, 'rb') as f:
+        # can't map an empty file, but then there's nothing to extract
+        if not os.fstat(f.fileno()).st_size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for e in entries:
+                # the header line ends immediately before the sequence
+                header_start = mm.rfind(b'\n', 0, e.offset - 1) + 1
+                handle.write(mm[header_start:e.offset])
+                full, last = divmod(e.length, e.line_bases) if e.line_bases else (0, 0)
+                # the last line may be unterminated at the end of the file
+                end = min(e.offset + full * e.line_width + last, len(mm))
+                for start in range(e.offset, end, _COPY_SIZE):
+                    handle.write(mm[start:min(start + _COPY_SIZE, end)])
+                # a partial last line is copied without its terminator
+                if end > e.offset and mm[end - 1] != _NEWLINE:
+                    handle.write(b'\n')
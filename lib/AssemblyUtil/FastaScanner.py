@@ -0,0 +1,567 @@
+'''
+A streaming FASTA scanner that computes Assembly contig statistics directly from the file bytes,
+without building Biopython SeqRecords or holding whole contig sequences in memory.
+
+The results are intended to be identical to parsing the file with Biopython's FASTA parser:
+text before the first header is skipped, the title is the header line minus the '>' and
+trailing whitespace, the contig ID is the first word of the title, and sequence lines have
+trailing whitespace and any internal spaces and carriage returns removed.
+'''
+
+import mmap
+import os
+from binascii import hexlify
+from hashlib import md5
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+import numpy as np
+
+from AssemblyUtil.FastaIndex import FaiEntry, LineLayout
+
+# read size for the scanner. Contig statistics are computed per chunk, so memory use is
+# bounded by this value regardless of contig size
+_BUFFER_SIZE = 1024 * 1024
+
+# event types emitted by scan_fasta
+HEADER = 0
+SEQUENCE = 1
+
+_GT = ord('>')
+
+# translates lower case ASCII to upper case
+_UPPER = bytes.maketrans(b'abcdefghijklmnopqrstuvwxyz', b'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+# removed from anywhere in a sequence line
+_REMOVED = b' \r\n'
+# everything str.rstrip() removes from the end of an ASCII line
+_WHITESPACE = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+_ACGT = b'ACGT'
+
+# line width for written FASTA files, matching Biopython's FASTA writer
+_LINE_WIDTH = 60
+
+
+def scan_fasta(handle, buffer_size=_BUFFER_SIZE):
+    '''
+    Scan a FASTA file opened in binary mode.
+
+    Yields (HEADER, title, offset) for each header line, where title is the decoded header
+    without the leading '>' or trailing whitespace and offset is the byte offset of the '>'.
+    Yields (SEQUENCE, data, offset) for the raw bytes, including line endings, between headers.
+    Sequence data for a contig may be split over many events, each at most about buffer_size
+    bytes. Any text before the first header is skipped.
+    '''
+    buf = b''
+    offset = 0  # file offset of buf[0]
+    line_start = True  # whether buf[0] is the first character of a line
+    in_record = False
+    eof = False
+    while not eof:
+        block = handle.read(buffer_size)
+        eof = not block
+        buf = buf + block if buf else block
+        pos = 0
+        end_of_buf = len(buf)
+        while pos < end_of_buf:
+            if line_start and buf[pos] == _GT:
+                newline = buf.find(b'\n', pos)
+                if newline == -1:
+                    if not eof:
+                        break  # the header continues in the next block
+                    newline = end_of_buf
+                yield HEADER, buf[pos + 1:newline].decode().rstrip(), offset + pos
+                in_record = True
+                pos = newline + 1
+                continue
+            end = buf.find(b'\n>', pos)
+            if end == -1:
+                end = end_of_buf
+                line_start = buf[end - 1] == 0x0a  # '\n'
+            else:
+                end += 1
+                line_start = True
+            if in_record:
+                yield SEQUENCE, buf[pos:end], offset + pos
+            pos = end
+        buf = buf[pos:]
+        offset += pos
+
+
+def scan_fasta_buffer(buf, start=0, end=None, chunk_size=_BUFFER_SIZE):
+    '''
+    Scan FASTA data in a buffer that supports find() and slicing, such as bytes or a read only
+    mmap. For an mmap only the chunk being processed is copied out of the page cache.
+
+    Yields the same events as scan_fasta, with offsets relative to the start of the buffer.
+    start must be the start of a line, and scanning stops at end.
+    '''
+    end = len(buf) if end is None else end
+    pos = start
+    in_record = False
+    while pos < end:
+        # pos is always at the start of a line here
+        if buf[pos] == _GT:
+            newline = buf.find(b'\n', pos, end)
+            if newline == -1:
+                newline = end
+            yield HEADER, buf[pos + 1:newline].decode().rstrip(), pos
+            in_record = True
+            pos = newline + 1
+            continue
+        next_header = buf.find(b'\n>', pos, end)
+        stop = end if next_header == -1 else next_header + 1
+        if in_record:
+            for chunk_start in range(pos, stop, chunk_size):
+                yield SEQUENCE, buf[chunk_start:min(chunk_start + chunk_size, stop)], chunk_start
+        pos = stop
+
+
+def scan_fasta_file(path: Path, use_mmap=False, buffer_size=_BUFFER_SIZE):
+    '''
+    Scan a FASTA file, yielding the same events as scan_fasta. If use_mmap is True, the file is
+    memory mapped rather than read, which lets processes reading the same file share the page
+    cache rather than copying it into private buffers.
+    '''
+    with open(path, 'rb') as f:
+        # empty files can't be mapped
+        if use_mmap and os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from scan_fasta_buffer(mm, chunk_size=buffer_size)
+        else:
+            yield from scan_fasta(f, buffer_size)
+
+
+class ContigStats:
+    '''
+    Accumulates the statistics for a single contig from raw sequence data.
+
+    Upper cases the sequence, computes the md5 of the upper cased sequence and counts
+    characters with a byte histogram chunk by chunk. Invalid characters are recorded rather
+    than raised so the caller can decide when, or whether, to report them.
+    '''
+
+    def __init__(
+            self,
+            title: str,
+            valid_chars: str,
+            sink: Callable[[bytes], None] = None,
+            offset: int = None):
+        '''
+        title - the contig title as yielded by scan_fasta.
+        valid_chars - the upper case characters allowed in the sequence.
+        sink - if provided, called with the sequence, minus whitespace but otherwise as is in
+            the file, as it is read.
+        offset - the offset of the contig header in the file, if known.
+        '''
+        self.title = title
+        self.offset = offset
+        # the file offsets of the start and end of the raw sequence data, if provided
+        self.sequence_offset = None
+        self.end = None
+        split = title.split(None, 1)
+        self.id = split[0] if split else ''
+        self.length = 0
+        self.invalid_char = None
+        self._valid = _valid_bytes(valid_chars)
+        # byte counts, with characters other than ACGT in order of first appearance
+        self._totals = {}
+        self._counts = None
+        # the number of non empty chunks added to the totals
+        self._chunks = 0
+        self._md5 = md5()
+        self._tail = b''
+        self._sink = sink
+
+    @property
+    def description(self):
+        return self.title[len(self.id):].strip()
+
+    @property
+    def counts(self):
+        '''
+        The upper cased character counts for the contig. Characters other than ACGT are in
+        order of first appearance, as collections.Counter would order them.
+        '''
+        if self._counts is None:
+            totals = self._totals
+            if self._chunks == 1:
+                # the counts of a single chunk are already in order
+                counts = {chr(b): n for b, n in totals.items()}
+            else:
+                counts = {chr(b): totals[b] for b in _ACGT if b in totals}
+                counts.update((chr(b), n) for b, n in totals.items() if b not in _ACGT)
+            self._counts = counts
+        return self._counts
+
+    def md5(self):
+        return self._md5.hexdigest()
+
+    def digest(self):
+        ''' The raw md5 digest of the upper cased sequence. '''
+        return self._md5.digest()
+
+    def update(self, data: bytes, offset: int = None):
+        '''
+        Add a chunk of raw sequence data and optionally its file offset, as yielded by
+        scan_fasta.
+        '''
+        if offset is not None:
+            if self.sequence_offset is None:
+                self.sequence_offset = offset
+            self.end = offset + len(data)
+        if self._tail:
+            data = self._tail + data
+            self._tail = b''
+        if self._sink:
+            clean = data.translate(None, _REMOVED)
+            seq = clean.translate(_UPPER)
+        else:
+            seq = data.translate(_UPPER, _REMOVED)
+        counts = _count_bytes(seq)
+        if not _WHITESPACE_SET.isdisjoint(counts):
+            clean = self._strip_lines(data)
+            seq = clean.translate(_UPPER)
+            counts = _count_bytes(seq)
+        if self._sink and clean:
+            self._sink(clean)
+        self._add(seq, counts)
+
+    def _strip_lines(self, data):
+        # rare case - whitespace other than spaces and carriage returns is only removed from
+        # line ends. Hold back trailing whitespace on an incomplete line, since it may turn
+        # out to be internal to the line
+        lines = data.split(b'\n')
+        last = lines[-1]
+        lines = [line.rstrip(_WHITESPACE) for line in lines]
+        self._tail = last[len(lines[-1]):]
+        return b''.join(lines).translate(None, _REMOVED)
+
+    def _add(self, seq, counts):
+        if not seq:
+            return
+        self.length += len(seq)
+        self._md5.update(seq)
+        self._counts = None
+        self._chunks += 1
+        totals = self._totals
+        for b, n in counts.items():
+            if b in totals:
+                totals[b] += n
+            else:
+                totals[b] = n
+                # only happens the first time a character is seen, so usually a handful of
+                # times per contig at most. counts is in order of first appearance other than
+                # ACGT, so the first new invalid character is the first in the sequence
+                if self.invalid_char is None and b not in self._valid and b not in _ACGT:
+                    first = seq.find(b)
+                    self.invalid_char = seq[first:first + 4].decode(errors='replace')[0]
+
+
+class ContigSummary:
+    '''
+    The statistics of a fully scanned contig, with the same interface as ContigStats but
+    without the scanning state, so it can be pickled or stored.
+    '''
+
+    def __init__(
+            self,
+            title: str,
+            offset: int,
+            sequence_offset: int,
+            end: int,
+            length: int,
+            invalid_char: str,
+            counts,
+            digest: bytes,
+            index_entry: FaiEntry = None):
+        '''
+        The arguments are the values of the ContigStats attributes and methods of the same
+        names for the contig, and the FASTA index entry for the contig, if required.
+        '''
+        self.title = title
+        split = title.split(None, 1)
+        self.id = split[0] if split else ''
+        self.offset = offset
+        self.sequence_offset = sequence_offset
+        self.end = end
+        self.length = length
+        self.invalid_char = invalid_char
+        self.counts = counts
+        self.index_entry = index_entry
+        self._digest = digest
+
+    @classmethod
+    def from_stats(cls, contig: ContigStats, index_entry: FaiEntry = None):
+        ''' Summarize a fully scanned contig. '''
+        return cls(contig.title, contig.offset, contig.sequence_offset, contig.end,
+                   contig.length, contig.invalid_char, contig.counts, contig.digest(),
+                   index_entry)
+
+    @property
+    def description(self):
+        return self.title[len(self.id):].strip()
+
+    def md5(self):
+        return self._digest.hex()
+
+    def digest(self):
+        return self._digest
+
+
+class AssemblyHasher:
+    '''
+    Computes the assembly level md5, which is the md5 of the sorted, comma separated hex md5s
+    of the contigs. Contig digests are stored as packed 16 byte values rather than as a list of
+    hex strings.
+    '''
+
+    def __init__(self):
+        self._digests = bytearray()
+
+    def add(self, digest: bytes):
+        ''' Add a contig's raw md5 digest. '''
+        self._digests += digest
+
+    def hexdigest(self):
+        # sorting the raw digests gives the same order as sorting the lower case hex strings
+        digests = np.frombuffer(bytes(self._digests), dtype='>u8').reshape(-1, 2)
+        digests = digests[np.lexsort((digests[:, 1], digests[:, 0]))]
+        hexes = np.frombuffer(hexlify(digests.tobytes()), dtype=np.uint8).reshape(-1, 32)
+        commas = np.full((len(hexes), 1), ord(','), dtype=np.uint8)
+        return md5(np.hstack((hexes, commas)).tobytes()[:-1]).hexdigest()
+
+
+class FilteredFastaWriter:
+    '''
+    Writes contigs at least a minimum length to a FASTA file as they are scanned, in the same
+    format as Biopython's FASTA writer. Only the first min_length bases of a contig are held in
+    memory while waiting to see if the contig is long enough to keep.
+    '''
+
+    def __init__(self, handle: BinaryIO, min_length: int):
+        self._handle = handle
+        self._min_length = min_length
+        self._position = 0
+        self.contigs = 0
+        self.contigs_written = 0
+        # FASTA index entries for the written contigs
+        self.index = []
+
+    def start(self, title: str):
+        ''' Start a new contig. Any previous contig must be finished. '''
+        self.contigs += 1
+        split = title.split(None, 1)
+        self._id = split[0] if split else ''
+        self._pending = [b'>' + title.encode() + b'\n']
+        self._pending_length = 0
+        self._length = 0
+        self._column = 0
+
+    def write(self, seq: bytes):
+        ''' Write sequence, without whitespace, for the current contig. '''
+        if self._pending is not None:
+            self._pending.append(seq)
+            self._pending_length += len(seq)
+            if self._pending_length < self._min_length:
+                return
+            seq = b''.join(self._pending[1:])
+            self._write(self._pending[0])
+            self._sequence_offset = self._position
+            self._pending = None
+        self._length += len(seq)
+        self._write_wrapped(seq)
+
+    def finish(self) -> bool:
+        ''' Finish the current contig, returning True if the contig was written. '''
+        if self._pending is not None:
+            self._pending = None
+            return False
+        if self._column:
+            self._write(b'\n')
+        self.contigs_written += 1
+        self.index.append(FaiEntry(
+            self._id, self._length, self._sequence_offset, _LINE_WIDTH, _LINE_WIDTH + 1))
+        return True
+
+    def _write(self, data):
+        self._handle.write(data)
+        self._position += len(data)
+
+    def _write_wrapped(self, seq):
+        if self._column:
+            fill = seq[:_LINE_WIDTH - self._column]
+            seq = seq[len(fill):]
+            self._write(fill)
+            self._column += len(fill)
+            if self._column < _LINE_WIDTH:
+                return
+            self._write(b'\n')
+        full = len(seq) - len(seq) % _LINE_WIDTH
+        if full:
+            lines = np.frombuffer(seq, dtype=np.uint8, count=full).reshape(-1, _LINE_WIDTH)
+            newlines = np.full((len(lines), 1), 0x0a, dtype=np.uint8)
+            self._write(np.hstack((lines, newlines)).tobytes())
+        self._column = len(seq) - full
+        if self._column:
+            self._write(seq[full:])
+
+
+def _count_bytes(seq: bytes):
+    # counts of the bytes in seq, ACGT first and then the other bytes in order of first
+    # appearance. Short sequences, e.g. a contig of a few hundred bases that fits in a single
+    # chunk, are counted with bytes methods since a numpy histogram has a high fixed cost
+    if len(seq) > _HISTOGRAM_MIN_SIZE:
+        hist = np.bincount(np.frombuffer(seq, dtype=np.uint8), minlength=256)
+        counts = {b: int(hist[b]) for b in _ACGT if hist[b]}
+        others = np.flatnonzero((hist > 0) & _NOT_ACGT).tolist()
+        counts.update((b, int(hist[b])) for b in sorted(others, key=seq.find))
+        return counts
+    counts = {}
+    for b in _ACGT:
+        n = seq.count(b)
+        if n:
+            counts[b] = n
+    rest = seq.translate(None, _ACGT)
+    while rest:
+        b = rest[0]
+        counts[b] = rest.count(b)
+        rest = rest.replace(rest[:1], b'')
+    return counts
+
+
+# sequences longer than this are counted with a numpy histogram
+_HISTOGRAM_MIN_SIZE = 64 * 1024
+_WHITESPACE_SET = frozenset(_WHITESPACE)
+_NOT_ACGT = np.ones(256, dtype=bool)
+_NOT_ACGT[list(_ACGT)] = False
+_VALID_BYTES = {}
+
+
+def _valid_bytes(valid_chars: str):
+    if valid_chars not in _VALID_BYTES:
+        _VALID_BYTES[valid_chars] = frozenset(valid_chars.encode())
+    return _VALID_BYTES[valid_chars]
+
+
+def index_fasta_file(path: Path, use_mmap=True):
+    '''
+    Build the FASTA index for a file in one pass. Returns a list of FaiEntry, or None if the
+    file's line layout can't be indexed.
+    '''
+    index = []
+    contig = None
+    layout = None
+    for event, data, offset in scan_fasta_file(path, use_mmap):
+        if event == HEADER:
+            if contig:
+                index.append(layout.entry(contig.id, contig.length, contig.sequence_offset))
+            contig = ContigStats(data, '')
+            layout = LineLayout()
+        else:
+            contig.update(data, offset)
+            layout.update(data)
+    if contig:
+        index.append(layout.entry(contig.id, contig.length, contig.sequence_offset))
+    return None if None in index else index
+
+
+def normalize_fasta_file(path: Path, output_path: Path, use_mmap=True):
+    '''
+    Rewrite a FASTA file with the same line layout as Biopython's FASTA writer, dropping empty
+    contigs. The result can always be indexed. Returns the index of the new file.
+    '''
+    with open(output_path, 'wb') as f:
+        writer = FilteredFastaWriter(f, 1)
+        contig = False
+        for event, data, _ in scan_fasta_file(path, use_mmap):
+            if event == HEADER:
+                if contig:
+                    writer.finish()
+                writer.start(data)
+                contig = True
+            else:
+                writer.write(data.translate(None, _WHITESPACE))
+        if contig:
+            writer.finish()
+    return writer.index
+
+
+def split_fasta_file(path: Path, count: int):
+    '''
+    Split a FASTA file into at most count byte ranges of about the same size, for scanning the
+    ranges separately. Every range but the first starts at a header line, so no contig spans
+    two ranges. Returns a list of (start, end) offsets.
+    '''
+    size = os.path.getsize(path)
+    if not size:
+        return [(0, 0)]
+    starts = [0]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, count):
+            # the '\n' before the header may be just before the target offset
+            newline = mm.find(b'\n>', max(size * i // count - 1, starts[-1]))
+            if newline == -1:
+                break
+            starts.append(newline + 1)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def summarize_fasta_range(
+        path: Path, start: int, end: int, valid_chars: str, index=False, use_mmap=True):
+    '''
+    Scan the contigs in a byte range from split_fasta_file, yielding a ContigSummary for each
+    contig. Offsets are relative to the start of the file.
+
+    valid_chars - the upper case characters allowed in the sequence.
+    index - whether to include the FASTA index entry for each contig.
+    use_mmap - memory map the file rather than reading it.
+    '''
+    contig = None
+    layout = None
+    with open(path, 'rb') as f:
+        if use_mmap and end > start:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            events = scan_fasta_buffer(mm, start, end)
+        else:
+            mm = None
+            f.seek(start)
+            events = ((e, d, o + start) for e, d, o in scan_fasta(_RangeReader(f, end - start)))
+        try:
+            for event, data, offset in events:
+                if event == HEADER:
+                    if contig:
+                        yield _summary(contig, layout)
+                    contig = ContigStats(data, valid_chars, offset=offset)
+                    layout = LineLayout() if index else None
+                else:
+                    contig.update(data, offset)
+                    if layout:
+                        layout.update(data)
+            if contig:
+                yield _summary(contig, layout)
+        finally:
+            if mm is not None:
+                events.close()
+                mm.close()
+
+
+def _summary(contig: ContigStats, layout: LineLayout):
+    entry = None
+    if layout:
+        entry = layout.entry(contig.id, contig.length, contig.sequence_offset)
+    return ContigSummary.from_stats(contig, entry)
+
+
+class _RangeReader:
+    # reads at most size bytes from a file handle
+
+    def __init__(self, handle: BinaryIO, size: int):
+        self._handle = handle
+        self._remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._handle.read(size)
+        self._remaining -= len(data)
+        return data
@@ -3,14 +3,37 @@ import itertools
 import json
 import math
 import os
+import shutil
 import sys
+import threading
 import uuid
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import md5
-from multiprocessing import Pool
+from multiprocessing import Pool, current_process
 from pathlib import Path
-from typing import Callable, List
+from typing import BinaryIO, Callable, List
 
+from AssemblyUtil.Checkpoint import ImportCheckpoints
+from AssemblyUtil.ContigStore import ContigStore, SpilledContigs
+from AssemblyUtil.ContigSummaryFile import ContigSummaryWriter, read_contig_summaries
+from AssemblyUtil.ContigTable import (
+    ContigTable, dump_json, read_contig_table, write_contig_table
+)
+from AssemblyUtil.Decompress import (
+    GZIP, TeeReader, compression_type, decompressed_path, is_tar_archive, open_decompressed
+)
+from AssemblyUtil.FastaIndex import LineLayout, fai_path, write_fai
+from AssemblyUtil.FastaScanner import (
+    AssemblyHasher, ContigStats, FilteredFastaWriter, HEADER, scan_fasta, scan_fasta_file,
+    split_fasta_file, summarize_fasta_range
+)
+from AssemblyUtil.Gzip import GzipTee, gzip_file_async, gzip_path
+from AssemblyUtil.Pipeline import Pipeline, Stage
+from AssemblyUtil.Retry import Retrier
+from AssemblyUtil.ServiceClient import use_shared_session
+from AssemblyUtil.UploadCache import UploadCache
+from AssemblyUtil.WorkerPlan import plan_workers
 from Bio import SeqIO
 from installed_clients.DataFileUtilClient import DataFileUtil
 from installed_clients.baseclient import ServerError
@@ -31,14 +54,34 @@ _NODE = 'node'
 _ASSEMBLY_NAME = 'assembly_name'
 _OBJ_META = 'object_metadata'
 
+# the smallest byte range of a FASTA file worth parsing in a separate process
+_MIN_RANGE_SIZE = 64 * 1024 * 1024
+
+# the typical ratio of uncompressed to compressed size for FASTA files
+_COMPRESSION_RATIO = 4
+
+_CHECKPOINT_DIR = 'import_checkpoints'
+_UPLOAD_CACHE_DIR = 'upload_cache'
+
+# FASTA parsing engines
+PARSER_NATIVE = 'native'
+PARSER_BIOPYTHON = 'biopython'
+_PARSERS = (PARSER_NATIVE, PARSER_BIOPYTHON)
+
 
 def _upa(object_info):
     return f'{object_info[6]}/{object_info[0]}/{object_info[4]}'
 
 def _get_serialized_object_size(assembly_object):
-    arg_hash = {'params': assembly_object}
-    serialized = json.dumps(arg_hash)
-    return len(serialized)
+    contigs = assembly_object.get('contigs')
+    if not isinstance(contigs, (ContigTable, SpilledContigs)):
+        arg_hash = {'params': assembly_object}
+        serialized = json.dumps(arg_hash)
+        return len(serialized)
+    # serialize everything but the contigs, and add the contigs' precomputed size
+    rest = {k: v for k, v in assembly_object.items() if k != 'contigs'}
+    size = len(json.dumps({'params': rest})) + len('"contigs"') + 2
+    return size + contigs.json_size + (2 if rest else 0)
 
 def _validate_threads_param_input(threads_count, var_name):
     # max_threads must be an integer and > 0
@@ -58,27 +101,208 @@ def _validate_max_cumsize(max_cumsize):
         raise ValueError(f"max_cumsize must be <= {upper_bound}")
     return max_cumsize
 
-def _get_num_workers(threads_per_cpu, max_threads):
-    threads = int(threads_per_cpu * os.cpu_count())
-    workers = min(max(threads, 1), max_threads)
-    return workers
+def _batch_error(params, e: ServerError):
+    # each parallel batch is saved separately, so the workspace's object numbers are relative
+    # to the batch rather than the inputs. Name the batch's assemblies in the error
+    print(f"Error:\n{e}\nfrom the server side stack trace")
+    names = ', '.join(inp[_ASSEMBLY_NAME] for inp in params[_INPUTS])
+    return ValueError(f'Error importing assembly {names}: {e.message}')
 
 def _run_dill_encoded(fun, params, max_cumsize):
     fun = dill.loads(fun)
     try:
         return fun(params, max_cumsize)
     except ServerError as e:
-        print(f"Error:\n{e}\nfrom the server side stack trace")
-        raise ValueError(e.message)
+        raise _batch_error(params, e)
 
 def _apply_starmap(workers, fun, batch_input, batch_max_cumsize):
-    pool = Pool(processes=workers)
     fun = dill.dumps(fun)
     payloads = [
         (fun, params, max_cumsize)
         for params, max_cumsize in zip(batch_input, batch_max_cumsize)
     ]
-    return pool.starmap(_run_dill_encoded, payloads)
+    with Pool(processes=workers) as pool:
+        # hand out one payload at a time so idle workers take the next payload from the queue
+        return pool.starmap(_run_dill_encoded, payloads, chunksize=1)
+
+# state for worker processes in an ImportWorkerPool
+_worker_state = {}
+
+def _init_worker(callback_url, scratch):
+    _worker_state.clear()
+    _worker_state['callback_url'] = callback_url
+    _worker_state['scratch'] = scratch
+
+def _run_worker_parse(scratch, options, input_file, inp, mcl, table_path):
+    # runs in a parse process for a pipelined import. The parse doesn't call any services.
+    # The contig map can have millions of entries, so it's returned through a file rather
+    # than pickled through the pool's pipe
+    fta = FastaToAssembly(None, scratch, **options)
+    input_file, upload_file, assdata = fta._parse_input(input_file, inp, mcl)
+    assdata['contigs'] = write_contig_table(assdata['contigs'], table_path)
+    return input_file, upload_file, assdata
+
+def _run_worker_import(token, options, params, max_cumsize):
+    # reuse the DataFileUtil client as long as the token doesn't change
+    if _worker_state.get('token') != token or 'dfu' not in _worker_state:
+        _worker_state['dfu'] = use_shared_session(
+            DataFileUtil(_worker_state['callback_url'], token=token))
+        _worker_state['token'] = token
+    fta = FastaToAssembly(_worker_state['dfu'], _worker_state['scratch'], token=token, **options)
+    try:
+        return fta._import_fasta_mass(params, max_cumsize)
+    except ServerError as e:
+        raise _batch_error(params, e)
+
+
+class ImportWorkerPool:
+    """
+    A long lived process pool for importing FASTA files in parallel. The pool is intended to be
+    owned by a long lived object, like the service implementation, so that the worker processes
+    are created once and reused across calls.
+
+    The pool is sized once, at the most workers any call may use, and each call limits how many
+    of its batches run at once, so calls with different worker counts don't restart the pool.
+
+    Each worker process creates its own DataFileUtil client and only replaces it when a call
+    is made with a different token, so only the import parameters are sent to the workers.
+    """
+
+    def __init__(self, callback_url: str, scratch: Path, max_workers: int):
+        """
+        callback_url - the callback URL for the DataFileUtil client in the worker processes.
+        scratch - the scratch directory for temporary files.
+        max_workers - the number of worker processes, and so the most batches that can run at
+            once across all calls.
+        The worker processes are not started until the first call to run.
+        """
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1')
+        self._callback_url = callback_url
+        self._scratch = scratch
+        self._max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                print(f' - starting a pool of {self._max_workers} import workers')
+                self._pool = Pool(
+                    processes=self._max_workers,
+                    initializer=_init_worker,
+                    initargs=(self._callback_url, self._scratch))
+            return self._pool
+
+    def run(self, workers: int, token: str, options, batch_input, batch_max_cumsize):
+        """
+        Import each batch of inputs in a worker process.
+
+        workers - the most batches to import at once for this call. Limited to the size of
+            the pool.
+        token - the user's token.
+        options - keyword arguments for the FastaToAssembly instance in the worker processes.
+        batch_input - the parameters for each batch.
+        batch_max_cumsize - the max_cumsize for each batch.
+
+        Returns the results for each batch in order.
+        """
+        pool = self._get_pool()
+        # submit a batch only when one of this call's batches finishes, so the other workers
+        # are left to other calls
+        running = threading.Semaphore(max(min(workers, self._max_workers), 1))
+        failed = threading.Event()
+
+        def done(_):
+            running.release()
+
+        def error(_):
+            failed.set()
+            running.release()
+
+        results = []
+        for params, max_cumsize in zip(batch_input, batch_max_cumsize):
+            running.acquire()
+            if failed.is_set():
+                break  # the error is raised below, so don't start more batches
+            results.append(pool.apply_async(
+                _run_worker_import, (token, options, params, max_cumsize),
+                callback=done, error_callback=error))
+        return [r.get() for r in results]
+
+    def close(self):
+        """ Stop the worker processes, waiting for any running work to complete. """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+def _input_sizes(inputs):
+    # Blobstore node sizes aren't available without downloading the node, so those inputs
+    # have an unknown size, None
+    sizes = []
+    for inp in inputs:
+        try:
+            sizes.append(os.path.getsize(inp[_FILE]) if _FILE in inp else None)
+        except OSError:
+            sizes.append(0)  # the missing file is reported when staging the input
+    return sizes
+
+def _fasta_sizes(inputs, sizes):
+    # estimates the uncompressed size of the input files for planning the workers' memory
+    fasta_sizes = []
+    for inp, size in zip(inputs, sizes):
+        try:
+            compressed = size and compression_type(inp[_FILE])
+        except OSError:
+            compressed = False
+        fasta_sizes.append(size * _COMPRESSION_RATIO if compressed else size)
+    return fasta_sizes
+
+def _summarize_range(path, start, end, valid_chars, index, use_mmap, summary_path):
+    # runs in a range parsing process. Writes the contigs scanned before any error to the
+    # summary file, so the parent can report errors in the same order as a serial parse, and
+    # returns the file's descriptor rather than sending the contigs back through the pool
+    writer = ContigSummaryWriter(summary_path)
+    error = None
+    try:
+        for contig in summarize_fasta_range(path, start, end, valid_chars, index, use_mmap):
+            writer.add(contig)
+    except Exception as e:
+        error = e
+    return writer.close(), error
+
+class _AssemblyStats:
+    """ Accumulates the assembly level statistics for contigs in file order. """
+
+    def __init__(self):
+        self.total_length = 0
+        self.base_counts = {'A': 0, 'G': 0, 'C': 0, 'T': 0}
+        self.hasher = AssemblyHasher()
+        self.contigs = ContigTable()
+
+    def add(self, contig_id, description, length, counts, digest: bytes, gc_content,
+            is_circ=None):
+        self.total_length += length
+        base_counts = self.base_counts
+        for character, count in counts.items():
+            base_counts[character] = base_counts.get(character, 0) + count
+        self.hasher.add(digest)
+        try:
+            self.contigs.add_contig(contig_id, description, length, counts.get('N'), digest,
+                                    gc_content, is_circ)
+        except ValueError:
+            raise ValueError('The FASTA header key ' + contig_id +
+                             'appears more than once in the file') from None
+
+def _largest_first(sizes):
+    """
+    Get the order in which to dispatch work items of the given sizes to a shared queue.
+    Dispatching the largest items first is the longest processing time first heuristic.
+    Items of unknown size, None, may be the largest and go first in their original order.
+    """
+    return sorted(range(len(sizes)), key=lambda i: -math.inf if sizes[i] is None else -sizes[i])
 
 class FastaToAssembly:
 
@@ -88,10 +312,125 @@ class FastaToAssembly:
     def __init__(self,
              dfu: DataFileUtil,
              scratch: Path,
-             uuid_gen: Callable[[], uuid.UUID] = lambda: uuid.uuid4()):
+             uuid_gen: Callable[[], uuid.UUID] = lambda: uuid.uuid4(),
+             fasta_parser: str = PARSER_NATIVE,
+             use_mmap: bool = True,
+             write_fai: bool = False,
+             worker_pool: ImportWorkerPool = None,
+             token: str = None,
+             pipeline_queue_size: int = 0,
+             max_save_objects: int = None,
+             save_concurrency: int = 4,
+             spill_contigs: bool = False,
+             max_retries: int = 3,
+             checkpoint: bool = False,
+             reuse_uploads: bool = False,
+             gzip_uploads: bool = False,
+             stream_decompress: bool = False,
+             decompress_threads: int = 1,
+             parse_processes: int = 1,
+             io_threads: int = 1,
+             parse_workers: int = 0):
+        """
+        dfu - the DataFileUtil client.
+        scratch - the scratch directory for temporary files.
+        uuid_gen - a generator of UUIDs for temporary directory names.
+        fasta_parser - the FASTA parser to use. Either 'native' or 'biopython'.
+        use_mmap - memory map uncompressed FASTA files rather than reading them when using the
+            native parser.
+        write_fai - write a samtools style FASTA index next to each parsed FASTA file when
+            using the native parser. The line layout is only tracked when the index is written,
+            and the service doesn't keep the staged files, so this is off by default.
+        worker_pool - a pool of worker processes for parallel imports. If not provided, a
+            temporary pool is created for each parallel import.
+        token - the user's token, required if worker_pool is provided.
+        pipeline_queue_size - if > 0, import multiple inputs in a single process with a
+            pipeline where each input is staged, parsed, uploaded and saved independently,
+            allowing at most this many inputs to wait between stages. Each assembly is saved
+            to the workspace separately.
+        max_save_objects - the maximum number of assembly objects to save to the workspace in
+            one call, in addition to the limit on their serialized size.
+        save_concurrency - the maximum number of concurrent workspace save calls.
+        spill_contigs - when importing multiple inputs without the pipeline, write each
+            assembly's contig map to a file in the scratch space once it is parsed and read it
+            back when the assembly is saved, rather than holding all the contig maps in memory.
+        max_retries - the maximum number of times to retry a Blobstore upload or workspace save
+            that fails with a transient error. Only the failed call is retried, so a failed
+            save reuses the already uploaded files.
+        checkpoint - record the parse results and Blobstore handles for each input in the
+            scratch space as the import progresses, and skip the completed steps for inputs
+            that were already parsed or uploaded when an import is rerun with the same inputs
+            and token. The checkpoints are removed once an input's assembly is saved.
+        reuse_uploads - keep a cache of uploaded FASTA files in the scratch space, and reuse
+            the existing Blobstore node when an identical file is imported again with the same
+            token rather than uploading it again.
+        gzip_uploads - upload a gzipped copy of each FASTA file, or of the filtered file if
+            min_contig_length is set, written alongside the file while it is parsed. Downloads
+            of the file with DataFileUtil uncompress it as usual.
+        stream_decompress - when using the native parser, parse gzip, bzip2 and xz compressed
+            inputs while decompressing them rather than having DataFileUtil decompress them to
+            disk first. If min_contig_length is set only the filtered file is written.
+            Otherwise the decompressed data isn't written to disk: gzip inputs are uploaded as
+            they are, and other inputs as a gzipped copy written while they are parsed.
+        decompress_threads - the number of threads to use for decompressing BGZF (bgzip)
+            inputs when stream_decompress is set.
+        parse_processes - when using the native parser, parse large uncompressed FASTA files
+            in up to this many processes, each parsing a byte range of the file, and merge the
+            results. Ranges are at least 64MB. Files are parsed in a single process when
+            running in a worker process for a parallel import.
+        io_threads - the number of threads for the staging and Blobstore upload stages of the
+            pipelined import.
+        parse_workers - if > 0, the pipelined import parses inputs in a pool of this many
+            processes, while staging, uploads and saves run in threads in this process.
+            Parallel imports with a pipeline_queue_size > 0 then run the pipeline rather than
+            an import process per input, so the I/O concurrency and the CPU concurrency for
+            parsing are sized independently.
+        """
+        if worker_pool and not token:
+            raise ValueError('A token is required when providing a worker pool')
+        if fasta_parser not in _PARSERS:
+            raise ValueError(f"fasta_parser must be one of {_PARSERS}, got: {fasta_parser}")
+        self._max_save_objects = self._get_int(max_save_objects, 'max_save_objects')
+        self._save_concurrency = self._get_int(save_concurrency, 'save_concurrency')
+        if self._save_concurrency is None:
+            raise ValueError('save_concurrency is required')
+        max_retries = self._get_int(max_retries, 'max_retries', minimum=0)
+        if max_retries is None:
+            raise ValueError('max_retries is required')
+        self._retrier = Retrier(max_retries)
         self._scratch = scratch
         self._dfu = dfu
         self._uuid_gen = uuid_gen
+        self._fasta_parser = fasta_parser
+        self._use_mmap = use_mmap
+        self._write_fai = write_fai
+        self._worker_pool = worker_pool
+        self._token = token
+        self._pipeline_queue_size = self._get_int(
+            pipeline_queue_size, 'pipeline_queue_size', minimum=0)
+        if self._pipeline_queue_size is None:
+            raise ValueError('pipeline_queue_size is required')
+        self._spill_contigs = spill_contigs
+        self._gzip_uploads = gzip_uploads
+        self._stream_decompress = stream_decompress and fasta_parser == PARSER_NATIVE
+        self._decompress_threads = self._get_int(decompress_threads, 'decompress_threads')
+        if self._decompress_threads is None:
+            raise ValueError('decompress_threads is required')
+        self._parse_processes = self._get_int(parse_processes, 'parse_processes')
+        if self._parse_processes is None:
+            raise ValueError('parse_processes is required')
+        self._io_threads = self._get_int(io_threads, 'io_threads')
+        if self._io_threads is None:
+            raise ValueError('io_threads is required')
+        self._parse_workers = self._get_int(parse_workers, 'parse_workers', minimum=0)
+        if self._parse_workers is None:
+            raise ValueError('parse_workers is required')
+        self._checkpoints = None
+        if checkpoint:
+            self._checkpoints = ImportCheckpoints(scratch / _CHECKPOINT_DIR, token)
+        self._upload_cache = None
+        if reuse_uploads:
+            self._upload_cache = UploadCache(scratch / _UPLOAD_CACHE_DIR, token)
 
     def import_fasta(self, params):
         print('validating parameters')
@@ -111,10 +450,17 @@ class FastaToAssembly:
         _validate_threads_param_input(threads_per_cpu, "THREADS_PER_CPU")
         _validate_threads_param_input(max_threads, "MAX_THREADS")
         max_cumsize = _validate_max_cumsize(max_cumsize)
-        if not parallelize or len(params[_INPUTS]) == 1:
+        # the pipeline runs in this process, parsing in a thread or, if parse_workers is set,
+        # in its own process pool. The import workers only get one input each, which
+        # wouldn't run the pipeline
+        if not parallelize or len(params[_INPUTS]) == 1 or self._pipeline_queue_size:
             return self._import_fasta_mass(params, max_cumsize)
-        workers = _get_num_workers(threads_per_cpu, max_threads)
-        return self._run_parallel_import_fasta_mass(params, workers, max_cumsize)
+        inputs = params[_INPUTS]
+        plan = plan_workers(
+            threads_per_cpu, max_threads, _fasta_sizes(inputs, _input_sizes(inputs)))
+        # log the limits behind the worker count so operators can tune the catalog parameters
+        print(f' - {plan}')
+        return self._run_parallel_import_fasta_mass(params, plan.workers, max_cumsize)
 
     def _import_fasta_mass(self, params, max_cumsize=_MAX_DATA_SIZE * _SAFETY_FACTOR):
         # For now this is completely serial, but theoretically we could start uploading
@@ -122,43 +468,107 @@ class FastaToAssembly:
         # Workspace obects when some fraction of the Blobstore nodes are done, parallelize
         # the file filtering / parsing, etc.
         # For now keep it simple
-        # Also note all the assembly data is kept in memory once parsed, but it contains
-        # no sequence info and so shouldn't be too huge. Could push to KBase in batches or
-        # save to disk if that's an issue
-        # We also probably want to add some retries for saving data, but that should go
-        # in DataFileUtils if it's not there already
+        # Also note all the assembly data is kept in memory once parsed unless spill_contigs is
+        # set, but it contains no sequence info and so shouldn't be too huge.
+        # Uploads and saves that fail with transient errors are retried individually, so
+        # a failed save doesn't repeat the parsing or uploads.
         # Finally, if more than 1G worth of assembly object data is sent to the workspace at once,
         # the call will fail. May need to add some checking / splitting code around this.
-        if _FILE in params[_INPUTS][0]:
-            input_files = self._stage_file_inputs(params[_INPUTS])
-        else:
-            input_files = self._stage_blobstore_inputs(params[_INPUTS])
+        if self._pipeline_queue_size and len(params[_INPUTS]) > 1:
+            return self._import_fasta_mass_pipelined(params, max_cumsize)
+        inputs = params[_INPUTS]
+        checkpoints = [self._load_checkpoint(i, inp, params.get(_MCL))
+                       for i, inp in enumerate(inputs)]
+        # only stage the inputs that weren't parsed in an earlier run
+        todo = [i for i, (_, cp) in enumerate(checkpoints) if not cp]
+        input_files = [cp['file'] if cp else None for _, cp in checkpoints]
+        upload_files = [cp['upload_file'] if cp else None for _, cp in checkpoints]
+        if todo:
+            staged = self._stage_inputs([inputs[i] for i in todo])
+            for i, f in zip(todo, staged):
+                input_files[i] = f
+
+        store = None
+        if self._spill_contigs:
+            store = ContigStore(self._create_temp_dir() / 'contigs.bin')
+        try:
+            output, assembly_infos = self._parse_and_save(
+                params, input_files, upload_files, max_cumsize, store, checkpoints)
+        finally:
+            if store:
+                store.close()
+        for key, _ in checkpoints:
+            if key:
+                self._checkpoints.remove(key)
+
+        for out, ai in zip(output, assembly_infos):
+            out['upa'] = _upa(ai)
+            out['object_info'] = ai
+        return output
+
+    def _load_checkpoint(self, index, inp, mcl):
+        """
+        Get the checkpoint key and checkpoint for an input. Both are None if checkpoints
+        aren't enabled, and the checkpoint is None if the input has no usable checkpoint.
+        """
+        if not self._checkpoints:
+            return None, None
+        key = self._checkpoints.key(inp, _FILE, _NODE, mcl, self._gzip_uploads)
+        cp = self._checkpoints.load(key) if key else None
+        if cp:
+            print(f'resuming input #{index + 1} from a checkpoint, skipping staging, parsing'
+                  + (' and upload' if cp['handle'] else ''))
+        return key, cp
 
+    def _stage_inputs(self, inputs) -> List[Path]:
+        if _FILE in inputs[0]:
+            return self._stage_file_inputs(inputs)
+        return self._stage_blobstore_inputs(inputs)
+
+    def _parse_and_save(
+            self,
+            params,
+            input_files,
+            upload_files,
+            max_cumsize,
+            store: ContigStore = None,
+            checkpoints=None):
+        """
+        Parse the staged input files, upload them, and save the assembly objects. The files to
+        upload are filled in as the inputs are parsed. If a store
+        is provided, the contig maps are written to it as each file is parsed and only read
+        back when their batch is saved. Inputs with a checkpoint are not parsed again, and not
+        uploaded again if the checkpoint has a handle.
+        """
         mcl = params.get(_MCL)
+        checkpoints = checkpoints or [(None, None)] * len(input_files)
         assembly_data = []
         output = []
-        for i in range(len(input_files)):
-            # Hmm, all through these printouts we should really put the blobstore node here as
-            # well as the file if it exists... wait and see if that code path is still actually
-            # used
-            if mcl:
-                print(f'filtering FASTA file {input_files[i]} by contig length '
-                      + f'(min len={mcl} bp)')
-                input_files[i] = self._filter_contigs_by_length(input_files[i], mcl)
+        for i, (key, cp) in enumerate(checkpoints):
+            if cp:
+                assdata = cp['assembly_data']
+            else:
+                input_files[i], upload_files[i], assdata = self._parse_input(
+                    input_files[i], params[_INPUTS][i], mcl)
+                if key:
+                    self._checkpoints.save_parsed(
+                        key, input_files[i], assdata, upload_files[i])
             output.append({'filtered_input': str(input_files[i]) if mcl else None})
-            print(f'parsing FASTA file: {input_files[i]}')
-            assdata = self._parse_fasta(
-                input_files[i],
-                params[_INPUTS][i].get('contig_info') or {})
-            print(f' - parsed {assdata["num_contigs"]} contigs, {assdata["dna_size"]} bp')
-            if not assdata["num_contigs"]:
-                raise ValueError("Either the original FASTA file contained no sequences or they "
-                                 + "were all filtered out based on the min_contig_length "
-                                 + f"parameter for file {input_files[i]}")
+            if store:
+                assdata['contigs'] = store.put(assdata['contigs'])
             assembly_data.append(assdata)
 
         print('saving assemblies to KBase')
-        file_handles = self._save_files_to_blobstore(input_files)
+        file_handles = [cp['handle'] if cp else None for _, cp in checkpoints]
+        upload = [i for i, h in enumerate(file_handles) if not h]
+        if upload:
+            uploaded = self._save_files_to_blobstore(
+                [upload_files[i] for i in upload],
+                [assembly_data[i]['md5'] for i in upload])
+            for i, handle in zip(upload, uploaded):
+                file_handles[i] = handle
+                if checkpoints[i][0]:
+                    self._checkpoints.save_handle(checkpoints[i][0], handle)
         assobjects = []
         assmetas = []
         for assdata, file_handle, inputs, sourcefile in zip(
@@ -166,49 +576,240 @@ class FastaToAssembly:
             ao, am = self._build_assembly_object(assdata, file_handle, inputs)
             assobjects.append(ao)
             assmetas.append(am)
-            # this appears to be completely unused
-            with open(sourcefile.parent / "example.json", "w") as f:
-                json.dump(ao, f)
+            # this appears to be completely unused, and would defeat the point of the store.
+            # The directory may be gone if the file was uploaded before a checkpoint
+            if not store and sourcefile.parent.is_dir():
+                with open(sourcefile.parent / "example.json", "w") as f:
+                    dump_json(ao, f)
 
         # save to WS and return
-        assembly_infos = []
         assembly_names = [p[_ASSEMBLY_NAME] for p in params[_INPUTS]]
-        # generator to process files in bach. Avoid memory issues
-        for assobject_batch, assmeta_batch, assembly_name_batch in self._assembly_objects_generator(
-            assobjects, assmetas, assembly_names, max_cumsize
-        ):
-            assembly_infos.extend(
-                self._save_assembly_objects(params[_WSID],
-                                            assembly_name_batch,
-                                            assobject_batch,
-                                            assmeta_batch)
-            )
+        assembly_infos = self._save_assembly_objects_batched(
+            params[_WSID], assembly_names, assobjects, assmetas, max_cumsize)
+        return output, assembly_infos
 
-        for out, ai in zip(output, assembly_infos):
-            out['upa'] = _upa(ai)
-            out['object_info'] = ai
-        return output
+    def _parse_input(self, input_file: Path, inp, mcl):
+        """
+        Parse a staged input file, filtering it first if mcl is set. Returns the path to the
+        parsed file, which is the filtered file if mcl is set, the path to the file to upload,
+        and the parsed data.
+        """
+        # Hmm, all through these printouts we should really put the blobstore node here as
+        # well as the file if it exists... wait and see if that code path is still actually
+        # used
+        extra_contig_info = inp.get('contig_info') or {}
+        ctype = compression_type(input_file) if self._stream_decompress else None
+        if ctype:
+            input_file, upload_file, assdata = self._parse_compressed_input(
+                input_file, ctype, mcl, extra_contig_info)
+        elif mcl:
+            print(f'filtering and parsing FASTA file {input_file} by contig length '
+                  + f'(min len={mcl} bp)')
+            input_file, assdata = self._filter_and_parse_fasta(
+                input_file, mcl, extra_contig_info)
+            upload_file = self._upload_path(input_file)
+        else:
+            print(f'parsing FASTA file: {input_file}')
+            assdata = self._parse_fasta_and_gzip(input_file, extra_contig_info)
+            upload_file = self._upload_path(input_file)
+        print(f' - parsed {assdata["num_contigs"]} contigs, {assdata["dna_size"]} bp')
+        if not assdata["num_contigs"]:
+            raise ValueError("Either the original FASTA file contained no sequences or they "
+                             + "were all filtered out based on the min_contig_length "
+                             + f"parameter for file {input_file}")
+        return input_file, upload_file, assdata
+
+    def _parse_compressed_input(self, input_file: Path, ctype, mcl, extra_contig_info):
+        """
+        Parse a compressed input file while decompressing it, filtering it if mcl is set.
+        Returns the path to the decompressed or filtered file, the path to the file to upload,
+        and the parsed data.
+        If mcl is not set, the decompressed data is never written to disk. Gzip inputs are
+        uploaded as they are, and other inputs as a gzipped copy written while parsing.
+        DataFileUtil uncompresses the file when it's downloaded.
+        """
+        plain_file = decompressed_path(input_file, ctype)
+        with open_decompressed(input_file, ctype, self._decompress_threads) as source:
+            if mcl:
+                print(f'decompressing, filtering and parsing FASTA file {input_file} by contig '
+                      + f'length (min len={mcl} bp)')
+                filtered_file, assembly_data = self._filter_and_parse_fasta(
+                    plain_file, mcl, extra_contig_info, source)
+                return filtered_file, self._upload_path(filtered_file), assembly_data
+            print(f'decompressing and parsing FASTA file: {input_file}')
+            if ctype == GZIP:
+                return plain_file, input_file, self._parse_fasta_native(
+                    plain_file, extra_contig_info, source=source)
+            upload_file = gzip_path(plain_file)
+            out = GzipTee(None, upload_file)
+            try:
+                assembly_data = self._parse_fasta_native(
+                    plain_file, extra_contig_info, source=TeeReader(source, out))
+            finally:
+                out.close()
+        return plain_file, upload_file, assembly_data
+
+    def _upload_path(self, input_file: Path) -> Path:
+        """ Get the path of the file to upload for a parsed input file. """
+        return gzip_path(input_file) if self._gzip_uploads else input_file
+
+    def _parse_fasta_and_gzip(self, fasta_file_path: Path, extra_contig_info):
+        """
+        Parse a FASTA file, writing a gzipped copy at the same time if required. When the
+        native parser reads the file in one process, the copy is compressed from the data the
+        parser reads, so the file is only read once.
+        """
+        if not self._gzip_uploads:
+            return self._parse_fasta(fasta_file_path, extra_contig_info)
+        if self._fasta_parser == PARSER_NATIVE and self._range_count(fasta_file_path) < 2:
+            with open(fasta_file_path, 'rb') as f:
+                out = GzipTee(None, gzip_path(fasta_file_path))
+                try:
+                    return self._parse_fasta_native(
+                        fasta_file_path,
+                        extra_contig_info,
+                        index_path=fai_path(fasta_file_path) if self._write_fai else None,
+                        source=TeeReader(f, out))
+                finally:
+                    out.close()
+        compressed = gzip_file_async(fasta_file_path)
+        assembly_data = self._parse_fasta(fasta_file_path, extra_contig_info)
+        compressed.result()
+        return assembly_data
+
+    def _import_fasta_mass_pipelined(self, params, max_cumsize):
+        """
+        Import the inputs with each input passing through staging, parsing, Blobstore upload
+        and workspace save independently, so that network transfers for one input overlap
+        with parsing the next. Each assembly is saved to the workspace separately.
+        If parse_workers is set, parsing runs in a process pool.
+        """
+        # worker processes are daemons, which can't start processes of their own
+        if not self._parse_workers or current_process().daemon:
+            return self._run_pipeline(params, max_cumsize, self._parse_input, 1)
+        print(f' - parsing in {self._parse_workers} processes, staging and uploading with '
+              + f'{self._io_threads} threads')
+        options = self._parse_options()
+        tmpdir = self._create_temp_dir()
+        table_ids = itertools.count()
+        with Pool(processes=self._parse_workers) as pool:
+            def parse_input(input_file, inp, mcl):
+                table_path = tmpdir / f'contigs_{next(table_ids)}.bin'
+                try:
+                    input_file, upload_file, assdata = pool.apply(
+                        _run_worker_parse,
+                        (self._scratch, options, input_file, inp, mcl, table_path))
+                    assdata['contigs'] = read_contig_table(assdata['contigs'])
+                finally:
+                    if table_path.exists():
+                        table_path.unlink()
+                return input_file, upload_file, assdata
+            return self._run_pipeline(params, max_cumsize, parse_input, self._parse_workers)
+
+    def _run_pipeline(self, params, max_cumsize, parse_input, parse_threads):
+        inputs = params[_INPUTS]
+        mcl = params.get(_MCL)
+
+        def stage(i):
+            key, cp = self._load_checkpoint(i, inputs[i], mcl)
+            if cp:
+                return i, key, cp, cp['file']
+            return i, key, None, self._stage_inputs([inputs[i]])[0]
+
+        def parse(item):
+            i, key, cp, input_file = item
+            if cp:
+                return i, key, cp, input_file, cp['upload_file'], cp['assembly_data']
+            input_file, upload_file, assdata = parse_input(input_file, inputs[i], mcl)
+            if key:
+                self._checkpoints.save_parsed(key, input_file, assdata, upload_file)
+            return i, key, cp, input_file, upload_file, assdata
+
+        def upload(item):
+            i, key, cp, input_file, upload_file, assdata = item
+            if cp and cp['handle']:
+                return i, key, input_file, assdata, cp['handle']
+            handle = self._save_files_to_blobstore([upload_file], [assdata['md5']])[0]
+            if key:
+                self._checkpoints.save_handle(key, handle)
+            return i, key, input_file, assdata, handle
+
+        def save(item):
+            i, key, input_file, assdata, file_handle = item
+            ao, am = self._build_assembly_object(assdata, file_handle, inputs[i])
+            # this appears to be completely unused
+            if input_file.parent.is_dir():
+                with open(input_file.parent / "example.json", "w") as f:
+                    dump_json(ao, f)
+            if _get_serialized_object_size(ao) > max_cumsize:
+                raise ValueError(f'The assembly object for input #{i + 1} is larger than '
+                                 + f'the maximum size of {max_cumsize} bytes')
+            ai = self._save_assembly_objects(
+                params[_WSID], [inputs[i][_ASSEMBLY_NAME]], [ao], [am])[0]
+            if key:
+                self._checkpoints.remove(key)
+            return {
+                'filtered_input': str(input_file) if mcl else None,
+                'upa': _upa(ai),
+                'object_info': ai,
+            }
+
+        pipeline = Pipeline([
+            Stage('stage', stage, threads=self._io_threads),
+            Stage('parse', parse, threads=parse_threads),
+            Stage('upload', upload, threads=self._io_threads),
+            Stage('save', save, threads=self._save_concurrency),
+        ], queue_size=self._pipeline_queue_size)
+        try:
+            return pipeline.run(range(len(inputs)))
+        finally:
+            print(pipeline.report())
 
     def _run_parallel_import_fasta_mass(self, params, workers, max_cumsize):
         print(f' - running {workers} parallel workers')
 
-        # distribute inputs evenly across workers
+        # dispatch the inputs one at a time, largest first, so that the workers pull the next
+        # input from a shared queue as they finish and large inputs don't end up queued behind
+        # each other on a single worker
         param_inputs = params.pop(_INPUTS)
-        chunk_size = math.ceil(len(param_inputs) / workers)
-        batch_input = [
-            (
-                {
-                    **params,
-                    _INPUTS: param_inputs[i : i + chunk_size]
-                }
-            )
-            for i in range(0, len(param_inputs), chunk_size)
-        ]
+        order = _largest_first(_input_sizes(param_inputs))
+        batch_input = [{**params, _INPUTS: [param_inputs[i]]} for i in order]
         batch_max_cumsize = [max_cumsize] * len(batch_input)
-        batch_result = _apply_starmap(workers, self._import_fasta_mass, batch_input, batch_max_cumsize)
-        result = list(itertools.chain.from_iterable(batch_result))
+        if self._worker_pool:
+            options = {
+                **self._parse_options(),
+                'pipeline_queue_size': self._pipeline_queue_size,
+                'max_save_objects': self._max_save_objects,
+                'save_concurrency': self._save_concurrency,
+                'spill_contigs': self._spill_contigs,
+                'max_retries': self._retrier.max_retries,
+                'checkpoint': self._checkpoints is not None,
+                'reuse_uploads': self._upload_cache is not None,
+                'io_threads': self._io_threads,
+                'parse_workers': self._parse_workers,
+            }
+            batch_result = self._worker_pool.run(
+                workers, self._token, options, batch_input, batch_max_cumsize)
+        else:
+            batch_result = _apply_starmap(
+                workers, self._import_fasta_mass, batch_input, batch_max_cumsize)
+        result = [None] * len(param_inputs)
+        for i, res in zip(order, batch_result):
+            result[i] = res[0]
         return result
 
+    def _parse_options(self):
+        """ Get the options for a FastaToAssembly instance that parses like this one. """
+        return {
+            'fasta_parser': self._fasta_parser,
+            'use_mmap': self._use_mmap,
+            'write_fai': self._write_fai,
+            'gzip_uploads': self._gzip_uploads,
+            'stream_decompress': self._stream_decompress,
+            'decompress_threads': self._decompress_threads,
+            'parse_processes': self._parse_processes,
+        }
+
     def _build_assembly_object(self, assembly_data, fasta_file_handle_info, params):
         """ construct the WS object data to save based on the parsed info and params """
         assembly_data['assembly_id'] = params[_ASSEMBLY_NAME]
@@ -237,6 +838,201 @@ class FastaToAssembly:
 
     def _parse_fasta(self, fasta_file_path: Path, extra_contig_info):
         """ Do the actual work of inspecting each contig """
+        if self._fasta_parser == PARSER_BIOPYTHON:
+            return self._parse_fasta_biopython(fasta_file_path, extra_contig_info)
+        ranges = self._split_for_parsing(fasta_file_path)
+        if len(ranges) > 1:
+            return self._parse_fasta_ranges(
+                fasta_file_path,
+                extra_contig_info,
+                ranges,
+                index_path=fai_path(fasta_file_path) if self._write_fai else None)
+        return self._parse_fasta_native(
+            fasta_file_path,
+            extra_contig_info,
+            index_path=fai_path(fasta_file_path) if self._write_fai else None)
+
+    def _filter_and_parse_fasta(
+            self, fasta_file_path: Path, min_contig_length, extra_contig_info, source=None):
+        """
+        Remove contigs shorter than min_contig_length and inspect the remaining contigs.
+        Returns the path to the filtered file and the parsed data.
+        If source is provided, the FASTA data is read from it instead of fasta_file_path, which
+        is only used to name the filtered file. The native parser is required.
+        """
+        if self._fasta_parser == PARSER_BIOPYTHON:
+            filtered_fasta_file_path = self._filter_contigs_by_length(
+                fasta_file_path, min_contig_length)
+            return filtered_fasta_file_path, self._parse_fasta_and_gzip(
+                filtered_fasta_file_path, extra_contig_info)
+        # read the source once, writing the filtered file while gathering statistics
+        filtered_fasta_file_path = Path(str(fasta_file_path) + '.filtered.fa')
+        with open(filtered_fasta_file_path, 'wb') as f:
+            out = GzipTee(f, gzip_path(filtered_fasta_file_path)) if self._gzip_uploads else f
+            writer = FilteredFastaWriter(out, min_contig_length)
+            try:
+                assembly_data = self._parse_fasta_native(
+                    fasta_file_path,
+                    extra_contig_info,
+                    writer,
+                    index_path=fai_path(filtered_fasta_file_path) if self._write_fai else None,
+                    source=source)
+            finally:
+                if out is not f:
+                    out.close()
+        print(f' - filtered out {writer.contigs - writer.contigs_written} of {writer.contigs} '
+              + f'contigs that were shorter than {min_contig_length} bp.')
+        return filtered_fasta_file_path, assembly_data
+
+    def _parse_fasta_native(
+            self,
+            fasta_file_path: Path,
+            extra_contig_info,
+            writer: FilteredFastaWriter = None,
+            index_path: Path = None,
+            source: BinaryIO = None):
+        """
+        Inspect each contig with the streaming scanner. Produces the same output as the
+        Biopython parser, but never holds more than a buffer's worth of sequence in memory.
+        If a writer is provided, contigs it does not write are skipped.
+        If index_path is provided, a FASTA index for the parsed file, or for the written file
+        if a writer is provided, is written there if the file's line layout allows.
+        If source is provided, the FASTA data is read from it rather than from the file.
+        """
+        stats = _AssemblyStats()
+
+        def add_contig(contig):
+            if writer and not writer.finish():
+                return
+            self._add_contig(stats, contig, extra_contig_info)
+            if layout:
+                index.append(layout.entry(contig.id, contig.length, contig.sequence_offset))
+
+        # the written file's index comes from the writer
+        index_source = index_path and not writer
+        index = []
+        contig = None
+        layout = None
+        if source:
+            events = scan_fasta(source)
+        else:
+            events = scan_fasta_file(fasta_file_path, self._use_mmap)
+        for event, data, offset in events:
+            if event == HEADER:
+                if contig:
+                    add_contig(contig)
+                if writer:
+                    writer.start(data)
+                contig = ContigStats(
+                    data,
+                    self._VALID_CHARS,
+                    sink=writer.write if writer else None,
+                    offset=offset)
+                layout = LineLayout() if index_source else None
+            else:
+                contig.update(data, offset)
+                if layout:
+                    layout.update(data)
+        if contig:
+            add_contig(contig)
+        if index_path:
+            self._write_index(index_path, writer.index if writer else index)
+        return self._build_assembly_data(
+            stats.total_length, stats.base_counts, stats.hasher.hexdigest(), stats.contigs)
+
+    def _range_count(self, fasta_file_path: Path) -> int:
+        """ Get the number of processes to parse a FASTA file in. """
+        # worker processes are daemons, which can't start processes of their own
+        if self._parse_processes < 2 or current_process().daemon:
+            return 1
+        return min(self._parse_processes, os.path.getsize(fasta_file_path) // _MIN_RANGE_SIZE)
+
+    def _split_for_parsing(self, fasta_file_path: Path):
+        """ Get the byte ranges of a FASTA file to parse in separate processes. """
+        count = self._range_count(fasta_file_path)
+        if count < 2:
+            return [None]
+        return split_fasta_file(fasta_file_path, count)
+
+    def _parse_fasta_ranges(self, fasta_file_path: Path, extra_contig_info, ranges, index_path):
+        """
+        Inspect each contig with the streaming scanner, scanning each byte range of the file in
+        a separate process. The results are merged in file order, so the output and any
+        errors are the same as for parsing the file in one process.
+        """
+        print(f' - parsing {len(ranges)} byte ranges in parallel')
+        stats = _AssemblyStats()
+        index = []
+        tmpdir = self._create_temp_dir()
+        try:
+            args = [(str(fasta_file_path), start, end, self._VALID_CHARS, bool(index_path),
+                     self._use_mmap, tmpdir / f'contigs_{i}.bin')
+                    for i, (start, end) in enumerate(ranges)]
+            with Pool(processes=len(ranges)) as pool:
+                results = pool.starmap(_summarize_range, args, chunksize=1)
+            for descriptor, error in results:
+                for contig in read_contig_summaries(descriptor, bool(index_path)):
+                    self._add_contig(stats, contig, extra_contig_info)
+                    index.append(contig.index_entry)
+                if error:
+                    raise error
+        finally:
+            # removes the contig summary files with the directory
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        if index_path:
+            self._write_index(index_path, index)
+        return self._build_assembly_data(
+            stats.total_length, stats.base_counts, stats.hasher.hexdigest(), stats.contigs)
+
+    def _write_index(self, index_path: Path, index):
+        if None in index:
+            print(' - the FASTA file has inconsistent line lengths, not writing index '
+                  + str(index_path))
+        else:
+            write_fai(index_path, index)
+
+    def _add_contig(self, stats: _AssemblyStats, contig: ContigStats, extra_contig_info):
+        """
+        Add the contig map entry and statistics for a fully read contig, checking its
+        characters. The entry is added from its fields rather than built as a dict, as the
+        per contig overhead dominates for files with many short contigs.
+        """
+        if contig.invalid_char:
+            if contig.invalid_char in self._AMINO_ACID_SPECIFIC_CHARACTERS:
+                raise ValueError('This FASTA file may have amino acids in it instead '
+                                 'of the required nucleotides.')
+            raise ValueError(f"This FASTA file has non nucleic acid characters: "
+                             f"{contig.invalid_char}")
+        counts = contig.counts
+        description = contig.description
+        is_circ = None
+        extra = extra_contig_info.get(contig.id)
+        if extra:
+            if 'is_circ' in extra:
+                is_circ = int(extra['is_circ'])
+            if 'description' in extra:
+                description = str(extra['description'])
+        GC_count = counts.get('G', 0) + counts.get('C', 0)
+        gc_content = round(float(GC_count) / float(contig.length), 5)
+        stats.add(contig.id, description, contig.length, counts, contig.digest(), gc_content,
+                  is_circ)
+
+    def _build_assembly_data(self, total_length, base_counts, assembly_md5, all_contig_data):
+        """ Aggregate stats for the data """
+        total_gc_content = None
+        if total_length > 0:
+            total_gc_content = round(float(base_counts['G'] + base_counts['C']) / float(total_length), 5)
+        return {
+            'md5': assembly_md5,
+            'base_counts': base_counts,
+            'dna_size': total_length,
+            'gc_content': total_gc_content,
+            'contigs': all_contig_data,
+            'num_contigs': len(all_contig_data)
+        }
+
+    def _parse_fasta_biopython(self, fasta_file_path: Path, extra_contig_info):
+        """ Inspect each contig with Biopython. Kept as a reference for the native parser. """
 
         # TODO TEST this needs more extensive unit testing
         # variables to store running counts of things
@@ -245,7 +1041,7 @@ class FastaToAssembly:
         md5_list = []
 
         # map from contig_id to contig_info
-        all_contig_data = {}
+        all_contig_data = ContigTable()
 
         for record in SeqIO.parse(str(fasta_file_path), "fasta"):
             # SeqRecord(seq=Seq('TTAT...', SingleLetterAlphabet()),
@@ -310,37 +1106,60 @@ class FastaToAssembly:
                 raise ValueError('The FASTA header key ' + contig_info['contig_id'] +
                                  'appears more than once in the file')
 
-            all_contig_data[contig_info['contig_id']] = contig_info
+            all_contig_data.add(contig_info['contig_id'], contig_info)
 
-        # Aggregate stats for the data
-        total_gc_content = None
-        if total_length > 0:
-            total_gc_content = round(float(base_counts['G'] + base_counts['C']) / float(total_length), 5)
-        assembly_data = {
-            'md5': md5(",".join(sorted(md5_list)).encode()).hexdigest(),
-            'base_counts': base_counts,
-            'dna_size': total_length,
-            'gc_content': total_gc_content,
-            'contigs': all_contig_data,
-            'num_contigs': len(all_contig_data)
-        }
-        return assembly_data
+        return self._build_assembly_data(
+            total_length,
+            base_counts,
+            md5(",".join(sorted(md5_list)).encode()).hexdigest(),
+            all_contig_data)
 
     @staticmethod
-    def _assembly_objects_generator(assembly_objects, assembly_metas, assembly_names, max_cumsize):
-        """ generates assembly objects iterator for uploading to the target workspace"""
+    def _assembly_objects_generator(
+            assembly_objects, assembly_metas, assembly_names, max_cumsize, max_count=None):
+        """
+        generates assembly objects iterator for uploading to the target workspace. Each batch
+        is at most max_cumsize bytes when serialized, unless it consists of a single object,
+        and contains at most max_count objects if provided.
+        """
         start_idx = 0
         cumsize = 0
         for idx, ao in enumerate(assembly_objects):
             aosize = _get_serialized_object_size(ao)
-            if aosize + cumsize <= max_cumsize:
+            full = max_count is not None and idx - start_idx >= max_count
+            if aosize + cumsize <= max_cumsize and not full:
                 cumsize += aosize
             else:
-                yield assembly_objects[start_idx:idx], assembly_metas[start_idx:], assembly_names[start_idx:idx]
+                if idx > start_idx:
+                    yield (assembly_objects[start_idx:idx],
+                           assembly_metas[start_idx:idx],
+                           assembly_names[start_idx:idx])
                 start_idx = idx
                 cumsize = aosize
         # yield the last batch
-        yield assembly_objects[start_idx:], assembly_metas[start_idx:], assembly_names[start_idx:]
+        if start_idx < len(assembly_objects):
+            yield assembly_objects[start_idx:], assembly_metas[start_idx:], assembly_names[start_idx:]
+
+    def _save_assembly_objects_batched(
+            self, workspace_id, assembly_names, ass_data, ass_meta, max_cumsize):
+        """
+        Save the assembly objects in batches limited by serialized size and object count,
+        saving up to save_concurrency batches at once. Returns the object infos in input order.
+        """
+        batches = list(self._assembly_objects_generator(
+            ass_data, ass_meta, assembly_names, max_cumsize, self._max_save_objects))
+        def save(batch):
+            assobject_batch, assmeta_batch, assembly_name_batch = batch
+            return self._save_assembly_objects(
+                workspace_id, assembly_name_batch, assobject_batch, assmeta_batch)
+        if self._save_concurrency == 1 or len(batches) < 2:
+            batch_infos = [save(b) for b in batches]
+        else:
+            print(f'Saving {len(batches)} batches of assemblies, up to '
+                  + f'{self._save_concurrency} at a time')
+            with ThreadPoolExecutor(max_workers=self._save_concurrency) as executor:
+                batch_infos = list(executor.map(save, batches))
+        return list(itertools.chain.from_iterable(batch_infos))
 
     @staticmethod
     def _fasta_filter_contigs_generator(fasta_record_iter, min_contig_length):
@@ -370,19 +1189,48 @@ class FastaToAssembly:
         sys.stdout.flush()
         ws_inputs = []
         for assname, assdata_singular, assmeta_singular in zip(assembly_names, ass_data, ass_meta):
+            if isinstance(assdata_singular.get('contigs'), SpilledContigs):
+                assdata_singular = dict(
+                    assdata_singular, contigs=assdata_singular['contigs'].load())
             ws_inputs.append({
                 'type': 'KBaseGenomeAnnotations.Assembly',  # This should really be versioned...
                 'data': assdata_singular,
                 'name': assname,
                 'meta': assmeta_singular
             })
-        return self._dfu.save_objects({'id': workspace_id, 'objects': ws_inputs})
+        # a save that timed out may still have succeeded, and saving again would create new
+        # object versions
+        return self._retrier.call(
+            'save_objects',
+            self._dfu.save_objects,
+            {'id': workspace_id, 'objects': ws_inputs},
+            idempotent=False)
 
-    def _save_files_to_blobstore(self, files: List[Path]):
+    def _save_files_to_blobstore(self, files: List[Path], assembly_md5s: List[str] = None):
+        """
+        Upload the files, returning the handle info for each. If the upload cache is enabled,
+        the assembly MD5s of the files are required and previously uploaded files are not
+        uploaded again.
+        """
         print(f'Uploading FASTA files to the Blobstore')
         sys.stdout.flush()
-        blob_input = [{'file_path': str(fp), 'make_handle': 1} for fp in files]
-        return self._dfu.file_to_shock_mass(blob_input)
+        handles = [None] * len(files)
+        if self._upload_cache:
+            for i, (fp, md5_) in enumerate(zip(files, assembly_md5s)):
+                handles[i] = self._upload_cache.get(fp, md5_, self._gzip_uploads)
+                if handles[i]:
+                    print(f' - reusing Blobstore node {handles[i]["shock_id"]} for {fp}')
+        upload = [i for i, h in enumerate(handles) if not h]
+        if upload:
+            blob_input = [{'file_path': str(files[i]), 'make_handle': 1} for i in upload]
+            uploaded = self._retrier.call(
+                'file_to_shock_mass', self._dfu.file_to_shock_mass, blob_input)
+            for i, handle in zip(upload, uploaded):
+                handles[i] = handle
+                if self._upload_cache:
+                    self._upload_cache.put(
+                        files[i], assembly_md5s[i], handle, self._gzip_uploads)
+        return handles
 
     def _stage_file_inputs(self, inputs) -> List[Path]:
         in_files = []
@@ -403,11 +1251,31 @@ class FastaToAssembly:
             # DFU won't unpack symlinked files
             os.link(fp, file_path)
             in_files.append(file_path)
-        # extract the file if it is compressed
+        return self._unpack_files(in_files)
+
+    def _unpack_files(self, files: List[Path]) -> List[Path]:
+        """
+        Have DataFileUtil decompress the files, except for compressed files that will be
+        decompressed while they're parsed.
+        """
         # could add a target dir argument to unpack_files, not sure how much work that might be
-        fs = [{'file_path': str(fp), 'unpack': 'uncompress'} for fp in in_files]
-        unpacked_files = self._dfu.unpack_files(fs)
-        return [Path(uf['file_path']) for uf in unpacked_files]
+        unpack = [i for i, fp in enumerate(files) if not self._streamed(fp)]
+        files = list(files)
+        if unpack:
+            fs = [{'file_path': str(files[i]), 'unpack': 'uncompress'} for i in unpack]
+            for i, uf in zip(unpack, self._dfu.unpack_files(fs)):
+                files[i] = Path(uf['file_path'])
+        return files
+
+    def _streamed(self, file_path: Path):
+        """ Check whether a staged file will be decompressed while it's parsed. """
+        ctype = compression_type(file_path) if self._stream_decompress else None
+        if ctype and is_tar_archive(file_path, ctype):
+            # DataFileUtil also rejects archives when uncompressing
+            raise ValueError(f'The file {file_path.name} is a tar archive. Archives are not '
+                             + 'supported, please provide a FASTA file, optionally compressed '
+                             + 'with gzip, bzip2 or xz')
+        return bool(ctype)
 
     def _stage_blobstore_inputs(self, inputs) -> List[Path]:
         blob_params = []
@@ -417,8 +1285,14 @@ class FastaToAssembly:
                 'file_path': str(self._create_temp_dir()),
                 'unpack': 'uncompress'  # Will throw an error for archives
             })
+        if not self._stream_decompress:
+            dfu_res = self._dfu.shock_to_file_mass(blob_params)
+            return [Path(dr['file_path']) for dr in dfu_res]
+        # download the files as is and only have DFU decompress files that aren't streamed
+        for bp in blob_params:
+            del bp['unpack']
         dfu_res = self._dfu.shock_to_file_mass(blob_params)
-        return [Path(dr['file_path']) for dr in dfu_res]
+        return self._unpack_files([Path(dr['file_path']) for dr in dfu_res])
 
     def _create_temp_dir(self):
         tmpdir = self._scratch / ("import_fasta_" + str(self._uuid_gen()))
@@ -0,0 +1,123 @@
+'''
+Gzip compression of FASTA files for upload, run in background threads so that compression
+overlaps with parsing. zlib releases the GIL while compressing, so the threads run in parallel
+with the parser.
+
+The gzip headers have no file name or modification time, so compressing the same data always
+produces the same bytes.
+'''
+
+import gzip
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+
+# DNA compresses nearly as well at the fastest level as at the default level, and the
+# compression needs to keep up with the parser
+GZIP_LEVEL = 1
+
+_CHUNK_SIZE = 1024 * 1024
+
+# marks the end of the data in a GzipTee queue
+_DONE = object()
+
+
+def gzip_path(path: Path) -> Path:
+    ''' Get the path of the gzipped copy of a file. '''
+    return Path(str(path) + '.gz')
+
+
+class _GzipFile(gzip.GzipFile):
+    # closes the underlying file, which GzipFile doesn't do when given a file object
+
+    def __init__(self, path: Path):
+        self._raw = open(path, 'wb')
+        super().__init__(
+            filename='', mode='wb', compresslevel=GZIP_LEVEL, fileobj=self._raw, mtime=0)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw.close()
+
+
+def gzip_file(path: Path) -> Path:
+    ''' Write a gzipped copy of a file next to the file, returning the path of the copy. '''
+    out = gzip_path(path)
+    with open(path, 'rb') as fin, _GzipFile(out) as fout:
+        for chunk in iter(lambda: fin.read(_CHUNK_SIZE), b''):
+            fout.write(chunk)
+    return out
+
+
+def gzip_file_async(path: Path) -> Future:
+    '''
+    Start writing a gzipped copy of a file in a background thread. The future's result is the
+    path of the copy.
+    '''
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        return executor.submit(gzip_file, path)
+    finally:
+        executor.shutdown(wait=False)
+
+
+class GzipTee:
+    '''
+    A binary file handle that writes to another handle and also writes a gzipped copy of the
+    data to a file, compressing in a background thread.
+    '''
+
+    def __init__(self, handle: BinaryIO, path: Path):
+        '''
+        handle - the handle for the uncompressed data, or None to only write the gzipped copy.
+        path - the path for the gzipped copy.
+        '''
+        self._handle = handle
+        self._gz = _GzipFile(path)
+        self._buf = []
+        self._size = 0
+        self._queue = queue.Queue(4)
+        self._error = None
+        self._thread = threading.Thread(target=self._compress, daemon=True)
+        self._thread.start()
+
+    def _compress(self):
+        while True:
+            data = self._queue.get()
+            if data is _DONE:
+                return
+            if self._error is None:
+                try:
+                    self._gz.write(data)
+                except Exception as e:
+                    self._error = e  # keep draining the queue so the writer doesn't block
+
+    def write(self, data: bytes):
+        if self._handle is not None:
+            self._handle.write(data)
+        self._buf.append(data)
+        self._size += len(data)
+        if self._size >= _CHUNK_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._buf:
+            self._queue.put(b''.join(self._buf))
+            self._buf = []
+            self._size = 0
+
+    def close(self):
+        '''
+        Finish the gzipped copy, raising any error from compressing the data. The handle for
+        the uncompressed data is not closed.
+        '''
+        self._flush()
+        self._queue.put(_DONE)
+        self._thread.join()
+        self._gz.close()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,146 @@
+'''
+A simple executor that passes items through a series of stages, each running in its own
+threads, with bounded queues between the stages. Items move through the stages independently,
+so e.g. network bound stages for one item overlap with CPU bound stages for the next.
+'''
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List
+
+# marks the end of the items in a queue
+_DONE = object()
+
+
+class Stage:
+    '''
+    A stage in a pipeline and the statistics for its most recent run.
+    '''
+
+    def __init__(self, name: str, function: Callable[[Any], Any], threads: int = 1):
+        '''
+        name - the name of the stage.
+        function - the function to apply to each item. The return value is passed to the next
+            stage.
+        threads - the number of threads to run for the stage.
+        '''
+        if threads < 1:
+            raise ValueError(f'threads must be > 0 for stage {name}')
+        self.name = name
+        self.function = function
+        self.threads = threads
+        self.items = 0
+        # seconds spent running the function, summed across threads
+        self.busy = 0.0
+        # seconds spent waiting for the next stage to accept an item, summed across threads
+        self.blocked = 0.0
+
+    def utilization(self, wall_time: float) -> float:
+        ''' Get the fraction of the available thread time the stage spent working. '''
+        if wall_time <= 0:
+            return 0.0
+        return self.busy / (wall_time * self.threads)
+
+
+class Pipeline:
+    '''
+    Runs items through a series of stages. If a stage fails for any item, no new items are
+    started and the first error is raised once the running items finish.
+    '''
+
+    def __init__(self, stages: List[Stage], queue_size: int = 1):
+        '''
+        stages - the stages in processing order.
+        queue_size - the maximum number of items waiting between each pair of stages.
+        '''
+        if not stages:
+            raise ValueError('At least one stage is required')
+        if queue_size < 1:
+            raise ValueError('queue_size must be > 0')
+        self.stages = stages
+        self._queue_size = queue_size
+        self.wall_time = 0.0
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        ''' Process the items, returning the output of the last stage for each in order. '''
+        for s in self.stages:
+            s.items, s.busy, s.blocked = 0, 0.0, 0.0
+        queues = [queue.Queue(self._queue_size) for _ in self.stages]
+        results = {}
+        errors = []
+        failed = threading.Event()
+        lock = threading.Lock()
+        threads = []
+        for i, s in enumerate(self.stages):
+            out = queues[i + 1] if i + 1 < len(queues) else None
+            remaining = [s.threads]
+            for _ in range(s.threads):
+                t = threading.Thread(
+                    target=self._work,
+                    args=(s, queues[i], out, results, errors, failed, lock, remaining),
+                    daemon=True)
+                t.start()
+                threads.append(t)
+        start = time.perf_counter()
+        try:
+            for i, item in enumerate(items):
+                if failed.is_set():
+                    break
+                queues[0].put((i, item))
+        finally:
+            queues[0].put(_DONE)
+            for t in threads:
+                t.join()
+            self.wall_time = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        return [results[i] for i in sorted(results)]
+
+    def _work(self, stage, in_q, out_q, results, errors, failed, lock, remaining):
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                # let the other threads in this stage see the end marker
+                in_q.put(_DONE)
+                break
+            if failed.is_set():
+                continue  # drain the queue so upstream stages don't block
+            idx, value = item
+            start = time.perf_counter()
+            try:
+                value = stage.function(value)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                failed.set()
+                continue
+            finally:
+                busy = time.perf_counter() - start
+                with lock:
+                    stage.busy += busy
+            with lock:
+                stage.items += 1
+            if out_q is None:
+                with lock:
+                    results[idx] = value
+            else:
+                start = time.perf_counter()
+                out_q.put((idx, value))
+                with lock:
+                    stage.blocked += time.perf_counter() - start
+        with lock:
+            remaining[0] -= 1
+            last = not remaining[0]
+        if last and out_q is not None:
+            out_q.put(_DONE)
+
+    def report(self) -> str:
+        ''' Get a summary of the time each stage spent working during the last run. '''
+        lines = [f'pipeline wall time: {self.wall_time:.2f}s']
+        for s in self.stages:
+            lines.append(
+                f' - {s.name}: {s.items} items, {s.threads} threads, busy {s.busy:.2f}s, '
+                + f'blocked on next stage {s.blocked:.2f}s, '
+                + f'utilization {s.utilization(self.wall_time):.0%}')
+        return '\n'.join(lines)
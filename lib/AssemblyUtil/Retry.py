@@ -0,0 +1,116 @@
+'''
+Retries for service calls that fail with transient errors, e.g. connection failures or 5xx
+responses from the callback server while it's under load.
+
+Delays between attempts grow exponentially with full jitter, and each call has a budget for
+the total time spent waiting so that a service that is down doesn't stall a job indefinitely.
+
+Calls that aren't idempotent, e.g. workspace saves, are only retried if the request can't have
+reached the service, since repeating a save that succeeded would create duplicate object
+versions.
+'''
+
+import random
+import time
+from typing import Any, Callable
+
+from installed_clients.baseclient import ServerError
+from requests.exceptions import ConnectionError, ConnectTimeout, HTTPError, Timeout
+from urllib3.exceptions import NewConnectionError
+
+# status codes for responses that may succeed if the request is repeated
+_TRANSIENT_STATUS = {429, 502, 503, 504}
+# status codes for responses from a server that refused the request without handling it
+_REFUSED_STATUS = {429, 503}
+
+
+def _not_sent(err: Exception) -> bool:
+    # whether a connection error happened before the request was sent
+    if isinstance(err, ConnectTimeout):
+        return True
+    reason = getattr(err.args[0], 'reason', None) if err.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def is_transient(err: Exception, idempotent: bool = True) -> bool:
+    '''
+    Check whether a service call error is likely to go away if the call is retried.
+
+    idempotent - whether the call can safely be repeated if it may have succeeded. If False,
+        only errors that show the service didn't handle the call are transient, so read
+        timeouts, dropped connections and gateway errors are not.
+    '''
+    if isinstance(err, (ConnectionError, Timeout)):
+        return idempotent or _not_sent(err)
+    if isinstance(err, HTTPError):
+        status = _TRANSIENT_STATUS if idempotent else _REFUSED_STATUS
+        return err.response is not None and err.response.status_code in status
+    if not idempotent:
+        return False
+    if isinstance(err, ServerError):
+        # a 500 response that isn't a JSON-RPC error comes from a proxy or a server that
+        # failed before handling the call, rather than from the service itself
+        return err.name == 'Unknown' and err.code == 0
+    return False
+
+
+class Retrier:
+    '''
+    Calls functions, repeating the call when it fails with a transient error.
+    '''
+
+    def __init__(
+            self,
+            max_retries: int = 3,
+            initial_delay: float = 1.0,
+            max_delay: float = 30.0,
+            budget: float = 120.0,
+            sleep: Callable[[float], None] = time.sleep,
+            rand: Callable[[], float] = random.random):
+        '''
+        max_retries - the maximum number of times to repeat a call. 0 disables retries.
+        initial_delay - the upper bound of the delay in seconds before the first retry. The
+            bound doubles with each retry.
+        max_delay - the largest upper bound of the delay in seconds before a retry.
+        budget - the maximum total delay in seconds for a call. A retry that would exceed the
+            budget is not attempted.
+        sleep - the function used to wait between attempts.
+        rand - a source of random numbers in [0, 1) for the delay jitter.
+        '''
+        if max_retries < 0:
+            raise ValueError('max_retries must be >= 0')
+        self.max_retries = max_retries
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._budget = budget
+        self._sleep = sleep
+        self._rand = rand
+
+    def call(self, name: str, function: Callable[..., Any], *args, idempotent: bool = True,
+             **kwargs) -> Any:
+        '''
+        Call a function, retrying on transient errors. The last error is raised if the call
+        doesn't succeed within the retry limits.
+
+        name - the name of the call for log messages.
+        idempotent - whether the call can safely be repeated if it may have succeeded. See
+            is_transient.
+        '''
+        waited = 0.0
+        attempt = 0
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e, idempotent) or attempt >= self.max_retries:
+                    raise
+                delay = self._rand() * min(self._max_delay, self._initial_delay * 2 ** attempt)
+                if waited + delay > self._budget:
+                    print(f' - {name} failed with a transient error and the retry budget of '
+                          + f'{self._budget}s is exhausted')
+                    raise
+                attempt += 1
+                print(f' - {name} failed with a transient error, retrying in {delay:.1f}s '
+                      + f'(retry {attempt} of {self.max_retries}): {e}')
+                self._sleep(delay)
+                waited += delay
@@ -0,0 +1,220 @@
+'''
+Service client support that the generated SDK clients in installed_clients lack, kept here so
+that regenerating the clients doesn't remove it:
+
+* an HTTP session shared by all clients in a process, which keeps connections alive between
+  calls and rejects cookies, so calls for different users never share cookies.
+* request bodies that are encoded in chunks, so a large call, e.g. saving assemblies with
+  millions of contigs, is never held in memory as a single string.
+
+Use the support by wrapping a generated client with use_shared_session.
+'''
+
+import os
+import random
+import threading
+from collections.abc import Mapping
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from installed_clients.baseclient import BaseClient, ServerError, _JSONObjectEncoder
+
+_CT = 'content-type'
+_AJ = 'application/json'
+# request bodies are encoded in chunks of about this size
+_BODY_CHUNK_SIZE = 1024 * 1024
+# containers with at least this many items are encoded item by item
+_STREAM_CONTAINER_SIZE = 100
+# the default maximum number of pooled connections per host
+DEFAULT_POOL_SIZE = 10
+
+# the HTTP session shared by all clients in this process, see _get_session()
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+
+
+def set_pool_size(pool_size: int):
+    '''
+    Set the maximum number of pooled keep-alive connections per host for the HTTP session
+    shared by all clients in this process. The current session, if any, is replaced.
+    '''
+    global _session, _pool_size
+    pool_size = int(pool_size)
+    if pool_size < 1:
+        raise ValueError('pool_size must be at least 1')
+    with _session_lock:
+        old, _session, _pool_size = _session, None, pool_size
+    if old is not None:
+        old.close()
+
+
+def _reset_session_after_fork():
+    # the parent's connections and lock state must not be used in a forked child
+    global _session, _session_pid, _session_lock
+    _session, _session_pid, _session_lock = None, None, threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):  # py 3.7+
+    os.register_at_fork(after_in_child=_reset_session_after_fork)
+
+
+def _get_session() -> requests.Session:
+    # Returns the HTTP session for this process, creating it if needed. The session is shared
+    # between threads; the connection pool is thread safe. A process forked from one that
+    # already had a session gets a new one.
+    global _session, _session_pid
+    pid = os.getpid()
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            session = requests.Session()
+            # the session is shared by clients with different tokens in different threads, so
+            # a cookie set for one user's call must never be sent with another's
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(pool_connections=_pool_size, pool_maxsize=_pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session, _session_pid = session, pid
+        return _session
+
+
+class _JSONEncoder(_JSONObjectEncoder):
+    # also encodes mappings other than dicts, such as ContigTables
+
+    def default(self, obj):
+        if isinstance(obj, Mapping):
+            return dict(obj)
+        return super().default(obj)
+
+
+def _walk_json(obj):
+    # whether a container should be encoded item by item rather than in one go
+    if isinstance(obj, Mapping):
+        items = obj.values()
+        if not all(isinstance(k, str) for k in obj):
+            return False  # leave key conversion to the encoder
+    elif isinstance(obj, (list, tuple)):
+        items = obj
+    else:
+        return False
+    return len(obj) >= _STREAM_CONTAINER_SIZE or any(
+        isinstance(v, (Mapping, list, tuple)) for v in items)
+
+
+def _iter_json(obj, encoder):
+    # Yields the JSON for obj in pieces, giving the same output as encoder.encode(obj).
+    # Containers are walked so that only one item at a time is encoded, using the fast
+    # one shot encoder for each item.
+    if not _walk_json(obj):
+        yield encoder.encode(obj)
+    elif isinstance(obj, Mapping):
+        yield '{'
+        first = True
+        for k, v in obj.items():
+            yield ('' if first else ', ') + encoder.encode(k) + ': '
+            first = False
+            yield from _iter_json(v, encoder)
+        yield '}'
+    else:
+        yield '['
+        for i, v in enumerate(obj):
+            if i:
+                yield ', '
+            yield from _iter_json(v, encoder)
+        yield ']'
+
+
+def _json_body_chunks(obj, chunk_size=_BODY_CHUNK_SIZE):
+    # Yields the JSON encoded obj as bytes in chunks of roughly chunk_size
+    buf = []
+    size = 0
+    for piece in _iter_json(obj, _JSONEncoder()):
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buf).encode('utf-8')
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
+
+
+class _JSONBody:
+    # A request body made of encoded chunks, which can be iterated more than once, e.g. if the
+    # request is retried. The length is known up front, so requests sends a Content-Length
+    # header rather than using chunked transfer encoding, which the SDK servers don't support
+    # since they read the body based on CONTENT_LENGTH.
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._length = sum(len(c) for c in chunks)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+
+def _request_body(obj):
+    # Returns the request body for obj: bytes if it fits in one chunk, otherwise a _JSONBody.
+    # obj is only encoded once, and a large body is never held as a single string.
+    chunks = list(_json_body_chunks(obj))
+    if len(chunks) < 2:
+        return chunks[0] if chunks else b''
+    return _JSONBody(chunks)
+
+
+class SessionClient(BaseClient):
+    '''
+    A BaseClient that sends calls through the HTTP session shared by all clients in the
+    process, encoding the request body in chunks.
+    '''
+
+    def _call(self, url, method, params, context=None):
+        arg_hash = {'method': method,
+                    'params': params,
+                    'version': '1.1',
+                    'id': str(random.random())[2:]
+                    }
+        if context:
+            if type(context) is not dict:
+                raise ValueError('context is not type dict as required.')
+            arg_hash['context'] = context
+
+        ret = _get_session().post(url, data=_request_body(arg_hash), headers=self._headers,
+                                  timeout=self.timeout,
+                                  verify=not self.trust_all_ssl_certificates)
+        ret.encoding = 'utf-8'
+        if ret.status_code == 500:
+            if ret.headers.get(_CT) == _AJ:
+                err = ret.json()
+                if 'error' in err:
+                    raise ServerError(**err['error'])
+                else:
+                    raise ServerError('Unknown', 0, ret.text)
+            else:
+                raise ServerError('Unknown', 0, ret.text)
+        if not ret.ok:
+            ret.raise_for_status()
+        resp = ret.json()
+        if 'result' not in resp:
+            raise ServerError('Unknown', 0, 'An unknown server error occurred')
+        if not resp['result']:
+            return
+        if len(resp['result']) == 1:
+            return resp['result'][0]
+        return resp['result']
+
+
+def use_shared_session(client):
+    '''
+    Make a generated SDK client, e.g. a DataFileUtil or Workspace client, send its calls with
+    SessionClient. Returns the client.
+    '''
+    # SessionClient only overrides methods, so the client's state carries over unchanged
+    client._client.__class__ = SessionClient
+    return client
@@ -5,6 +5,7 @@ import time as _time
 
 from installed_clients.MetagenomeUtilsClient import MetagenomeUtils
 from AssemblyUtil.AssemblyToFasta import AssemblyToFasta
+from AssemblyUtil.ServiceClient import use_shared_session
 from installed_clients.baseclient import ServerError as _MGUError
 
 
@@ -16,7 +17,7 @@ class TypeToFasta:
         self.ws = wrkspc
         self.scratch = scratch
         self.callback_url = callback_url
-        self.mgu = MetagenomeUtils(callback_url, token=token)
+        self.mgu = use_shared_session(MetagenomeUtils(callback_url, token=token))
         self.fasta_dict = {}
 
     def log(self, message, prefix_newline=False):
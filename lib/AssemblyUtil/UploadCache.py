@@ -0,0 +1,123 @@
+'''
+A cache of Blobstore handles for uploaded FASTA files, so that importing the same file again,
+e.g. a reference genome into a different workspace, reuses the existing Blobstore node rather
+than uploading the file again.
+
+Entries are keyed by the assembly MD5 and the file size. The assembly MD5 only covers the
+sequences, not the headers or line layout, so each entry maps the MD5s of the uploaded files to
+their handles and a handle is only reused for a byte for byte identical file. Files are only
+hashed when an entry exists for their assembly MD5 and size. When a file is uploaded, the MD5
+the Blobstore computed for the upload is used if the handle includes it.
+
+The least recently written entries are removed when there are more than a maximum number.
+'''
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+from AssemblyUtil.Checkpoint import token_owner
+
+_CHUNK_SIZE = 1024 * 1024
+_ENTRY_SUFFIX = '.json'
+_HEX_DIGITS = '0123456789abcdef'
+
+# the default maximum number of cache entries
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def _upload_md5(handle):
+    # the MD5 of the uploaded file as computed by the Blobstore, if the handle info includes it
+    md5 = (handle.get('handle') or {}).get('remote_md5')
+    if type(md5) == str and len(md5) == 32 and not md5.lower().strip(_HEX_DIGITS):
+        return md5.lower()
+    return None
+
+
+def _file_md5(path: Path) -> str:
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class UploadCache:
+    '''
+    Maps the contents of uploaded FASTA files to their Blobstore handle info.
+    '''
+
+    def __init__(self, directory: Path, token: str = None, max_entries=DEFAULT_MAX_ENTRIES):
+        '''
+        directory - the directory for the cache entries. It is created if necessary.
+        token - the user's token. Handles are only reused for the same token, so users never
+            receive handles to another user's Blobstore nodes.
+        max_entries - the maximum number of entries, for all users. The least recently written
+            entries are removed when a put adds an entry past the maximum.
+        '''
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+        self._dir = directory
+        self._owner = token_owner(token)
+        self._max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, path: Path, assembly_md5: str, gzipped: bool):
+        size = os.path.getsize(path)
+        key = f'{self._owner} {assembly_md5} {size}' + (' gzip' if gzipped else '')
+        key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self._dir / (key + _ENTRY_SUFFIX)
+
+    def _read(self, entry_path):
+        try:
+            with open(entry_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, path: Path, assembly_md5: str, gzipped: bool = False):
+        '''
+        Get the handle info for a previous upload of a file, or None if there is none.
+        gzipped is whether the file is a gzipped copy of the FASTA file. Gzipped and plain
+        uploads are cached separately.
+        '''
+        # maps file MD5 to handle info for files with the same sequences and size
+        entry = self._read(self._entry_path(path, assembly_md5, gzipped))
+        # only hash the file if there's a candidate upload
+        if not entry:
+            return None
+        return entry.get(_file_md5(path))
+
+    def put(self, path: Path, assembly_md5: str, handle, gzipped: bool = False):
+        '''
+        Record the handle info for an uploaded file. Concurrent puts for files with the same
+        sequences and size may lose all but one of the handles, which only means a later
+        import uploads the file again.
+        '''
+        entry_path = self._entry_path(path, assembly_md5, gzipped)
+        entry = self._read(entry_path)
+        new = not entry
+        entry[_upload_md5(handle) or _file_md5(path)] = handle
+        tmp = self._dir / f'tmp_{uuid.uuid4()}'
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, entry_path)
+        if new:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for p in self._dir.iterdir():
+            if p.name.endswith(_ENTRY_SUFFIX):
+                try:
+                    entries.append((p.stat().st_mtime, p))
+                except FileNotFoundError:
+                    pass  # removed by a concurrent put
+        # oldest first
+        for _, p in sorted(entries)[:max(len(entries) - self._max_entries, 0)]:
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
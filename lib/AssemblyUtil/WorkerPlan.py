@@ -0,0 +1,179 @@
+'''
+Chooses the number of worker processes for parallel FASTA imports from the CPUs and memory
+actually available to the container and the sizes of the inputs.
+
+os.cpu_count() reports the host's CPUs rather than the container's CPU quota, so the CPU quota
+and memory limit are read from cgroup v2 or v1. The workers are limited so that the largest
+inputs fit in memory when imported at the same time, and the catalog parameters remain
+ceilings on the worker count.
+'''
+
+import os
+from pathlib import Path
+from typing import List
+
+_CGROUP_ROOT = Path('/sys/fs/cgroup')
+_MEMINFO = Path('/proc/meminfo')
+
+# cgroup v1 reports no memory limit as a number close to 2^63
+_NO_LIMIT = 2 ** 60
+
+# the memory used by a worker process regardless of its input: the interpreter, libraries,
+# read buffers and service client
+WORKER_BASE_MEMORY = 200 * 1024 * 1024
+# the memory used by a worker per byte of FASTA input, mostly for the contig map of the parsed
+# assembly and its serialized form when it is saved. Files with very short contigs use the most
+WORKER_MEMORY_PER_BYTE = 0.25
+# the FASTA size assumed for inputs of unknown size, such as Blobstore nodes, if no larger
+# input size is known
+UNKNOWN_INPUT_SIZE = 1024 * 1024 * 1024
+# the fraction of the available memory the workers may use
+_MEMORY_FRACTION = 0.8
+
+
+def _read(path: Path):
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(root: Path = _CGROUP_ROOT):
+    ''' Get the CPU quota of the cgroup as a number of CPUs, or None if there is no quota. '''
+    v2 = _read(root / 'cpu.max')
+    if v2:
+        quota, period = (v2.split() + ['100000'])[:2]
+        if quota == 'max':
+            return None
+        return int(quota) / int(period)
+    quota = _read(root / 'cpu' / 'cpu.cfs_quota_us')
+    period = _read(root / 'cpu' / 'cpu.cfs_period_us')
+    if quota is None or period is None or int(quota) <= 0:
+        return None
+    return int(quota) / int(period)
+
+
+def cgroup_memory_available(root: Path = _CGROUP_ROOT):
+    '''
+    Get the memory the cgroup can still use before reaching its limit, or None if there is no
+    limit.
+    '''
+    limit = _read(root / 'memory.max')
+    usage = _read(root / 'memory.current')
+    if limit is None:
+        limit = _read(root / 'memory' / 'memory.limit_in_bytes')
+        usage = _read(root / 'memory' / 'memory.usage_in_bytes')
+    if limit is None or limit == 'max' or int(limit) >= _NO_LIMIT:
+        return None
+    return max(int(limit) - int(usage or 0), 0)
+
+
+def system_memory_available(meminfo: Path = _MEMINFO):
+    ''' Get the available memory of the host, or None if it is unknown. '''
+    for line in (_read(meminfo) or '').splitlines():
+        if line.startswith('MemAvailable:'):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+def available_cpus(root: Path = _CGROUP_ROOT) -> float:
+    ''' Get the number of CPUs this process can use, taking the cgroup CPU quota into account. '''
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on all platforms
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_limit(root)
+    return min(cpus, quota) if quota else cpus
+
+
+def available_memory(root: Path = _CGROUP_ROOT, meminfo: Path = _MEMINFO):
+    ''' Get the memory this process can use, or None if it is unknown. '''
+    limits = [m for m in (cgroup_memory_available(root), system_memory_available(meminfo))
+              if m is not None]
+    return min(limits) if limits else None
+
+
+def estimate_input_memory(size: int) -> int:
+    ''' Estimate the memory used by a worker process importing a FASTA file of a given size. '''
+    return int(WORKER_BASE_MEMORY + size * WORKER_MEMORY_PER_BYTE)
+
+
+class WorkerPlan:
+    '''
+    The number of worker processes for an import and the limits that determined it.
+    '''
+
+    def __init__(self, workers: int, cpu_workers: int, memory_workers: int, max_threads: int,
+                 inputs: int, cpus: float, memory: int, peak_memory: int):
+        self.workers = workers
+        self.cpu_workers = cpu_workers
+        self.memory_workers = memory_workers
+        self.max_threads = max_threads
+        self.inputs = inputs
+        self.cpus = cpus
+        self.memory = memory
+        self.peak_memory = peak_memory
+
+    def __str__(self):
+        memory = 'unknown' if self.memory is None else f'{self.memory / 2 ** 20:.0f}MB'
+        return (f'worker plan: {self.workers} workers for {self.inputs} inputs. '
+                + f'Limits: {self.cpu_workers} by {self.cpus:g} CPUs, '
+                + f'{self.memory_workers} by {memory} available memory, '
+                + f'MAX_THREADS {self.max_threads}. '
+                + f'Estimated peak memory {self.peak_memory / 2 ** 20:.0f}MB')
+
+
+def max_workers(threads_per_cpu: float, max_threads: int, cpus: float = None) -> int:
+    '''
+    Get the most worker processes any import may use: THREADS_PER_CPU times the available
+    CPUs, limited by MAX_THREADS.
+
+    threads_per_cpu - the THREADS_PER_CPU catalog parameter.
+    max_threads - the MAX_THREADS catalog parameter.
+    cpus - the available CPUs. Read from the cgroup and the process affinity if not provided.
+    '''
+    if cpus is None:
+        cpus = available_cpus()
+    return max(min(int(threads_per_cpu * cpus), max_threads), 1)
+
+
+def plan_workers(
+        threads_per_cpu: float,
+        max_threads: int,
+        input_sizes: List[int],
+        cpus: float = None,
+        memory: int = None) -> WorkerPlan:
+    '''
+    Choose the number of worker processes for importing inputs of the given sizes. The workers
+    are limited by THREADS_PER_CPU times the available CPUs, by MAX_THREADS, by the number of
+    inputs, and by the memory needed if the largest inputs are imported at the same time.
+
+    threads_per_cpu - the THREADS_PER_CPU catalog parameter.
+    max_threads - the MAX_THREADS catalog parameter.
+    input_sizes - the size of each input file in bytes, or None if unknown. Inputs of unknown
+        size are assumed to be as large as the largest known input, and at least
+        UNKNOWN_INPUT_SIZE.
+    cpus - the available CPUs. Read from the cgroup and the process affinity if not provided.
+    memory - the available memory in bytes. Read from the cgroup and the host if not
+        provided. If the memory is unknown the workers are not limited by memory.
+    '''
+    if cpus is None:
+        cpus = available_cpus()
+    if memory is None:
+        memory = available_memory()
+    cpu_workers = max(int(threads_per_cpu * cpus), 1)
+    unknown_size = max([s for s in input_sizes if s is not None] + [UNKNOWN_INPUT_SIZE])
+    estimates = sorted((estimate_input_memory(unknown_size if s is None else s)
+                        for s in input_sizes), reverse=True)
+    memory_workers = len(estimates)
+    if memory is not None:
+        budget = memory * _MEMORY_FRACTION
+        total = 0
+        for i, estimate in enumerate(estimates):
+            total += estimate
+            if total > budget:
+                memory_workers = i
+                break
+    workers = max(min(cpu_workers, memory_workers, max_threads, len(input_sizes)), 1)
+    return WorkerPlan(workers, cpu_workers, memory_workers, max_threads, len(input_sizes),
+                      cpus, memory, sum(estimates[:workers]))
@@ -0,0 +1,56 @@
+'''
+Benchmark for parsing FASTA files with many short contigs, where the per contig overhead of the
+native parser dominates. Each configuration is run a few times and the best time is reported.
+
+Run from the repository root with:
+PYTHONPATH=lib python scripts/benchmark_small_contigs.py [contig count]
+'''
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from AssemblyUtil.FastaToAssembly import FastaToAssembly
+
+_RUNS = 3
+
+
+def _write_fasta(path: Path, count: int):
+    rand = random.Random(42)
+    with open(path, 'w') as f:
+        for i in range(count):
+            length = rand.randint(100, 400)
+            seq = ''.join(rand.choice('ACGTacgtN') for _ in range(length))
+            f.write(f'>contig_{i} short contig\n')
+            for j in range(0, length, 60):
+                f.write(seq[j:j + 60] + '\n')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        fasta = tmp / 'small_contigs.fa'
+        _write_fasta(fasta, count)
+        # the default configuration first
+        for name, options in [
+                ('native', {}),
+                ('native, write_fai', {'write_fai': True}),
+                ('biopython', {'fasta_parser': 'biopython'})]:
+            fta = FastaToAssembly(None, tmp, **options)
+            times = []
+            try:
+                for _ in range(_RUNS):
+                    start = time.perf_counter()
+                    data = fta._parse_fasta(fasta, {})
+                    times.append(time.perf_counter() - start)
+            except ImportError as e:
+                print(f'{name}: not available ({e})')
+                continue
+            print(f'{name}: {data["num_contigs"]} contigs in {min(times):.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -149,6 +149,35 @@ class AssemblyUtilTest(unittest.TestCase):
         self.check_ws_name(result[0]['upa'], name2)
         assert result[0]['filtered_input'] is None
 
+    def test_get_contigs_as_fasta(self):
+        assemblyUtil = self.getImpl()
+        tmp_dir = Path(self.cfg['scratch']) / ("test_get_contigs_as_fasta" + str(uuid.uuid4()))
+        os.makedirs(tmp_dir)
+        fasta_path = tmp_dir / "contigs.fa"
+        fasta_path.write_text(
+            ">c1 first contig\nACGTACGTAC\nGG\n"
+            + ">c2\nGGGGCGGGGC\nGGGGCGGGGC\n"
+            + ">c3 third\nATATATATAT\nAT")
+        result = assemblyUtil.save_assembly_from_fasta2(self.getContext(), {
+            'file': {'path': str(fasta_path)},
+            'workspace_id': self.ws_id,
+            'assembly_name': 'ContigsAssembly',
+        })
+        upa = result[0]['upa']
+
+        res = assemblyUtil.get_contigs_as_fasta(
+            self.getContext(), {'ref': upa, 'contig_ids': ['c3', 'c1']})[0]
+        self.assertEqual(res['assembly_name'], 'ContigsAssembly')
+        self.assertEqual(
+            Path(res['path']).read_text(),
+            ">c3 third\nATATATATAT\nAT\n>c1 first contig\nACGTACGTAC\nGG\n")
+
+        # the second call uses the cached FASTA file
+        res = assemblyUtil.get_contigs_as_fasta(self.getContext(), {
+            'ref': upa, 'min_length': 13, 'min_gc': 0.9, 'filename': 'gc_rich.fa'})[0]
+        self.assertEqual(res['path'], str(Path(self.scratch) / 'gc_rich.fa'))
+        self.assertEqual(Path(res['path']).read_text(), ">c2\nGGGGCGGGGC\nGGGGCGGGGC\n")
+
     def test_empty_file_error_message(self):
         assemblyUtil = self.getImpl()
         tmp_dir = self.cfg['scratch']
@@ -0,0 +1,110 @@
+'''
+Unit tests for Checkpoint.py.
+'''
+
+import json
+import os
+
+from AssemblyUtil.Checkpoint import ImportCheckpoints
+from AssemblyUtil.ContigTable import ContigTable, json_default
+
+
+def _assembly_data():
+    contigs = ContigTable()
+    contigs.add('c1', {'contig_id': 'c1', 'name': 'c1', 'description': 'désc', 'length': 4,
+                       'md5': 'f1f8f4bf413b16ad135722aa4591043e', 'gc_content': 0.5})
+    contigs.add('c2', {'contig_id': 'c2', 'weird': True})
+    return {'md5': 'abc', 'dna_size': 4, 'gc_content': 0.5, 'contigs': contigs,
+            'num_contigs': 2, 'base_counts': {'A': 1, 'C': 1, 'G': 1, 'T': 1}}
+
+
+def test_key(tmp_path):
+    f = tmp_path / 'in.fa'
+    f.write_text('>c1\nACGT\n')
+    cps = ImportCheckpoints(tmp_path / 'cp', 'tok')
+    inp = {'file': str(f), 'contig_info': {'c1': {'is_circ': 1}}}
+    key = cps.key(inp, 'file', 'node', 10)
+    assert len(key) == 64
+    assert cps.key(dict(inp), 'file', 'node', 10) == key
+    other_keys = [
+        cps.key(inp, 'file', 'node', None),
+        cps.key({'file': str(f)}, 'file', 'node', 10),
+        ImportCheckpoints(tmp_path / 'cp', 'tok2').key(inp, 'file', 'node', 10),
+        ImportCheckpoints(tmp_path / 'cp').key(inp, 'file', 'node', 10),
+        cps.key({'node': 'n1'}, 'file', 'node', 10),
+        cps.key(inp, 'file', 'node', 10, gzip_uploads=True),
+    ]
+    assert len(set(other_keys + [key])) == 7
+    os.utime(f, ns=(0, 0))
+    assert cps.key(inp, 'file', 'node', 10) != key
+    assert cps.key({'file': str(tmp_path / 'missing.fa')}, 'file', 'node', 10) is None
+    assert 'tok' not in ''.join(p.name for p in tmp_path.iterdir())
+
+
+def test_save_load_remove(tmp_path):
+    f = tmp_path / 'in.fa'
+    f.write_text('>c1\nACGT\n')
+    cps = ImportCheckpoints(tmp_path / 'cp', 'tok')
+    assert cps.load('k') is None
+    expected = json.dumps(_assembly_data(), default=json_default)
+    cps.save_parsed('k', f, _assembly_data())
+    cp = cps.load('k')
+    assert cp['file'] == f
+    assert cp['upload_file'] == f
+    assert cp['handle'] is None
+    assert isinstance(cp['assembly_data']['contigs'], ContigTable)
+    assert cp['assembly_data']['contigs'].json_size == _assembly_data()['contigs'].json_size
+    assert json.dumps(cp['assembly_data'], default=json_default) == expected
+
+    cps.save_handle('k', {'hid': 'KBH_1'})
+    assert cps.load('k')['handle'] == {'hid': 'KBH_1'}
+
+
+def test_load_upload_file(tmp_path):
+    # the parsed file needn't exist if the file to upload is a different file
+    f = tmp_path / 'in.fa'
+    gz = tmp_path / 'in.fa.gz'
+    gz.write_bytes(b'gzipped')
+    cps = ImportCheckpoints(tmp_path / 'cp')
+    cps.save_parsed('k', f, _assembly_data(), gz)
+    cp = cps.load('k')
+    assert cp['file'] == f
+    assert cp['upload_file'] == gz
+    gz.write_bytes(b'truncated')
+    assert cps.load('k') is None
+    assert sorted(p.name for p in (tmp_path / 'cp').iterdir()) == [
+        'k.handle.json', 'k.parsed.json']
+
+    cps.remove('k')
+    cps.remove('k')
+    assert cps.load('k') is None
+    assert list((tmp_path / 'cp').iterdir()) == []
+
+
+def test_load_missing_file(tmp_path):
+    f = tmp_path / 'in.fa'
+    f.write_text('>c1\nACGT\n')
+    cps = ImportCheckpoints(tmp_path / 'cp')
+    cps.save_parsed('k', f, _assembly_data())
+    f.write_text('>c1\nACG\n')
+    # the file changed and hasn't been uploaded
+    assert cps.load('k') is None
+    os.remove(f)
+    assert cps.load('k') is None
+    # the file isn't needed once it's uploaded
+    cps.save_handle('k', {'hid': 'KBH_1'})
+    assert cps.load('k')['handle'] == {'hid': 'KBH_1'}
+
+
+def test_load_upload_file(tmp_path):
+    # the parsed file needn't exist if the file to upload is a different file
+    f = tmp_path / 'in.fa'
+    gz = tmp_path / 'in.fa.gz'
+    gz.write_bytes(b'gzipped')
+    cps = ImportCheckpoints(tmp_path / 'cp')
+    cps.save_parsed('k', f, _assembly_data(), gz)
+    cp = cps.load('k')
+    assert cp['file'] == f
+    assert cp['upload_file'] == gz
+    gz.write_bytes(b'truncated')
+    assert cps.load('k') is None
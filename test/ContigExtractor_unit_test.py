@@ -0,0 +1,219 @@
+'''
+Unit tests for ContigExtractor.py and the FASTA index extraction functions.
+'''
+
+import gzip
+import os
+import shutil
+import uuid
+from pathlib import Path
+from unittest.mock import create_autospec
+
+from AssemblyUtil.ContigExtractor import ContigExtractor
+from AssemblyUtil.FastaIndex import extract_contigs
+from AssemblyUtil.FastaScanner import index_fasta_file, normalize_fasta_file
+from Bio import SeqIO
+from conftest import assert_exception_correct
+from installed_clients.DataFileUtilClient import DataFileUtil
+from pytest import raises
+
+_TEST_DATA = Path(__file__).parent / 'data'
+
+_FASTA = (
+    b'>c1 first contig\n'
+    + b'ACGTA\n'
+    + b'CGTAC\n'
+    + b'GG\n'
+    + b'>c2\n'
+    + b'GGGGC\n'
+    + b'>c3 third\n'
+    + b'ATATA\n'
+    + b'TA\n'
+)
+
+_CONTIGS = {
+    'c1': {'contig_id': 'c1', 'length': 12, 'gc_content': 0.5},
+    'c2': {'contig_id': 'c2', 'length': 5, 'gc_content': 1.0},
+    'c3': {'contig_id': 'c3', 'length': 7, 'gc_content': 0.0},
+}
+
+
+def _set_up_mocks(tmp_path, contents, ws_type='KBaseGenomeAnnotations.Assembly-6.3'):
+    dfu = create_autospec(DataFileUtil, spec_set=True, instance=True)
+    dfu.get_objects.return_value = {'data': [{
+        'info': [1, 'myassembly', ws_type],
+        'data': {'fasta_handle_ref': 'KBH_42', 'contigs': _CONTIGS}
+    }]}
+
+    def shock_to_file(params):
+        Path(params['file_path']).write_bytes(contents)
+        return {'file_path': params['file_path']}
+    dfu.shock_to_file.side_effect = shock_to_file
+    uuids = iter([uuid.UUID('1234567890abcdef1234567890abcdef'),
+                  uuid.UUID('fedcba0987654321fedcba0987654321')])
+    return ContigExtractor(dfu, tmp_path, uuid_gen=lambda: next(uuids)), dfu
+
+
+def _get_contigs(tmp_path, params, contents=_FASTA):
+    ce, dfu = _set_up_mocks(tmp_path, contents)
+    res = ce.contigs_as_fasta(dict(params, ref='1/2/3'))
+    dfu.get_objects.assert_called_once_with({'object_refs': ['1/2/3']})
+    return res, Path(res['path']).read_bytes()
+
+
+def test_contigs_as_fasta_ids(tmp_path):
+    res, got = _get_contigs(tmp_path, {'contig_ids': ['c3', 'c1', 'c3']})
+    assert res == {'path': str(tmp_path / 'myassembly.contigs.fa'), 'assembly_name': 'myassembly'}
+    assert got == b'>c3 third\nATATA\nTA\n>c1 first contig\nACGTA\nCGTAC\nGG\n'
+
+
+def test_contigs_as_fasta_filters(tmp_path):
+    testcases = [
+        ({}, _FASTA),
+        ({'min_length': 6}, b'>c1 first contig\nACGTA\nCGTAC\nGG\n>c3 third\nATATA\nTA\n'),
+        ({'max_length': 7}, b'>c2\nGGGGC\n>c3 third\nATATA\nTA\n'),
+        ({'min_gc': 0.5, 'max_gc': 0.9}, b'>c1 first contig\nACGTA\nCGTAC\nGG\n'),
+        ({'max_gc': 0}, b'>c3 third\nATATA\nTA\n'),
+        ({'contig_ids': ['c2', 'c1'], 'min_gc': 0.6}, b'>c2\nGGGGC\n'),
+        ({'contig_ids': [], 'filename': 'foo.fa'}, b''),
+    ]
+    for params, expected in testcases:
+        res, got = _get_contigs(tmp_path, params)
+        assert got == expected
+    assert res['path'] == str(tmp_path / 'foo.fa')
+
+
+def test_contigs_as_fasta_cached(tmp_path):
+    ce, dfu = _set_up_mocks(tmp_path, _FASTA)
+    ce.contigs_as_fasta({'ref': '1/2/3', 'contig_ids': ['c1']})
+    res = ce.contigs_as_fasta({'ref': '1/2/3', 'contig_ids': ['c2']})
+    assert Path(res['path']).read_bytes() == b'>c2\nGGGGC\n'
+    dfu.shock_to_file.assert_called_once_with({
+        'handle_id': 'KBH_42',
+        'file_path': str(
+            tmp_path / 'assembly_cache' / 'tmp_12345678-90ab-cdef-1234-567890abcdef'
+            / 'download.fa'),
+        'unpack': 'uncompress'
+    })
+    assert sorted(p.name for p in (tmp_path / 'assembly_cache').iterdir()) == ['KBH_42']
+
+
+def test_contigs_as_fasta_cache_eviction(tmp_path):
+    dfu = create_autospec(DataFileUtil, spec_set=True, instance=True)
+    dfu.get_objects.side_effect = lambda p: {'data': [{
+        'info': [1, 'myassembly', 'KBaseGenomeAnnotations.Assembly-6.3'],
+        'data': {'fasta_handle_ref': 'KBH_' + p['object_refs'][0], 'contigs': _CONTIGS}
+    }]}
+
+    def shock_to_file(params):
+        Path(params['file_path']).write_bytes(_FASTA)
+        return {'file_path': params['file_path']}
+    dfu.shock_to_file.side_effect = shock_to_file
+    cache = tmp_path / 'assembly_cache'
+
+    ContigExtractor(dfu, tmp_path).contigs_as_fasta({'ref': '1'})
+    entry_size = sum(f.stat().st_size for f in (cache / 'KBH_1').iterdir())
+    ce = ContigExtractor(dfu, tmp_path, max_cache_size=int(entry_size * 2.5))
+    ce.contigs_as_fasta({'ref': '2'})
+    os.utime(cache / 'KBH_1', (1000, 1000))
+    os.utime(cache / 'KBH_2', (2000, 2000))
+    # using a cached file marks it as recently used
+    ce.contigs_as_fasta({'ref': '1'})
+    assert dfu.shock_to_file.call_count == 2
+    ce.contigs_as_fasta({'ref': '3'})
+    assert sorted(p.name for p in cache.iterdir()) == ['KBH_1', 'KBH_3']
+    res = ce.contigs_as_fasta({'ref': '1', 'contig_ids': ['c2']})
+    assert Path(res['path']).read_bytes() == b'>c2\nGGGGC\n'
+    assert dfu.shock_to_file.call_count == 3
+
+    # the file for the current call is kept
+    ContigExtractor(dfu, tmp_path, max_cache_size=0).contigs_as_fasta({'ref': '2'})
+    assert sorted(p.name for p in cache.iterdir()) == ['KBH_2']
+
+
+def test_contig_extractor_fail_cache_size(tmp_path):
+    dfu = create_autospec(DataFileUtil, spec_set=True, instance=True)
+    with raises(Exception) as got:
+        ContigExtractor(dfu, tmp_path, max_cache_size=-1)
+    assert_exception_correct(got.value, ValueError('max_cache_size must be >= 0'))
+
+
+def test_contigs_as_fasta_irregular_lines(tmp_path):
+    contents = b'>c1 first contig\nAC\nGTACGTAC\nGG\r\n>c2\nGG GGC\n>c3 third\nATATA\n\nTA'
+    _, got = _get_contigs(tmp_path, {'contig_ids': ['c3', 'c1']}, contents)
+    assert got == b'>c3 third\nATATATA\n>c1 first contig\nACGTACGTACGG\n'
+
+
+def test_contigs_as_fasta_fail(tmp_path):
+    err = 'required "ref" field was not defined'
+    testcases = [
+        ({}, err),
+        ({'ref': ''}, err),
+        ({'ref': '1/2/3', 'contig_ids': 'c1'}, 'contig_ids must be a list of strings'),
+        ({'ref': '1/2/3', 'contig_ids': ['c1', 2]}, 'contig_ids must be a list of strings'),
+        ({'ref': '1/2/3', 'min_length': 1.5}, 'min_length must be a number'),
+        ({'ref': '1/2/3', 'max_length': -1}, 'max_length must be >= 0'),
+        ({'ref': '1/2/3', 'min_gc': True}, 'min_gc must be a number'),
+        ({'ref': '1/2/3', 'max_gc': 1.1}, 'max_gc must be >= 0 and <= 1'),
+    ]
+    for params, expected in testcases:
+        ce, _ = _set_up_mocks(tmp_path, _FASTA)
+        with raises(Exception) as got:
+            ce.contigs_as_fasta(params)
+        assert_exception_correct(got.value, ValueError(expected))
+
+
+def test_contigs_as_fasta_fail_missing_ids(tmp_path):
+    ce, _ = _set_up_mocks(tmp_path, _FASTA)
+    with raises(Exception) as got:
+        ce.contigs_as_fasta({'ref': '1/2/3', 'contig_ids': ['c1', 'c4', 'c5']})
+    assert_exception_correct(got.value, ValueError(
+        'The following contig IDs are not in the assembly: c4, c5'))
+
+
+def test_contigs_as_fasta_fail_type(tmp_path):
+    ce, _ = _set_up_mocks(tmp_path, _FASTA, ws_type='KBaseGenomes.ContigSet-3.0')
+    with raises(Exception) as got:
+        ce.contigs_as_fasta({'ref': '1/2/3'})
+    assert_exception_correct(got.value, ValueError(
+        'Cannot extract contigs; invalid WS type (KBaseGenomes.ContigSet-3.0). '
+        + 'Supported types are KBaseGenomeAnnotations.Assembly'))
+
+
+def test_extract_contigs_no_trailing_newline(tmp_path):
+    # the last contig exactly fills its last line, which has no terminator
+    for last_line, crlf in ((b'CCCCC', False), (b'CC', False), (b'CCCCC', True)):
+        fasta = tmp_path / 'in.fa'
+        contents = b'>c1\nACGTA\nCG\n>c2 desc\nGGGGG\n' + last_line
+        fasta.write_bytes(contents.replace(b'\n', b'\r\n') if crlf else contents)
+        index = index_fasta_file(fasta)
+        assert [e.name for e in index] == ['c1', 'c2']
+        out = tmp_path / 'out.fa'
+        with open(out, 'wb') as fout:
+            extract_contigs(fasta, index[::-1], fout)
+        expected = b'>c2 desc\nGGGGG\n' + last_line + b'\n>c1\nACGTA\nCG\n'
+        if crlf:
+            expected = (b'>c2 desc\r\nGGGGG\r\n' + last_line
+                        + b'\n>c1\r\nACGTA\r\nCG\n')
+        assert out.read_bytes() == expected
+
+
+def test_extract_contigs_test_data(tmp_path):
+    f = sorted(_TEST_DATA.glob('*.fna.gz'))[0]
+    fasta = tmp_path / 'in.fa'
+    with gzip.open(f) as fin, open(fasta, 'wb') as fout:
+        shutil.copyfileobj(fin, fout)
+    index = index_fasta_file(fasta)
+    if index is None:
+        index = normalize_fasta_file(fasta, tmp_path / 'norm.fa')
+        fasta = tmp_path / 'norm.fa'
+    records = {r.id: r for r in SeqIO.parse(str(fasta), 'fasta')}
+    selected = index[::7]
+    out = tmp_path / 'out.fa'
+    with open(out, 'wb') as fout:
+        extract_contigs(fasta, selected, fout)
+    got = list(SeqIO.parse(str(out), 'fasta'))
+    assert [r.id for r in got] == [e.name for e in selected]
+    for r in got:
+        assert r.description == records[r.id].description
+        assert str(r.seq) == str(records[r.id].seq)
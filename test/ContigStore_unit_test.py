@@ -0,0 +1,42 @@
+'''
+Unit tests for ContigStore.py.
+'''
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from AssemblyUtil.ContigStore import ContigStore
+from AssemblyUtil.ContigTable import ContigTable
+
+
+def _table(contigs):
+    table = ContigTable()
+    for c in contigs:
+        table.add(c['contig_id'], c)
+    return table
+
+
+def test_contig_store(tmp_path):
+    maps = [
+        {},
+        {'c1': {'contig_id': 'c1', 'description': 'désc ☃ "q"', 'length': 3, 'gc_content': 0.5}},
+        {f'c{i}': {'contig_id': f'c{i}', 'length': i} for i in range(1000)},
+        _table([{'contig_id': f'c{i}', 'name': f'c{i}', 'description': 'd', 'length': i + 1,
+                 'md5': '0123456789abcdef' * 2, 'gc_content': 0.5} for i in range(1000)]),
+    ]
+    path = tmp_path / 'contigs.bin'
+    with ContigStore(path) as store:
+        refs = [store.put(m) for m in maps]
+        assert [r.json_size for r in refs] == [len(json.dumps(dict(m))) for m in maps]
+        assert [len(r) for r in refs] == [0, 1, 1000, 1000]
+        # read while writing
+        more = store.put({'x': {'length': 1}})
+        with ThreadPoolExecutor(4) as ex:
+            loaded = list(ex.map(lambda r: r.load(), refs * 3))
+        # the contig maps are loaded as compact tables rather than dicts
+        assert all(type(m) == ContigTable for m in loaded)
+        assert loaded == maps * 3
+        assert more.load() == {'x': {'length': 1}}
+        assert list(loaded[1]['c1']) == ['contig_id', 'description', 'length', 'gc_content']
+        assert loaded[3].json_size == maps[3].json_size
+    assert not path.exists()
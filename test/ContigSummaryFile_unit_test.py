@@ -0,0 +1,52 @@
+'''
+Unit tests for ContigSummaryFile.py.
+'''
+
+from AssemblyUtil.ContigSummaryFile import (
+    ContigSummaryWriter, read_contig_summaries, remove_contig_summaries
+)
+from AssemblyUtil.FastaIndex import FaiEntry
+from AssemblyUtil.FastaScanner import ContigStats, ContigSummary
+
+
+def _fields(contig):
+    return (contig.title, contig.id, contig.description, contig.offset, contig.sequence_offset,
+            contig.end, contig.length, contig.invalid_char, list(contig.counts.items()),
+            contig.md5(), contig.digest(), contig.index_entry)
+
+
+def test_contig_summary_file(tmp_path):
+    stats = ContigStats('c1 désc ☃', 'ACGTN', offset=5)
+    stats.update(b'acgTNRRq\nGG\n', 20)
+    contigs = [
+        ContigSummary.from_stats(stats, FaiEntry('c1', 10, 20, 8, 9)),
+        ContigSummary.from_stats(ContigStats('', 'ACGT', offset=40)),
+        ContigSummary('c3', 50, 54, 60, 5, None, {'A': 5}, b'\x01' * 16,
+                      FaiEntry('c3', 5, 54, 5, 6)),
+    ]
+    assert contigs[0].invalid_char == 'R'
+    assert contigs[1].sequence_offset is None
+
+    path = tmp_path / 'contigs.bin'
+    writer = ContigSummaryWriter(path)
+    for c in contigs:
+        writer.add(c)
+    descriptor = writer.close()
+    assert descriptor['path'] == str(path)
+    assert descriptor['count'] == 3
+
+    got = list(read_contig_summaries(descriptor, index=True))
+    assert [_fields(c) for c in got] == [_fields(c) for c in contigs]
+    got = list(read_contig_summaries(descriptor))
+    assert [c.index_entry for c in got] == [None, None, None]
+    assert [_fields(c)[:-1] for c in got] == [_fields(c)[:-1] for c in contigs]
+
+    remove_contig_summaries(descriptor)
+    assert not path.exists()
+    remove_contig_summaries(descriptor)  # already removed
+
+
+def test_contig_summary_file_empty(tmp_path):
+    descriptor = ContigSummaryWriter(tmp_path / 'contigs.bin').close()
+    assert descriptor['count'] == 0
+    assert list(read_contig_summaries(descriptor, index=True)) == []
@@ -0,0 +1,244 @@
+'''
+Unit tests for ContigTable.py.
+'''
+
+import io
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tracemalloc
+from hashlib import md5
+
+from AssemblyUtil.ContigTable import (
+    ContigTable, dump_json, iterencode_json, json_default, read_contig_table, write_contig_table
+)
+from conftest import assert_exception_correct
+from pytest import raises
+
+
+def _contig(i, **kwargs):
+    c = {'contig_id': f'contig_{i}', 'name': f'contig_{i}', 'description': '', 'length': i + 1}
+    c.update(kwargs)
+    c['md5'] = md5(str(i).encode()).hexdigest()
+    c['gc_content'] = round(i / 1000, 5)
+    return c
+
+
+def test_contig_table():
+    contigs = [
+        _contig(0),
+        _contig(1, description='désc ☃', Ncount=4),
+        _contig(2, is_circ=1),
+        _contig(3, Ncount=0, is_circ=0),
+        # not the standard layout
+        {'contig_id': 'contig_4', 'name': 'contig_4', 'length': 3, 'extra': [1, 2]},
+        dict(_contig(5), md5='ABCDEF' * 5 + 'AB'),
+        dict(_contig(6), name='other'),
+        dict(_contig(7), Ncount=-1),
+        {k: v for k, v in reversed(list(_contig(8).items()))},
+    ]
+    table = ContigTable()
+    for c in contigs:
+        table.add(c['contig_id'], c)
+    expected = {c['contig_id']: c for c in contigs}
+    assert len(table) == 9
+    assert list(table) == list(expected)
+    assert table == expected
+    assert expected == table
+    assert table.to_dict() == expected
+    assert 'contig_3' in table and 'contig_9' not in table
+    for cid, c in expected.items():
+        # key order is preserved
+        assert list(table[cid].items()) == list(c.items())
+    assert json.dumps(table, default=json_default) == json.dumps(expected)
+    assert table.json_size == len(json.dumps(expected))
+    with raises(KeyError):
+        table['contig_9']
+
+
+def test_contig_table_add_contig():
+    contigs = [
+        _contig(0),
+        _contig(1, description='désc ☃', Ncount=4),
+        _contig(2, is_circ=1),
+        _contig(3, Ncount=0, is_circ=0),
+    ]
+    table = ContigTable()
+    for c in contigs:
+        table.add_contig(c['contig_id'], c['description'], c['length'], c.get('Ncount'),
+                         bytes.fromhex(c['md5']), c['gc_content'], c.get('is_circ'))
+    expected = {c['contig_id']: c for c in contigs}
+    assert table == expected
+    for cid, c in expected.items():
+        assert list(table[cid].items()) == list(c.items())
+    assert table.json_size == len(json.dumps(expected))
+    with raises(Exception) as got:
+        table.add_contig('contig_0', '', 1, None, bytes(16), 0.0)
+    assert_exception_correct(got.value, ValueError('Contig contig_0 is already in the table'))
+    assert len(table) == 4
+
+
+def test_contig_table_json_size():
+    contigs = [
+        dict(_contig(0), contig_id='a"b\\c', name='a"b\\c', description='tab\there\x7f'),
+        dict(_contig(1), contig_id='ünï', name='ünï', description='\ud800 \U0001f600'),
+        _contig(2, Ncount=12345678901234, is_circ=1),
+        dict(_contig(3), gc_content=float('nan')),
+        dict(_contig(4), gc_content=float('-inf'), length=0),
+        dict(_contig(5), gc_content=1e-20),
+    ]
+    table = ContigTable()
+    for i, c in enumerate(contigs):
+        table.add(c['contig_id'], c)
+        assert table.json_size == len(json.dumps(table.to_dict()))
+    assert table.json_size == len(json.dumps({c['contig_id']: c for c in contigs}))
+
+
+def test_contig_table_empty():
+    table = ContigTable()
+    assert table == {}
+    assert table.json_size == len(json.dumps({}))
+    assert json.dumps({'contigs': table}, default=json_default) == '{"contigs": {}}'
+
+
+def test_contig_table_fail_duplicate():
+    table = ContigTable()
+    table.add('contig_0', _contig(0))
+    with raises(Exception) as got:
+        table.add('contig_0', _contig(0))
+    assert_exception_correct(got.value, ValueError('Contig contig_0 is already in the table'))
+
+
+def test_json_default_fail():
+    with raises(Exception) as got:
+        json.dumps({'a': object()}, default=json_default)
+    assert_exception_correct(got.value, TypeError('Object of type object is not JSON serializable'))
+
+
+def test_contig_table_pickle(tmp_path):
+    table = ContigTable()
+    for i in range(1000):
+        table.add(f'contig_{i}', _contig(i))
+    copy = pickle.loads(pickle.dumps(table))
+    assert copy == table
+    copy.add('contig_1000', _contig(1000))
+    assert 'contig_1000' in copy and 'contig_1000' not in table
+
+    # string hashes differ between processes with different hash seeds
+    pkl = tmp_path / 'table.pkl'
+    pkl.write_bytes(pickle.dumps(table))
+    script = (
+        'import pickle, sys\n'
+        + f'table = pickle.loads(open({str(pkl)!r}, "rb").read())\n'
+        + 'assert all(f"contig_{i}" in table for i in range(1000))\n'
+        + 'assert table["contig_500"]["length"] == 501\n'
+        + 'print(len(table))\n')
+    for seed in ('1', '2'):
+        res = subprocess.run(
+            [sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True,
+            env=dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=os.pathsep.join(sys.path)))
+        assert res.returncode == 0, res.stderr
+        assert res.stdout == '1000\n'
+
+
+def test_iterencode_json():
+    table = ContigTable()
+    for i in range(100):
+        table.add(f'contig_{i}', _contig(i, Ncount=i))
+    table.add('other', {'extra': [1, {2: 3}]})
+    obj = {
+        'contigs': table,
+        'empty': ContigTable(),
+        'list': [table, (1, 'two'), [], {}, None, 1.5],
+        'nested': {'a': {'b': [{'c': 'désc ☃'}]}, 2: [3]},
+    }
+    expected = json.dumps(obj, default=json_default)
+    pieces = list(iterencode_json(obj, chunk_size=100))
+    assert ''.join(pieces) == expected
+    assert len(pieces) > 10
+    assert all(len(p) < 1000 for p in pieces)
+    f = io.StringIO()
+    dump_json(obj, f)
+    assert f.getvalue() == expected
+    assert ''.join(iterencode_json(ContigTable())) == '{}'
+
+
+def test_iterencode_json_memory():
+    table = ContigTable()
+    for i in range(5000):
+        table.add(f'contig_{i}', _contig(i, Ncount=i))
+    size = len(json.dumps(table, default=json_default))
+
+    def peak(encode):
+        tracemalloc.start()
+        try:
+            encode()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    dumps_peak = peak(lambda: json.dumps({'contigs': table}, default=json_default))
+    stream_peak = peak(lambda: [len(c) for c in iterencode_json({'contigs': table}, 1000)])
+    assert dumps_peak > size
+    assert stream_peak * 10 < size
+
+
+def test_contig_table_file(tmp_path):
+    contigs = [
+        _contig(0),
+        dict(_contig(1), contig_id='ünï', name='ünï', description='désc ☃', Ncount=4),
+        _contig(2, is_circ=1),
+        {'contig_id': 'contig_3', 'name': 'contig_3', 'length': 3, 'extra': [1, 2]},
+    ] + [_contig(i) for i in range(4, 1000)]
+    table = ContigTable()
+    for c in contigs:
+        table.add(c['contig_id'], c)
+    descriptor = write_contig_table(table, tmp_path / 'contigs.bin')
+    # the descriptor is pickled through the pool's pipe, so it should stay small
+    assert len(pickle.dumps(descriptor)) < 1000
+    copy = read_contig_table(descriptor)
+    assert copy == table
+    assert list(copy) == list(table)
+    assert copy.json_size == table.json_size
+    assert 'ünï' in copy and copy['contig_500']['length'] == 501
+    copy.add('contig_1000', _contig(1000))
+    assert 'contig_1000' in copy and 'contig_1000' not in table
+
+    empty = read_contig_table(write_contig_table(ContigTable(), tmp_path / 'empty.bin'))
+    assert empty == {}
+    empty.add('contig_0', _contig(0))
+    assert empty == {'contig_0': _contig(0)}
+
+
+def test_contig_table_memory():
+    # build the entries inside the measurement, as the parsers create new values per contig
+    def measure(build):
+        tracemalloc.start()
+        try:
+            obj = build()
+            return tracemalloc.get_traced_memory()[0], obj
+        finally:
+            tracemalloc.stop()
+
+    def build_dict():
+        contigs = {}
+        for i in range(20000):
+            c = _contig(i, Ncount=1000 + i)
+            contigs[c['contig_id']] = c
+        return contigs
+
+    def build_table():
+        table = ContigTable()
+        for i in range(20000):
+            c = _contig(i, Ncount=1000 + i)
+            table.add(c['contig_id'], c)
+        return table
+
+    dict_size, contigs = measure(build_dict)
+    table_size, table = measure(build_table)
+    assert table == contigs
+    print(f'dict: {dict_size / 20000} bytes / contig, table: {table_size / 20000} bytes / contig')
+    assert table_size * 5 < dict_size
@@ -0,0 +1,135 @@
+'''
+Unit tests for Decompress.py.
+'''
+
+import bz2
+import gzip
+import io
+import lzma
+import tarfile
+from pathlib import Path
+
+from AssemblyUtil import Decompress
+from AssemblyUtil.Decompress import (
+    ReadAheadReader, TeeReader, compression_type, decompressed_path, is_tar_archive,
+    open_decompressed
+)
+from Bio import bgzf
+from pytest import raises
+
+_DATA = b''.join(b'>c%d desc\n' % i + b'ACGTTGCA' * (i * 50) + b'\n' for i in range(60))
+
+
+def _write(path, data, ctype):
+    if ctype == 'bgzf':
+        with bgzf.BgzfWriter(str(path), 'wb') as f:
+            f.write(data)
+    else:
+        path.write_bytes({'gzip': gzip.compress, 'bzip2': bz2.compress, 'xz': lzma.compress,
+                          None: lambda d: d}[ctype](data))
+    return path
+
+
+def test_compression_type(tmp_path):
+    for ctype, expected in [('gzip', 'gzip'), ('bgzf', 'gzip'), ('bzip2', 'bzip2'), ('xz', 'xz'),
+                            (None, None)]:
+        assert compression_type(_write(tmp_path / 'f', _DATA, ctype)) == expected
+    assert compression_type(_write(tmp_path / 'f', b'', None)) is None
+
+
+def test_decompressed_path():
+    for path, ctype, expected in [
+        ('d/f.fa.gz', 'gzip', 'd/f.fa'),
+        ('d/f.fa.GZ', 'gzip', 'd/f.fa'),
+        ('d/f.fa.gzip', 'gzip', 'd/f.fa'),
+        ('d/f.fa.bz2', 'bzip2', 'd/f.fa'),
+        ('d/f.fa.bz', 'bzip2', 'd/f.fa'),
+        ('d/f.fa.xz', 'xz', 'd/f.fa'),
+        ('d/f.fa', 'gzip', 'd/f.fa.decompressed'),
+        ('d/f.fa.gz', 'xz', 'd/f.fa.gz.decompressed'),
+        ('d/.gz', 'gzip', 'd/.gz.decompressed'),
+    ]:
+        assert decompressed_path(Path(path), ctype) == Path(expected)
+
+
+def _tar(path, data):
+    info = tarfile.TarInfo('f.fa')
+    info.size = len(data)
+    with tarfile.open(path, 'w') as tf:
+        tf.addfile(info, io.BytesIO(data))
+    return path.read_bytes()
+
+
+def test_is_tar_archive(tmp_path):
+    tar = _tar(tmp_path / 't', _DATA)
+    for ctype in ('gzip', 'bzip2', 'xz'):
+        # detected from the data regardless of the name
+        assert is_tar_archive(_write(tmp_path / 'f.fa.gz', tar, ctype), ctype) is True
+        assert is_tar_archive(_write(tmp_path / 'f.fa.gz', _DATA, ctype), ctype) is False
+    for name in ('f.tar.gz', 'f.TGZ', 'f.tbz2', 'f.txz'):
+        assert is_tar_archive(_write(tmp_path / name, _DATA, 'gzip'), 'gzip') is True
+    # short and corrupt files
+    assert is_tar_archive(_write(tmp_path / 'f.gz', b'>c\nA\n', 'gzip'), 'gzip') is False
+    (tmp_path / 'bad.gz').write_bytes(gzip.compress(_DATA)[:30])
+    assert is_tar_archive(tmp_path / 'bad.gz', 'gzip') is False
+
+
+def test_open_decompressed(tmp_path, monkeypatch):
+    monkeypatch.setattr(Decompress, '_CHUNK_SIZE', 1000)
+    monkeypatch.setattr(Decompress, '_BGZF_BLOCKS_PER_THREAD', 2)
+    for ctype in ('gzip', 'bgzf', 'bzip2', 'xz'):
+        f = _write(tmp_path / f'f_{ctype}', _DATA, ctype)
+        for threads in (1, 3):
+            with open_decompressed(f, compression_type(f), threads) as r:
+                got = []
+                for size in iter(lambda: 777, None):
+                    data = r.read(size)
+                    if not data:
+                        break
+                    got.append(data)
+            assert b''.join(got) == _DATA
+            with open_decompressed(f, compression_type(f), threads) as r:
+                assert r.read() == _DATA
+                assert r.read(10) == b''
+
+
+def test_open_decompressed_close_early(tmp_path, monkeypatch):
+    monkeypatch.setattr(Decompress, '_CHUNK_SIZE', 100)
+    f = _write(tmp_path / 'f.gz', _DATA, 'gzip')
+    r = open_decompressed(f, 'gzip')
+    assert r.read(10) == _DATA[:10]
+    r.close()
+
+
+def test_open_decompressed_corrupt(tmp_path):
+    for ctype in ('gzip', 'bgzf'):
+        f = _write(tmp_path / 'f.gz', _DATA, ctype)
+        data = bytearray(f.read_bytes())
+        data[len(data) // 2] ^= 0xff
+        f.write_bytes(bytes(data))
+        with raises(Exception):
+            with open_decompressed(f, 'gzip', threads=2) as r:
+                r.read()
+
+
+def test_read_ahead_reader_error():
+    err = ValueError('oops')
+
+    def chunks():
+        yield b'abc'
+        raise err
+    r = ReadAheadReader(chunks())
+    assert r.read(2) == b'ab'
+    with raises(Exception) as got:
+        r.read(5)
+    assert got.value is err
+    r.close()
+
+
+def test_tee_reader():
+    sink = io.BytesIO()
+    t = TeeReader(io.BytesIO(b'abcdefg'), sink)
+    assert t.read(3) == b'abc'
+    assert t.read() == b'defg'
+    assert t.read(2) == b''
+    assert sink.getvalue() == b'abcdefg'
@@ -0,0 +1,111 @@
+'''
+Unit tests for FastaIndex.py and FASTA index creation in FastaToAssembly.py.
+'''
+
+import gzip
+from hashlib import md5
+from pathlib import Path
+from unittest.mock import create_autospec
+
+from AssemblyUtil import FastaIndex
+from AssemblyUtil.FastaIndex import FaiEntry, LineLayout
+from AssemblyUtil.FastaToAssembly import FastaToAssembly
+from installed_clients.DataFileUtilClient import DataFileUtil
+
+_TEST_DATA = Path(__file__).parent / 'data'
+
+
+def _fta(tmp_path, use_mmap=True):
+    dfu = create_autospec(DataFileUtil, spec_set=True, instance=True)
+    return FastaToAssembly(dfu, tmp_path, use_mmap=use_mmap, write_fai=True)
+
+
+def _read_fai(path):
+    with open(path) as f:
+        return [FaiEntry(l[0], *[int(x) for x in l[1:]])
+                for l in (line.split('\t') for line in f)]
+
+
+def _sequence(fasta: bytes, e: FaiEntry):
+    # the samtools faidx byte arithmetic
+    full, last = divmod(e.length, e.line_bases)
+    seq = b''.join(fasta[e.offset + i * e.line_width:e.offset + i * e.line_width + e.line_bases]
+                   for i in range(full))
+    start = e.offset + full * e.line_width
+    return seq + fasta[start:start + last]
+
+
+def _layout_entry(data: bytes, length, chunk_size=None):
+    layout = LineLayout()
+    chunk_size = chunk_size or len(data) or 1
+    for i in range(0, len(data), chunk_size):
+        layout.update(data[i:i + chunk_size])
+    return layout.entry('c', length, 10)
+
+
+def test_line_layout(monkeypatch):
+    test_cases = [
+        (b'ACGT\nACGT\nAC\n', 10, FaiEntry('c', 10, 10, 4, 5)),
+        (b'ACGT\nACGT\nACGT\n', 12, FaiEntry('c', 12, 10, 4, 5)),
+        (b'ACGT\r\nACGT\r\nAC\r\n\r\n\n', 10, FaiEntry('c', 10, 10, 4, 6)),
+        (b'ACGT\nACGT\nAC', 10, FaiEntry('c', 10, 10, 4, 5)),
+        (b'ACGTAC', 6, FaiEntry('c', 6, 10, 6, 7)),
+        (b'ACGT\nACGT\n\n\n', 8, FaiEntry('c', 8, 10, 4, 5)),
+        # inconsistent layouts
+        (b'ACGT\nACG\nACGT\n', 11, None),
+        (b'ACGT\nACGTA\nA\n', 10, None),
+        (b'ACGT\nAC\n\nA\n', 7, None),
+        (b'ACGT\nAC\nA', 7, None),
+        (b'ACGT\nACGTAC', 10, None),
+        (b'\nACGT\nAC\n', 6, None),
+        (b'AC T\nACGT\n', 7, None),
+    ]
+    # small chunks are split into lines in python, larger chunks with numpy
+    for array_min_size in (4096, 0):
+        monkeypatch.setattr(FastaIndex, '_ARRAY_MIN_SIZE', array_min_size)
+        for data, length, expected in test_cases:
+            for chunk_size in (None, 1, 2, 3, 5):
+                assert _layout_entry(data, length, chunk_size) == expected, (
+                    data, chunk_size, array_min_size)
+
+
+def test_index_written_on_parse(tmp_path):
+    data = b'>c1 desc\nACGTA\nCCGTA\nAG\n>c2\nAcG\n>c3\r\nAAAAA\r\nAAA\r\n'
+    fp = tmp_path / 'in.fa'
+    fp.write_bytes(data)
+    for use_mmap in (True, False):
+        assdata = _fta(tmp_path, use_mmap)._parse_fasta(fp, {})
+        index = _read_fai(tmp_path / 'in.fa.fai')
+        assert index == [
+            FaiEntry('c1', 12, 9, 5, 6),
+            FaiEntry('c2', 3, 28, 3, 4),
+            FaiEntry('c3', 8, 37, 5, 7),
+        ]
+        for e in index:
+            seq = _sequence(data, e)
+            assert md5(seq.upper()).hexdigest() == assdata['contigs'][e.name]['md5']
+
+
+def test_index_not_written_on_inconsistent_lines(tmp_path):
+    fp = tmp_path / 'in.fa'
+    fp.write_bytes(b'>c1\nACGT\nACGT\n>c2\nACG\nAC GT\n')
+    _fta(tmp_path)._parse_fasta(fp, {})
+    assert not (tmp_path / 'in.fa.fai').exists()
+
+
+def test_index_test_data(tmp_path):
+    f = sorted(_TEST_DATA.glob('*.fna.gz'))[0]
+    fp = tmp_path / 'in.fa'
+    with gzip.open(f) as fin:
+        data = fin.read()
+    fp.write_bytes(data)
+    fta = _fta(tmp_path)
+    for filtered, assdata in [
+        (fp, fta._parse_fasta(fp, {})),
+        fta._filter_and_parse_fasta(fp, 10000, {})
+    ]:
+        index = _read_fai(Path(str(filtered) + '.fai'))
+        assert [e.name for e in index] == list(assdata['contigs'])
+        fasta = filtered.read_bytes()
+        for e in index:
+            assert md5(_sequence(fasta, e).upper()).hexdigest() == assdata['contigs'][e.name]['md5']
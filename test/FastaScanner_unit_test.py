@@ -0,0 +1,328 @@
+'''
+Unit tests for FastaScanner.py and the native FASTA parser in FastaToAssembly.py.
+'''
+
+import gzip
+import io
+from hashlib import md5
+from pathlib import Path
+from unittest.mock import create_autospec
+
+import AssemblyUtil.FastaToAssembly as fta_module
+from AssemblyUtil.FastaScanner import (
+    AssemblyHasher, ContigStats, HEADER, SEQUENCE, scan_fasta, scan_fasta_buffer,
+    split_fasta_file, summarize_fasta_range
+)
+from AssemblyUtil.FastaToAssembly import FastaToAssembly
+from conftest import assert_exception_correct
+from installed_clients.DataFileUtilClient import DataFileUtil
+from pytest import raises
+
+_TEST_DATA = Path(__file__).parent / 'data'
+
+_EDGE_CASES = (
+    '>contig1 some description  \n'
+    + 'acgtNNac\n'
+    + 'GGCC TT\r\n'
+    + '\n'
+    + '>contig2\t tabbed\t\n'
+    + 'ACGT\t\n'
+    + 'RYKM ACGT  \n'
+    + '>  \n'
+    + 'CCCC\n'
+    + '>last'
+)
+
+
+def _parsers(path, use_mmap=False):
+    return [
+        FastaToAssembly(
+            create_autospec(DataFileUtil, spec_set=True, instance=True),
+            path,
+            fasta_parser=p,
+            use_mmap=use_mmap)
+        for p in ('native', 'biopython')
+    ]
+
+
+def _parse_both(tmp_path, contents, extra_contig_info=None):
+    fp = tmp_path / 'in.fasta'
+    fp.write_bytes(contents)
+    native, bio = [p._parse_fasta(fp, extra_contig_info or {}) for p in _parsers(tmp_path)]
+    native_mmap, _ = _parsers(tmp_path, use_mmap=True)
+    assert native_mmap._parse_fasta(fp, extra_contig_info or {}) == native
+    return native, bio
+
+
+def _fail_both(tmp_path, contents, expected):
+    fp = tmp_path / 'in.fasta'
+    fp.write_bytes(contents)
+    for p in _parsers(tmp_path):
+        with raises(Exception) as got:
+            p._parse_fasta(fp, {})
+        assert_exception_correct(got.value, expected)
+
+
+def test_fail_bad_parser():
+    with raises(Exception) as got:
+        FastaToAssembly(None, Path('foo'), fasta_parser='bioperl')
+    assert_exception_correct(got.value, ValueError(
+        "fasta_parser must be one of ('native', 'biopython'), got: bioperl"))
+
+
+def test_scan_fasta_small_buffers():
+    data = b'text before the first header\n' + _EDGE_CASES.encode()
+    expected = list(scan_fasta(io.BytesIO(data)))
+    assert [e for e in expected if e[0] == HEADER] == [
+        (HEADER, 'contig1 some description', data.index(b'>contig1')),
+        (HEADER, 'contig2\t tabbed', data.index(b'>contig2')),
+        (HEADER, '', data.index(b'>  ')),
+        (HEADER, 'last', data.index(b'>last')),
+    ]
+    for bufsize in range(1, 20):
+        events = list(scan_fasta(io.BytesIO(data), buffer_size=bufsize))
+        headers = [e for e in events if e[0] == HEADER]
+        assert headers == [e for e in expected if e[0] == HEADER]
+        seqs = [e for e in events if e[0] == SEQUENCE]
+        # sequence data is contiguous between headers
+        for event, data_, offset in seqs:
+            assert data[offset:offset + len(data_)] == data_
+
+
+def test_scan_fasta_buffer():
+    data = b'text before the first header\n' + _EDGE_CASES.encode()
+    expected = list(scan_fasta(io.BytesIO(data)))
+    for chunk_size in (1, 2, 7, 100):
+        events = list(scan_fasta_buffer(data, chunk_size=chunk_size))
+        assert [e for e in events if e[0] == HEADER] == [e for e in expected if e[0] == HEADER]
+        seqs = [e for e in events if e[0] == SEQUENCE]
+        assert max(len(d) for _, d, _ in seqs) <= chunk_size
+        for event, data_, offset in seqs:
+            assert data[offset:offset + len(data_)] == data_
+    # scan a range
+    start = data.index(b'>contig2')
+    end = data.index(b'>  ')
+    assert [e for e in scan_fasta_buffer(data, start, end)] == [
+        (HEADER, 'contig2\t tabbed', start),
+        (SEQUENCE, b'ACGT\t\nRYKM ACGT  \n', start + 18),
+    ]
+
+
+def test_contig_stats_chunked():
+    expected = ContigStats('c1', 'ACGTN')
+    expected.update(b'acgT\tnn  \n  AC\r\nGG\n')
+    for split in range(1, 18):
+        cs = ContigStats('c1', 'ACGTN')
+        raw = b'acgT\tnn  \n  AC\r\nGG\n'
+        cs.update(raw[:split])
+        cs.update(raw[split:])
+        assert cs.length == expected.length
+        assert cs.md5() == expected.md5()
+        assert cs.invalid_char == expected.invalid_char
+        assert cs.counts == expected.counts
+
+
+def test_parse_edge_cases(tmp_path):
+    native, bio = _parse_both(tmp_path, _EDGE_CASES.replace('>last', '>last\nA').encode(),
+                              {'contig2': {'is_circ': 1}})
+    assert native == bio
+    assert native['contigs']['contig1']['description'] == 'some description'
+    assert native['contigs']['contig2']['length'] == 12
+
+
+def test_parse_test_data(tmp_path):
+    for f in sorted(_TEST_DATA.glob('*.fna.gz'))[:3]:
+        with gzip.open(f) as fin:
+            native, bio = _parse_both(tmp_path, fin.read())
+        assert native == bio
+
+
+def test_parse_fail_amino_acids(tmp_path):
+    _fail_both(tmp_path, b'>c1\nACGT\n>c2\nACXGTPZ\n', ValueError(
+        'This FASTA file may have amino acids in it instead of the required nucleotides.'))
+
+
+def test_parse_fail_invalid_chars(tmp_path):
+    _fail_both(tmp_path, b'>c1\nACGT\n>c2\nAC\nG*TPZ\n', ValueError(
+        'This FASTA file has non nucleic acid characters: *'))
+
+
+def test_parse_fail_duplicate_id(tmp_path):
+    _fail_both(tmp_path, b'>c1\nACGT\n>c2\nACGT\n>c1 again\nA\n', ValueError(
+        'The FASTA header key c1appears more than once in the file'))
+
+
+def test_contig_stats_counts_order():
+    cs = ContigStats('c1', 'ACGTNRY')
+    cs.update(b'TTRaN\n')
+    cs.update(b'yNcR\n')
+    assert list(cs.counts.items()) == [
+        ('A', 1), ('C', 1), ('T', 2), ('R', 2), ('N', 2), ('Y', 1)]
+    assert cs.invalid_char is None
+    cs.update(b'GQ-')
+    assert cs.invalid_char == 'Q'
+    assert cs.length == 12
+
+
+def test_contig_stats_large_chunk():
+    # large chunks are counted with a histogram, small chunks with bytes methods
+    raw = b'tTRa\nN*yG\n' * 10000 + b'GQ-\n'
+    expected = ContigStats('c1', 'ACGTNRY')
+    expected.update(raw)
+    cs = ContigStats('c1', 'ACGTNRY')
+    for i in range(0, len(raw), 100):
+        cs.update(raw[i:i + 100])
+    assert list(expected.counts.items()) == [
+        ('A', 10000), ('G', 10001), ('T', 20000), ('R', 10000), ('N', 10000), ('*', 10000),
+        ('Y', 10000), ('Q', 1), ('-', 1)]
+    assert cs.counts == expected.counts
+    assert list(cs.counts) == list(expected.counts)
+    assert cs.invalid_char == expected.invalid_char == '*'
+    assert cs.md5() == expected.md5()
+
+
+def _filter_both(tmp_path, contents, min_length):
+    res = []
+    for p in _parsers(tmp_path):
+        d = tmp_path / p._fasta_parser
+        d.mkdir()
+        fp = d / 'in.fasta'
+        fp.write_bytes(contents)
+        filtered, assdata = p._filter_and_parse_fasta(fp, min_length, {})
+        assert filtered == d / 'in.fasta.filtered.fa'
+        res.append((filtered.read_bytes(), assdata))
+    return res
+
+
+def test_filter_and_parse_edge_cases(tmp_path):
+    # short contigs with bad characters or duplicate IDs are ignored
+    contents = (_EDGE_CASES + '\n>contig1\nAC*\n>c3\n' + 'ac gt' * 100 + '\n').encode()
+    native, bio = _filter_both(tmp_path, contents, 5)
+    assert native == bio
+    assert native[1]['num_contigs'] == 3
+
+
+def test_filter_and_parse_test_data(tmp_path):
+    f = sorted(_TEST_DATA.glob('*.fna.gz'))[0]
+    with gzip.open(f) as fin:
+        native, bio = _filter_both(tmp_path, fin.read(), 10000)
+    assert native == bio
+    assert native[1]['num_contigs'] == 101
+
+
+def test_assembly_hasher():
+    for count in (0, 1, 2, 50):
+        hexes = [md5(str(i).encode()).hexdigest() for i in range(count)]
+        hasher = AssemblyHasher()
+        for h in hexes:
+            hasher.add(bytes.fromhex(h))
+        assert hasher.hexdigest() == md5(",".join(sorted(hexes)).encode()).hexdigest()
+
+
+def test_split_fasta_file(tmp_path):
+    data = b'text before the first header\n' + _EDGE_CASES.encode()
+    fp = tmp_path / 'in.fasta'
+    fp.write_bytes(data)
+    for count in range(1, 10):
+        ranges = split_fasta_file(fp, count)
+        assert len(ranges) <= count
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == len(data)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start
+            assert data[start - 1:start + 1] == b'\n>'
+    assert split_fasta_file(fp, 3) == [
+        (0, data.index(b'>contig2')), (data.index(b'>contig2'), data.index(b'>  ')),
+        (data.index(b'>  '), len(data))]
+    fp.write_bytes(b'')
+    assert split_fasta_file(fp, 3) == [(0, 0)]
+
+
+def test_summarize_fasta_range(tmp_path):
+    data = b'text before the first header\n' + _EDGE_CASES.encode()
+    fp = tmp_path / 'in.fasta'
+    fp.write_bytes(data)
+    start, end = data.index(b'>contig2'), data.index(b'>last')
+    for use_mmap in (True, False):
+        contigs = list(summarize_fasta_range(fp, start, end, 'ACGTNRYKM', True, use_mmap))
+        assert [(c.id, c.description, c.length, c.offset, c.invalid_char) for c in contigs] == [
+            ('contig2', 'tabbed', 12, start, None), ('', '', 4, data.index(b'>  '), None)]
+        expected = ContigStats('contig2', 'ACGTNRYKM')
+        expected.update(b'ACGT\nRYKMACGT\n')
+        assert contigs[0].md5() == expected.md5()
+        assert contigs[0].digest() == expected.digest()
+        assert contigs[0].counts == expected.counts
+        # the line lengths are inconsistent
+        assert contigs[0].index_entry is None
+        assert contigs[1].index_entry.offset == data.index(b'CCCC')
+        assert list(summarize_fasta_range(fp, 0, 0, 'ACGT', use_mmap=use_mmap)) == []
+
+
+def _parse_ranges(tmp_path, monkeypatch, contents, processes):
+    fp = tmp_path / 'in.fasta'
+    fp.write_bytes(contents)
+    monkeypatch.setattr(fta_module, '_MIN_RANGE_SIZE', 10)
+    res = []
+    for use_mmap in (True, False):
+        for p in (1, processes):
+            fta = FastaToAssembly(
+                create_autospec(DataFileUtil, spec_set=True, instance=True),
+                tmp_path,
+                use_mmap=use_mmap,
+                parse_processes=p,
+                write_fai=True)
+            try:
+                res.append((fta._parse_fasta(fp, {'c3': {'is_circ': 1}}),
+                            (tmp_path / 'in.fasta.fai').read_bytes()
+                            if (tmp_path / 'in.fasta.fai').exists() else None))
+            except Exception as e:
+                res.append(e)
+            if (tmp_path / 'in.fasta.fai').exists():
+                (tmp_path / 'in.fasta.fai').unlink()
+    # the temporary directories for the contig summary files are removed
+    assert list(tmp_path.glob('import_fasta_*')) == []
+    return res
+
+
+def test_parse_fasta_ranges(tmp_path, monkeypatch):
+    contents = b''.join(
+        b'>c%d desc %d\n' % (i, i) + b'ACG\n' + b'acgtNRY' * (i * 3) + b'\n'
+        + b'ACGTTT' * i + b'\n'
+        for i in range(1, 40))
+    res = _parse_ranges(tmp_path, monkeypatch, contents, 7)
+    assert res[0][0]['num_contigs'] == 39
+    assert res[0][0]['contigs']['c3']['is_circ'] == 1
+    assert res[0][1] is None  # inconsistent line lengths
+    for r in res[1:]:
+        assert r == res[0]
+    assert list(res[1][0]['contigs']) == list(res[0][0]['contigs'])
+    assert list(res[1][0]['base_counts']) == list(res[0][0]['base_counts'])
+
+    # an index is written when the line layout allows
+    contents = b''.join(b'>c%d\n' % i + (b'ACGTA' * 12 + b'\n') * i for i in range(1, 40))
+    res = _parse_ranges(tmp_path, monkeypatch, contents, 4)
+    assert res[0][1]
+    for r in res[1:]:
+        assert r == res[0]
+
+    # the data isn't big enough to split
+    monkeypatch.setattr(fta_module, '_MIN_RANGE_SIZE', 100000)
+    fp = tmp_path / 'in.fasta'
+    fta = FastaToAssembly(None, tmp_path, parse_processes=4)
+    assert fta._split_for_parsing(fp) == [None]
+
+
+def test_parse_fasta_ranges_fail(tmp_path, monkeypatch):
+    contigs = [b'>c%d\n' % i + b'ACGT' * 10 + b'\n' for i in range(30)]
+    cases = [
+        (contigs + [b'>c0\nA\n'], ValueError(
+            'The FASTA header key c0appears more than once in the file')),
+        # the first error in the file is reported
+        (contigs[:25] + [b'>c0\nA\n'] + contigs[25:] + [b'>c40\nAC*G\n'], ValueError(
+            'The FASTA header key c0appears more than once in the file')),
+        (contigs[:3] + [b'>c40\nACPG\n'] + contigs[3:] + [b'>c0\nA\n'], ValueError(
+            'This FASTA file may have amino acids in it instead of the required nucleotides.')),
+    ]
+    for contents, expected in cases:
+        for r in _parse_ranges(tmp_path, monkeypatch, b''.join(contents), 5):
+            assert_exception_correct(r, expected)
@@ -3,16 +3,36 @@ Unit tests for FastaToAssembly.py.
 Integration tests are in the server test file.
 '''
 
+import bz2
+import dill
+import gzip
+import io
+import json
+import lzma
 import os
+import struct
+import tarfile
+import threading
+import zlib
+from copy import deepcopy
+from multiprocessing.pool import ThreadPool
+import time
 import uuid
 from pathlib import Path
 from typing import Callable, Optional
-from unittest.mock import create_autospec
+from unittest.mock import create_autospec, patch
 
-from AssemblyUtil.FastaToAssembly import FastaToAssembly
+import AssemblyUtil.FastaToAssembly as fta_module
+from AssemblyUtil.ContigTable import ContigTable, json_default
+from AssemblyUtil.FastaToAssembly import FastaToAssembly, ImportWorkerPool
+from AssemblyUtil.Retry import Retrier
 from conftest import assert_exception_correct
 from installed_clients.DataFileUtilClient import DataFileUtil
+from installed_clients.baseclient import ServerError
 from pytest import raises
+from requests import Response
+from requests.exceptions import ConnectionError, HTTPError, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
 
 # TODO Add more unit tests when changing things until entire file is covered by unit tests
 
@@ -671,4 +691,651 @@ def test_import_fasta_mass_fail_invalid_max_cumsize():
     test_spec3 = [(f"max_cumsize must be <= {1024 * 1024 * 1024 * 0.95}", b)]
     _run_test_spec_fail(test_spec1, max_cumsize="9999", mass=True)
     _run_test_spec_fail(test_spec2, max_cumsize=-1, mass=True)
-    _run_test_spec_fail(test_spec3, max_cumsize=1024 * 1024 * 1024 * 1024, mass=True)
\ No newline at end of file
+    _run_test_spec_fail(test_spec3, max_cumsize=1024 * 1024 * 1024 * 1024, mass=True)
+
+def test_run_parallel_import_fasta_mass_largest_first(tmp_path, monkeypatch):
+    sizes = {'a': 10, 'b': 300, 'c': 0, 'd': 300, 'e': 50}
+    inputs = []
+    for name, size in sizes.items():
+        (tmp_path / name).write_bytes(b'A' * size)
+        inputs.append({'file': str(tmp_path / name), 'assembly_name': name})
+    inputs.append({'file': str(tmp_path / 'missing'), 'assembly_name': 'missing'})
+    calls = []
+
+    def apply_starmap(workers, fun, batch_input, batch_max_cumsize):
+        calls.append((workers, batch_input, batch_max_cumsize))
+        return [[{'upa': p['inputs'][0]['assembly_name']}] for p in batch_input]
+
+    monkeypatch.setattr(fta_module, '_apply_starmap', apply_starmap)
+    fta, _ = _set_up_mocks()
+    res = fta._run_parallel_import_fasta_mass(
+        {'workspace_id': 1, 'inputs': inputs}, 3, 1000)
+
+    assert res == [{'upa': n} for n in ['a', 'b', 'c', 'd', 'e', 'missing']]
+    assert len(calls) == 1
+    workers, batch_input, batch_max_cumsize = calls[0]
+    assert workers == 3
+    assert [p['inputs'] for p in batch_input] == [
+        [inputs[i]] for i in [1, 3, 4, 0, 2, 5]]
+    assert all(p['workspace_id'] == 1 for p in batch_input)
+    assert batch_max_cumsize == [1000] * 6
+
+
+def test_fail_worker_pool_without_token():
+    pool = create_autospec(ImportWorkerPool, spec_set=True, instance=True)
+    for token in (None, ''):
+        with raises(Exception) as got:
+            FastaToAssembly(None, Path('foo'), worker_pool=pool, token=token)
+        assert_exception_correct(got.value, ValueError(
+            'A token is required when providing a worker pool'))
+
+
+def test_run_parallel_import_fasta_mass_worker_pool():
+    pool = create_autospec(ImportWorkerPool, spec_set=True, instance=True)
+    pool.run.return_value = [[{'upa': 'x'}], [{'upa': 'y'}]]
+    dfu = create_autospec(DataFileUtil, spec_set=True, instance=True)
+    fta = FastaToAssembly(
+        dfu, Path('foo'), fasta_parser='biopython', worker_pool=pool, token='tok')
+    inputs = [{'node': 'n1', 'assembly_name': 'x'}, {'node': 'n2', 'assembly_name': 'y'}]
+    res = fta._run_parallel_import_fasta_mass({'workspace_id': 1, 'inputs': inputs}, 4, 100)
+
+    assert res == [{'upa': 'x'}, {'upa': 'y'}]
+    pool.run.assert_called_once_with(
+        4,
+        'tok',
+        {'fasta_parser': 'biopython', 'use_mmap': True, 'write_fai': False,
+         'pipeline_queue_size': 0, 'max_save_objects': None, 'save_concurrency': 4,
+         'spill_contigs': False,
+         'max_retries': 3,
+         'checkpoint': False,
+         'reuse_uploads': False,
+         'gzip_uploads': False,
+         'stream_decompress': False,
+         'decompress_threads': 1,
+         'parse_processes': 1,
+         'io_threads': 1,
+         'parse_workers': 0},
+        [{'workspace_id': 1, 'inputs': [inputs[0]]}, {'workspace_id': 1, 'inputs': [inputs[1]]}],
+        [100, 100])
+
+
+def test_import_worker_pool(tmp_path):
+    missing = tmp_path / 'missing.fa'
+    params = {'workspace_id': 1, 'inputs': [{'file': str(missing), 'assembly_name': 'x'}]}
+    err = ValueError(
+        "KBase Assembly Utils tried to save an assembly, but the calling application "
+        + f"specified a file ('{missing}') that is missing. Please check the application "
+        + "logs for details.")
+    pool = ImportWorkerPool('http://localhost:1', tmp_path, 2)
+    try:
+        # the pool isn't restarted when the worker count changes
+        for workers in (2, 1, 3):
+            with raises(Exception) as got:
+                pool.run(workers, 'tok', {}, [params, params], [100, 100])
+            assert_exception_correct(got.value, err)
+            if workers == 2:
+                mp_pool = pool._pool
+            assert pool._pool is mp_pool
+    finally:
+        pool.close()
+    assert pool._pool is None
+
+
+def test_import_worker_pool_concurrency(tmp_path):
+    # run the workers in threads so the batches can be tracked
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def run_import(token, options, params, max_cumsize):
+        with lock:
+            running.append(1)
+            max_running.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        if params == 'fail':
+            raise ValueError('fail')
+        return params * 2
+
+    with patch('AssemblyUtil.FastaToAssembly.Pool', ThreadPool), patch(
+            'AssemblyUtil.FastaToAssembly._run_worker_import', run_import):
+        pool = ImportWorkerPool('http://localhost:1', tmp_path, 4)
+        try:
+            for workers, expected_max in ((1, 1), (2, 2), (6, 4)):
+                max_running.clear()
+                batches = [f'b{i}' for i in range(8)]
+                res = pool.run(workers, 'tok', {}, batches, [100] * 8)
+                assert res == [b * 2 for b in batches]
+                assert max(max_running) == expected_max
+            max_running.clear()
+            with raises(Exception) as got:
+                pool.run(1, 'tok', {}, ['b0', 'fail', 'b2', 'b3'], [100] * 4)
+            assert_exception_correct(got.value, ValueError('fail'))
+            # batches after the failure aren't started
+            assert len(max_running) == 2
+        finally:
+            pool.close()
+
+
+def test_import_worker_pool_fail_max_workers(tmp_path):
+    with raises(Exception) as got:
+        ImportWorkerPool('http://localhost:1', tmp_path, 0)
+    assert_exception_correct(got.value, ValueError('max_workers must be at least 1'))
+
+
+def _set_up_echo_mocks(scratch, pipeline_queue_size, dfu=None, **kwargs):
+    dfu = dfu or create_autospec(DataFileUtil, spec_set=True, instance=True)
+    fta = FastaToAssembly(dfu, scratch, pipeline_queue_size=pipeline_queue_size, **kwargs)
+    dfu.unpack_files.side_effect = lambda fs: [{'file_path': f['file_path']} for f in fs]
+    dfu.file_to_shock_mass.side_effect = lambda fs: [{
+        'shock_id': 'node_' + Path(f['file_path']).name,
+        'handle': {'hid': 'KBH_' + Path(f['file_path']).name},
+    } for f in fs]
+    dfu.save_objects.side_effect = lambda p: [
+        [1, o['name'], 'type', 'time', 1, 'user', p['id'], 'wsname', 'md5', 78, o['meta']]
+        for o in p['objects']]
+    return fta, dfu
+
+
+def test_import_fasta_mass_pipelined(tmp_path):
+    inputs = []
+    for i in range(5):
+        (tmp_path / f'f{i}.fasta').write_text(f'>c{i} desc\nACGT\n>d{i}\n' + 'ACGTT' * (i + 1))
+        inputs.append({'file': str(tmp_path / f'f{i}.fasta'), 'assembly_name': f'a{i}',
+                       'contig_info': {f'c{i}': {'is_circ': 1}}})
+    results = []
+    saved = []
+    for queue_size in (0, 1, 3):
+        scratch = tmp_path / f'scratch{queue_size}'
+        pool = create_autospec(ImportWorkerPool, spec_set=True, instance=True)
+        fta, dfu = _set_up_echo_mocks(scratch, queue_size, worker_pool=pool, token='tok')
+        # the pipeline runs in this process rather than in the import workers
+        res = fta.import_fasta_mass(
+            {'workspace_id': 42, 'min_contig_length': 5, 'inputs': inputs},
+            parallelize=bool(queue_size))
+        pool.run.assert_not_called()
+        for r in res:
+            r['filtered_input'] = Path(r['filtered_input']).name
+        results.append(res)
+        objects = []
+        for c in dfu.save_objects.call_args_list:
+            objects.extend(c[0][0]['objects'])
+        for o in objects:
+            o['data']['fasta_handle_info'] = None
+        # pipelined saves may complete in any order
+        saved.append(sorted(objects, key=lambda o: o['name']))
+        assert dfu.save_objects.call_count == (1 if not queue_size else 5)
+    assert results[0] == results[1] == results[2]
+    assert [r['upa'] for r in results[0]] == ['42/1/1'] * 5
+    assert [r['object_info'][1] for r in results[0]] == [f'a{i}' for i in range(5)]
+    assert saved[0] == saved[1] == saved[2]
+    assert [o['data']['dna_size'] for o in saved[0]] == [5, 10, 15, 20, 25]
+
+
+def test_import_fasta_mass_pipelined_fail(tmp_path):
+    inputs = []
+    for i in range(4):
+        (tmp_path / f'f{i}.fasta').write_text(f'>c{i}\n' + ('ACGT' if i != 2 else 'AC*T'))
+        inputs.append({'file': str(tmp_path / f'f{i}.fasta'), 'assembly_name': f'a{i}'})
+    fta, dfu = _set_up_echo_mocks(tmp_path / 'scratch', 1)
+    with raises(Exception) as got:
+        fta.import_fasta_mass({'workspace_id': 42, 'inputs': inputs}, parallelize=False)
+    assert_exception_correct(got.value, ValueError(
+        'This FASTA file has non nucleic acid characters: *'))
+    # the input after the failed input is never saved
+    saved = [c[0][0]['objects'][0]['name'] for c in dfu.save_objects.call_args_list]
+    assert 'a2' not in saved and 'a3' not in saved
+
+
+def test_serialized_object_size(tmp_path):
+    fp = tmp_path / 'in.fasta'
+    fp.write_text('>c1 some "quoted" description\nACGTNNA\n>c2\nGGGCCA\n>c3\tdesc\nAT\n')
+    eci = {'c2': {'is_circ': 1, 'description': 'déscription ☃\n'}}
+    for parser in ('native', 'biopython'):
+        fta = FastaToAssembly(None, tmp_path, fasta_parser=parser)
+        assdata = fta._parse_fasta(fp, eci)
+        ao, _ = fta._build_assembly_object(
+            assdata, {'handle': {'hid': 'KBH_1'}, 'shock_id': 'n'}, {'assembly_name': 'a'})
+        assert fta_module._get_serialized_object_size(ao) == len(
+            json.dumps({'params': ao}, default=json_default))
+        assert assdata['contigs'].json_size == len(
+            json.dumps(assdata['contigs'], default=json_default))
+    assert fta_module._get_serialized_object_size({'contigs': ContigTable()}) == len(
+        json.dumps({'params': {'contigs': {}}}))
+
+
+def test_assembly_objects_generator():
+    objs = [{'x': 'a' * n} for n in (10, 10, 40, 5, 5, 5, 5)]
+    sizes = [fta_module._get_serialized_object_size(o) for o in objs]
+    metas = [{'i': str(i)} for i in range(len(objs))]
+    names = [f'n{i}' for i in range(len(objs))]
+
+    def batches(max_cumsize, max_count=None):
+        return [[m['i'] for m in b[1]] for b in FastaToAssembly._assembly_objects_generator(
+            objs, metas, names, max_cumsize, max_count)]
+
+    assert batches(10000) == [['0', '1', '2', '3', '4', '5', '6']]
+    assert batches(10000, 3) == [['0', '1', '2'], ['3', '4', '5'], ['6']]
+    assert batches(sizes[0] * 2) == [['0', '1'], ['2'], ['3', '4'], ['5', '6']]
+    # an object larger than the limit is sent on its own
+    assert batches(sizes[2] - 1) == [['0'], ['1'], ['2'], ['3', '4'], ['5', '6']]
+    assert batches(sizes[0], 1) == [[str(i)] for i in range(7)]
+    assert batches(1000, 2) == [['0', '1'], ['2', '3'], ['4', '5'], ['6']]
+    assert batches(1000, 2) == [
+        [n[1:] for n in b[2]] for b in FastaToAssembly._assembly_objects_generator(
+            objs, metas, names, 1000, 2)]
+    assert list(FastaToAssembly._assembly_objects_generator([], [], [], 100)) == []
+
+
+def test_save_assembly_objects_batched():
+    for concurrency in (1, 3):
+        dfu = create_autospec(DataFileUtil, spec_set=True, instance=True)
+        fta = FastaToAssembly(dfu, Path('foo'), max_save_objects=2,
+                              save_concurrency=concurrency)
+        in_flight = [0, 0]
+
+        def save_objects(params):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            # make the earlier batches finish last
+            time.sleep(0.05 / len(params['objects'][0]['name']))
+            in_flight[0] -= 1
+            return [[o['name']] for o in params['objects']]
+        dfu.save_objects.side_effect = save_objects
+        names = [f'{"n" * (i + 1)}' for i in range(7)]
+        objs = [{'x': i} for i in range(7)]
+        metas = [{} for _ in range(7)]
+        infos = fta._save_assembly_objects_batched(42, names, objs, metas, 10000)
+        assert infos == [[n] for n in names]
+        assert dfu.save_objects.call_count == 4
+        assert sorted(len(c[0][0]['objects']) for c in dfu.save_objects.call_args_list) == [
+            1, 2, 2, 2]
+        assert in_flight[1] == concurrency
+
+
+def test_fail_bad_save_params():
+    for kwargs, err in [
+        ({'pipeline_queue_size': -1}, 'pipeline_queue_size must be an integer >= 0'),
+        ({'pipeline_queue_size': None}, 'pipeline_queue_size is required'),
+        ({'max_save_objects': 0}, 'max_save_objects must be an integer >= 1'),
+        ({'max_save_objects': 'a'}, 'max_save_objects must be an integer, got: a'),
+        ({'save_concurrency': 0}, 'save_concurrency must be an integer >= 1'),
+        ({'save_concurrency': None}, 'save_concurrency is required'),
+        ({'max_retries': -1}, 'max_retries must be an integer >= 0'),
+        ({'max_retries': None}, 'max_retries is required'),
+        ({'decompress_threads': 0}, 'decompress_threads must be an integer >= 1'),
+        ({'decompress_threads': None}, 'decompress_threads is required'),
+        ({'parse_processes': 0}, 'parse_processes must be an integer >= 1'),
+        ({'parse_processes': None}, 'parse_processes is required'),
+        ({'io_threads': 0}, 'io_threads must be an integer >= 1'),
+        ({'io_threads': None}, 'io_threads is required'),
+        ({'parse_workers': -1}, 'parse_workers must be an integer >= 0'),
+        ({'parse_workers': None}, 'parse_workers is required'),
+    ]:
+        with raises(Exception) as got:
+            FastaToAssembly(None, Path('foo'), **kwargs)
+        assert_exception_correct(got.value, ValueError(err))
+
+
+def test_import_fasta_mass_spill_contigs(tmp_path):
+    inputs = []
+    for i in range(4):
+        (tmp_path / f'f{i}.fasta').write_text(f'>c{i} desc ☃\nACGT\n>d{i}\n' + 'ACGTN' * (i + 1))
+        inputs.append({'file': str(tmp_path / f'f{i}.fasta'), 'assembly_name': f'a{i}'})
+    results = []
+    saved = []
+    for spill in (False, True):
+        scratch = tmp_path / f'scratch{spill}'
+        dfu = create_autospec(DataFileUtil, spec_set=True, instance=True)
+        fta = FastaToAssembly(dfu, scratch, spill_contigs=spill, max_save_objects=3)
+        _set_up_echo_mocks(scratch, 0, dfu)
+        results.append(fta.import_fasta_mass(
+            {'workspace_id': 42, 'inputs': inputs}, parallelize=False))
+        objects = []
+        for c in dfu.save_objects.call_args_list:
+            objects.extend(c[0][0]['objects'])
+        for o in objects:
+            o['data']['fasta_handle_info'] = None
+            assert type(o['data']['contigs']) in (dict, ContigTable)
+        saved.append(sorted(objects, key=lambda o: o['name']))
+        assert dfu.save_objects.call_count == 2
+        # the store is removed
+        assert not list(scratch.glob('*/contigs.bin'))
+    assert results[0] == results[1]
+    assert saved[0] == saved[1]
+    assert len(saved[0]) == 4
+
+
+def test_import_fasta_mass_retry_save(tmp_path):
+    (tmp_path / 'f.fasta').write_text('>c1\nACGT\n')
+    fta, dfu = _set_up_echo_mocks(tmp_path / 'scratch', 0)
+    sleeps = []
+    fta._retrier = Retrier(2, sleep=sleeps.append, rand=lambda: 1)
+
+    def fail_first(fn, errs):
+        def f(params):
+            if errs:
+                raise errs.pop(0)
+            return fn(params)
+        return f
+    # saves are only retried if the workspace can't have saved the objects
+    refused = ConnectionError(MaxRetryError(
+        None, '/', NewConnectionError(None, 'Connection refused')))
+    dfu.save_objects.side_effect = fail_first(dfu.save_objects.side_effect, [
+        refused, HTTPError('503', response=create_autospec(Response, status_code=503))])
+    dfu.file_to_shock_mass.side_effect = fail_first(
+        dfu.file_to_shock_mass.side_effect, [ConnectionError('conn reset')])
+    res = fta.import_fasta_mass({'workspace_id': 42, 'inputs': [
+        {'file': str(tmp_path / 'f.fasta'), 'assembly_name': 'a'}]})
+    assert res[0]['upa'] == '42/1/1'
+    assert dfu.file_to_shock_mass.call_count == 2
+    assert dfu.save_objects.call_count == 3
+    # the retried saves reuse the uploaded file
+    handles = [c[0][0]['objects'][0]['data']['fasta_handle_ref']
+               for c in dfu.save_objects.call_args_list]
+    assert handles == ['KBH_f.fasta'] * 3
+    assert sleeps == [1, 1, 2]
+
+
+def test_import_fasta_mass_retry_save_fail(tmp_path):
+    (tmp_path / 'f.fasta').write_text('>c1\nACGT\n')
+    # errors from saves that may have succeeded aren't retried, so objects aren't saved twice
+    for err in [ServerError('JSONRPCError', -32500, 'No workspace with id 42 exists'),
+                ReadTimeout('read timed out'), ConnectionError('conn reset'),
+                ServerError('Unknown', 0, 'Bad gateway')]:
+        fta, dfu = _set_up_echo_mocks(tmp_path / 'scratch', 0)
+        fta._retrier = Retrier(1, sleep=lambda _: None)
+        dfu.save_objects.side_effect = err
+        with raises(Exception) as got:
+            fta.import_fasta_mass({'workspace_id': 42, 'inputs': [
+                {'file': str(tmp_path / 'f.fasta'), 'assembly_name': 'a'}]})
+        assert got.value is err
+        assert dfu.save_objects.call_count == 1
+
+
+def _checkpoint_inputs(tmp_path):
+    inputs = []
+    for i in range(3):
+        (tmp_path / f'f{i}.fasta').write_text(f'>c{i} desc\nACGTAC\n>d{i}\n' + 'ACGTT' * (i + 1))
+        inputs.append({'file': str(tmp_path / f'f{i}.fasta'), 'assembly_name': f'a{i}',
+                       'contig_info': {f'c{i}': {'is_circ': 1}}})
+    return {'workspace_id': 42, 'min_contig_length': 6, 'inputs': inputs}
+
+
+def _saved_objects(dfu):
+    objects = []
+    for c in dfu.save_objects.call_args_list:
+        objects.extend(c[0][0]['objects'])
+    return sorted(objects, key=lambda o: o['name'])
+
+
+def test_import_fasta_mass_checkpoint_resume(tmp_path):
+    params = _checkpoint_inputs(tmp_path)
+    for queue_size in (0, 2):
+        for fail in ('save_objects', 'file_to_shock_mass'):
+            scratch = tmp_path / f'scratch_{queue_size}_{fail}'
+            # the expected results from an import with no failures
+            fta, dfu = _set_up_echo_mocks(scratch / 'x', queue_size)
+            expected = fta.import_fasta_mass(deepcopy(params), parallelize=False)
+            expected_objects = _saved_objects(dfu)
+
+            fta, dfu = _set_up_echo_mocks(scratch, queue_size, checkpoint=True, token='tok')
+            err = ServerError('JSONRPCError', -32500, 'oops')
+            getattr(dfu, fail).side_effect = err
+            with raises(Exception) as got:
+                fta.import_fasta_mass(deepcopy(params), parallelize=False)
+            assert got.value is err
+            cps = [p.name for p in (scratch / 'import_checkpoints').iterdir()]
+            parsed = len([c for c in cps if c.endswith('.parsed.json')])
+            uploaded = len([c for c in cps if c.endswith('.handle.json')])
+            # the pipeline stops starting inputs after the first failure
+            assert parsed == 3 if not queue_size else parsed >= 1
+            if fail == 'file_to_shock_mass':
+                assert uploaded == 0
+            else:
+                assert uploaded == parsed if not queue_size else 1 <= uploaded <= parsed
+
+            # rerun the import
+            fta, dfu = _set_up_echo_mocks(scratch, queue_size, checkpoint=True, token='tok')
+            res = fta.import_fasta_mass(deepcopy(params), parallelize=False)
+            staged = [f for c in dfu.unpack_files.call_args_list for f in c[0][0]]
+            assert len(staged) == 3 - parsed
+            uploads = [f for c in dfu.file_to_shock_mass.call_args_list for f in c[0][0]]
+            assert len(uploads) == 3 - uploaded
+            assert [Path(r['filtered_input']).name for r in res] == [
+                Path(r['filtered_input']).name for r in expected]
+            assert [r['upa'] for r in res] == [r['upa'] for r in expected]
+            objects = _saved_objects(dfu)
+            for o in objects + expected_objects:
+                o['data']['fasta_handle_info'] = None
+            assert objects == expected_objects
+            assert list((scratch / 'import_checkpoints').iterdir()) == []
+
+
+def test_import_fasta_mass_checkpoint_changed_inputs(tmp_path):
+    scratch = tmp_path / 'scratch'
+    params = _checkpoint_inputs(tmp_path)
+    fta, dfu = _set_up_echo_mocks(scratch, 0, checkpoint=True, token='tok')
+    dfu.save_objects.side_effect = ServerError('JSONRPCError', -32500, 'oops')
+    with raises(Exception):
+        fta.import_fasta_mass(params, parallelize=False)
+
+    # a different token, different min_contig_length, or a modified file don't use the checkpoints
+    for token, mcl, modify in (('tok2', 6, False), ('tok', 5, False), ('tok', 6, True)):
+        if modify:
+            (tmp_path / 'f1.fasta').write_text('>c1 desc\nACGTACGG\n')
+        fta, dfu = _set_up_echo_mocks(scratch, 0, checkpoint=True, token=token)
+        fta.import_fasta_mass(dict(params, min_contig_length=mcl), parallelize=False)
+        staged = [Path(c['file_path']).name for c in dfu.unpack_files.call_args[0][0]]
+        assert staged == (['f1.fasta'] if modify else ['f0.fasta', 'f1.fasta', 'f2.fasta'])
+
+
+def test_import_fasta_mass_reuse_uploads(tmp_path):
+    for i in range(3):
+        (tmp_path / f'f{i}.fasta').write_text(f'>c{i} desc\nACGTAC\n')
+    # same sequences and size as f0, different header
+    (tmp_path / 'f3.fasta').write_text('>c0 dosc\nACGTAC\n')
+    scratch = tmp_path / 'scratch'
+
+    def run(files, queue_size=0, token='tok'):
+        fta, dfu = _set_up_echo_mocks(
+            scratch, queue_size, reuse_uploads=True, token=token)
+        res = fta.import_fasta_mass({'workspace_id': 42, 'inputs': [
+            {'file': str(tmp_path / f), 'assembly_name': f} for f in files]}, parallelize=False)
+        uploads = [Path(f['file_path']).name
+                   for c in dfu.file_to_shock_mass.call_args_list for f in c[0][0]]
+        handles = [o['data']['fasta_handle_ref'] for o in _saved_objects(dfu)]
+        return sorted(uploads), handles, res
+
+    uploads, handles, _ = run(['f0.fasta', 'f1.fasta'])
+    assert uploads == ['f0.fasta', 'f1.fasta']
+    uploads, handles, res = run(['f1.fasta', 'f2.fasta', 'f0.fasta', 'f3.fasta'])
+    assert uploads == ['f2.fasta', 'f3.fasta']
+    # the upload of f0 is reused, identified by the filename in the test mocks
+    assert handles == ['KBH_f0.fasta', 'KBH_f1.fasta', 'KBH_f2.fasta', 'KBH_f3.fasta']
+    assert [r['object_info'][1] for r in res] == ['f1.fasta', 'f2.fasta', 'f0.fasta', 'f3.fasta']
+    uploads, _, _ = run(['f0.fasta', 'f1.fasta', 'f2.fasta', 'f3.fasta'], queue_size=2)
+    assert uploads == []
+    uploads, _, _ = run(['f0.fasta'], token='tok2')
+    assert uploads == ['f0.fasta']
+
+
+def test_import_fasta_mass_gzip_uploads(tmp_path):
+    contents = '>c1 desc\nACGTAC\nGG\n>c2\nAC\n>c3\n' + 'ACGTN' * 30 + '\n'
+    (tmp_path / 'f.fasta').write_text(contents)
+    for parser in ('native', 'biopython'):
+        for mcl in (None, 5):
+            scratch = tmp_path / f'scratch_{parser}_{mcl}'
+            fta, dfu = _set_up_echo_mocks(scratch, 0, gzip_uploads=True, fasta_parser=parser)
+            with patch.object(fta_module, 'gzip_file_async',
+                              wraps=fta_module.gzip_file_async) as gzip_file:
+                res = fta.import_fasta_mass({'workspace_id': 42, 'min_contig_length': mcl,
+                                             'inputs': [{'file': str(tmp_path / 'f.fasta'),
+                                                         'assembly_name': 'a'}]},
+                                            parallelize=False)
+            # the native parser compresses the data it reads rather than rereading the file
+            assert gzip_file.called == (parser == 'biopython')
+            upload = Path(dfu.file_to_shock_mass.call_args[0][0][0]['file_path'])
+            assert upload.name == ('f.fasta.gz' if not mcl else 'f.fasta.filtered.fa.gz')
+            plain = Path(str(upload)[:-3])
+            assert gzip.decompress(upload.read_bytes()) == plain.read_bytes()
+            if mcl:
+                assert res[0]['filtered_input'] == str(plain)
+                assert b'>c2' not in plain.read_bytes()
+            else:
+                assert plain.read_text() == contents
+            assert _saved_objects(dfu)[0]['data']['num_contigs'] == (3 if not mcl else 2)
+
+
+def _bgzip(data, block_size=7):
+    # writes BGZF blocks the way bgzip does, with the empty end of file block
+    out = b''
+    for i in range(0, len(data) + 1, block_size):
+        block = data[i:i + block_size]
+        comp = zlib.compressobj(6, zlib.DEFLATED, -15)
+        deflated = comp.compress(block) + comp.flush()
+        bsize = 12 + 6 + len(deflated) + 8 - 1
+        out += (b'\x1f\x8b\x08\x04' + b'\x00' * 6 + struct.pack('<H', 6)
+                + b'BC' + struct.pack('<HH', 2, bsize) + deflated
+                + struct.pack('<II', zlib.crc32(block), len(block)))
+    return out
+
+
+def test_import_fasta_mass_stream_decompress(tmp_path):
+    contents = b'>c1 desc\nACGTAC\nGG\n>c2\nAC\n>c3\n' + b'ACGTN' * 30 + b'\n'
+    (tmp_path / 'f.fasta').write_bytes(contents)
+    compressed = {
+        'f.fasta.gz': gzip.compress(contents),
+        'f.fasta.bz2': bz2.compress(contents),
+        'f.fasta.xz': lzma.compress(contents),
+        'f.fasta.bgz': _bgzip(contents),
+    }
+    (tmp_path / 'c').mkdir()
+    for name, data in compressed.items():
+        (tmp_path / 'c' / name).write_bytes(data)
+    for mcl in (None, 5):
+        for gz in (False, True):
+            expected = None
+            for name in ['f.fasta'] + list(compressed):
+                scratch = tmp_path / f'scratch_{name}_{mcl}_{gz}'
+                infile = tmp_path / 'c' / name if name in compressed else tmp_path / name
+                fta, dfu = _set_up_echo_mocks(scratch, 0, stream_decompress=True,
+                                              decompress_threads=2, gzip_uploads=gz)
+                res = fta.import_fasta_mass({'workspace_id': 42, 'min_contig_length': mcl,
+                                             'inputs': [{'file': str(infile),
+                                                         'assembly_name': 'a'}]},
+                                            parallelize=False)
+                unpacked = [Path(f['file_path']).name for c in dfu.unpack_files.call_args_list
+                            for f in c[0][0]]
+                assert unpacked == ([] if name in compressed else [name])
+                upload = Path(dfu.file_to_shock_mass.call_args[0][0][0]['file_path'])
+                data = upload.read_bytes()
+                if data.startswith(b'\x1f\x8b'):
+                    data = gzip.decompress(data)
+                if name in compressed and not mcl:
+                    # the decompressed data isn't written. Gzip inputs are uploaded as they
+                    # are and other inputs as a gzipped copy
+                    assert upload.name == (name if name in ('f.fasta.gz', 'f.fasta.bgz')
+                                           else 'f.fasta.gz')
+                    assert not (upload.parent / 'f.fasta').exists()
+                    assert not (upload.parent / 'f.fasta.bgz.decompressed').exists()
+                else:
+                    plain = Path(str(upload)[:-3]) if gz else upload
+                    assert plain.read_bytes() == data
+                    if mcl:
+                        assert res[0]['filtered_input'] == str(plain)
+                    else:
+                        assert plain.name == 'f.fasta'
+                if mcl:
+                    assert b'>c2' not in data
+                else:
+                    assert data == contents
+                obj = _saved_objects(dfu)[0]
+                del obj['data']['fasta_handle_ref']
+                del obj['data']['fasta_handle_info']
+                if expected is None:
+                    expected = obj, data
+                assert (obj, data) == expected
+                assert obj['data']['num_contigs'] == (3 if not mcl else 2)
+
+
+def test_import_fasta_mass_stream_decompress_fail_tar(tmp_path):
+    data = b'>c1\nACGT\n'
+    info = tarfile.TarInfo('f.fasta')
+    info.size = len(data)
+    with tarfile.open(tmp_path / 'f.tgz', 'w:gz') as tf:
+        tf.addfile(info, io.BytesIO(data))
+    # detected from the data as well as the name
+    os.link(tmp_path / 'f.tgz', tmp_path / 'f.fasta.gz')
+    for name in ('f.tgz', 'f.fasta.gz'):
+        fta, dfu = _set_up_echo_mocks(tmp_path / f'scratch_{name}', 0, stream_decompress=True)
+        with raises(Exception) as got:
+            fta.import_fasta_mass({'workspace_id': 42, 'inputs': [
+                {'file': str(tmp_path / name), 'assembly_name': 'a'}]})
+        assert_exception_correct(got.value, ValueError(
+            f'The file {name} is a tar archive. Archives are not supported, please provide a '
+            + 'FASTA file, optionally compressed with gzip, bzip2 or xz'))
+        dfu.unpack_files.assert_not_called()
+
+
+def test_import_fasta_mass_hybrid(tmp_path):
+    inputs = []
+    for i in range(6):
+        (tmp_path / f'f{i}.fasta').write_text(f'>c{i} desc\nACGT\n>d{i}\n' + 'ACGTN' * (i + 1))
+        inputs.append({'file': str(tmp_path / f'f{i}.fasta'), 'assembly_name': f'a{i}',
+                       'contig_info': {f'c{i}': {'is_circ': 1}}})
+    params = {'workspace_id': 42, 'min_contig_length': 5, 'inputs': inputs}
+    fta, dfu = _set_up_echo_mocks(tmp_path / 'serial', 0)
+    expected = fta.import_fasta_mass(deepcopy(params), parallelize=False)
+    pool = create_autospec(ImportWorkerPool, spec_set=True, instance=True)
+    fta, hdfu = _set_up_echo_mocks(tmp_path / 'hybrid', 2, parse_workers=2, io_threads=3,
+                                   worker_pool=pool, token='tok')
+    res = fta.import_fasta_mass(deepcopy(params))
+    # the import runs in this process rather than in the import workers
+    pool.run.assert_not_called()
+    for r in expected + res:
+        r['filtered_input'] = Path(r['filtered_input']).name
+    assert res == expected
+    assert _saved_objects(hdfu) == _saved_objects(dfu)
+    assert hdfu.save_objects.call_count == 6
+    # the contig maps returned from the parse processes are removed once read
+    assert not list((tmp_path / 'hybrid').glob('import_fasta_*/contigs_*.bin'))
+
+
+def test_import_fasta_mass_hybrid_fail(tmp_path):
+    inputs = []
+    for i in range(4):
+        (tmp_path / f'f{i}.fasta').write_text(f'>c{i}\n' + ('ACGT' if i != 2 else 'AC*T'))
+        inputs.append({'file': str(tmp_path / f'f{i}.fasta'), 'assembly_name': f'a{i}'})
+    fta, _ = _set_up_echo_mocks(tmp_path / 'scratch', 1, parse_workers=2)
+    with raises(Exception) as got:
+        fta.import_fasta_mass({'workspace_id': 42, 'inputs': inputs})
+    assert_exception_correct(got.value, ValueError(
+        'This FASTA file has non nucleic acid characters: *'))
+
+
+def test_fasta_sizes(tmp_path):
+    (tmp_path / 'f.fasta').write_text('>c1\nACGT\n')
+    (tmp_path / 'f.fasta.gz').write_bytes(gzip.compress(b'>c1\nACGT\n'))
+    inputs = [{'file': str(tmp_path / 'f.fasta')}, {'file': str(tmp_path / 'f.fasta.gz')},
+              {'file': str(tmp_path / 'missing.fa')}, {'node': 'n1'}]
+    sizes = fta_module._input_sizes(inputs)
+    assert sizes[2:] == [0, None]
+    assert fta_module._fasta_sizes(inputs, sizes) == [9, sizes[1] * 4, 0, None]
+
+
+def test_largest_first():
+    assert fta_module._largest_first([10, None, 300, 0, None, 50]) == [1, 4, 2, 5, 0, 3]
+    assert fta_module._largest_first([None, None, None]) == [0, 1, 2]
+
+
+def test_run_dill_encoded_server_error():
+    def fail(params, max_cumsize):
+        raise ServerError('JSONRPCError', -32500,
+                          "'Object #1: Illegal character in object name ^%^%: ^'")
+    params = {'workspace_id': 1, 'inputs': [{'file': 'f', 'assembly_name': '^%^%'}]}
+    with raises(Exception) as got:
+        fta_module._run_dill_encoded(dill.dumps(fail), params, 100)
+    assert_exception_correct(got.value, ValueError(
+        "Error importing assembly ^%^%: 'Object #1: Illegal character in object name ^%^%: ^'"))
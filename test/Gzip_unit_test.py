@@ -0,0 +1,68 @@
+'''
+Unit tests for Gzip.py.
+'''
+
+import gzip
+import io
+import os
+
+from AssemblyUtil import Gzip
+from AssemblyUtil.Gzip import GzipTee, gzip_file, gzip_file_async, gzip_path
+from pytest import raises
+
+
+def test_gzip_file(tmp_path):
+    data = os.urandom(100) + b'ACGT' * 1000000
+    f = tmp_path / 'in.fa'
+    f.write_bytes(data)
+    out = gzip_file(f)
+    assert out == tmp_path / 'in.fa.gz'
+    assert gzip.decompress(out.read_bytes()) == data
+    compressed = out.read_bytes()
+    # no name or mtime in the header
+    assert compressed[3] == 0
+    assert compressed[4:8] == b'\0\0\0\0'
+
+    # the same data compresses to the same bytes regardless of name
+    f2 = tmp_path / 'other.fasta'
+    f2.write_bytes(data)
+    out2 = gzip_file_async(f2).result()
+    assert out2 == gzip_path(f2)
+    assert out2.read_bytes() == compressed
+
+
+def test_gzip_tee(tmp_path, monkeypatch):
+    monkeypatch.setattr(Gzip, '_CHUNK_SIZE', 10)
+    plain = io.BytesIO()
+    tee = GzipTee(plain, tmp_path / 'out.gz')
+    pieces = [b'>c1\n', b'ACGT' * 20, b'\n', b'', b'>c2\n', b'GG\n'] * 20
+    for p in pieces:
+        tee.write(p)
+    tee.close()
+    assert plain.getvalue() == b''.join(pieces)
+    assert gzip.decompress((tmp_path / 'out.gz').read_bytes()) == b''.join(pieces)
+    assert not plain.closed
+
+
+def test_gzip_tee_no_handle(tmp_path, monkeypatch):
+    monkeypatch.setattr(Gzip, '_CHUNK_SIZE', 10)
+    tee = GzipTee(None, tmp_path / 'out.gz')
+    pieces = [b'>c1\n', b'ACGT' * 20, b'\n', b'>c2\n', b'GG\n'] * 20
+    for p in pieces:
+        tee.write(p)
+    tee.close()
+    assert gzip.decompress((tmp_path / 'out.gz').read_bytes()) == b''.join(pieces)
+
+
+def test_gzip_tee_fail(tmp_path):
+    tee = GzipTee(io.BytesIO(), tmp_path / 'out.gz')
+    err = OSError('disk full')
+
+    def fail(data):
+        raise err
+    tee._gz.write = fail
+    for _ in range(5):
+        tee.write(b'A' * (1024 * 1024))
+    with raises(Exception) as got:
+        tee.close()
+    assert got.value is err
@@ -0,0 +1,80 @@
+'''
+Unit tests for Pipeline.py.
+'''
+
+import threading
+import time
+
+from AssemblyUtil.Pipeline import Pipeline, Stage
+from conftest import assert_exception_correct
+from pytest import raises
+
+
+def test_pipeline_order():
+    def slow_odd(x):
+        if x % 2:
+            time.sleep(0.01)
+        return x * 2
+
+    for queue_size in (1, 2, 10):
+        stages = [Stage('double', slow_odd, threads=3), Stage('inc', lambda x: x + 1)]
+        p = Pipeline(stages, queue_size=queue_size)
+        assert p.run(range(20)) == [x * 2 + 1 for x in range(20)]
+        assert [s.items for s in stages] == [20, 20]
+        assert stages[0].busy > 0
+        assert p.wall_time > 0
+    assert Pipeline([Stage('inc', lambda x: x + 1)]).run([]) == []
+
+
+def test_pipeline_overlaps_stages():
+    running = set()
+    overlapped = []
+    lock = threading.Lock()
+
+    def stage(name):
+        def f(x):
+            with lock:
+                running.add(name)
+                if len(running) > 1:
+                    overlapped.append(x)
+            time.sleep(0.02)
+            with lock:
+                running.discard(name)
+            return x
+        return f
+
+    p = Pipeline([Stage('a', stage('a')), Stage('b', stage('b'))])
+    assert p.run(range(5)) == list(range(5))
+    assert overlapped
+    assert 'a: 5 items, 1 threads' in p.report()
+
+
+def test_pipeline_fail():
+    started = []
+
+    def fail_on_3(x):
+        started.append(x)
+        if x == 3:
+            raise ValueError(f'bad item {x}')
+        time.sleep(0.01)
+        return x
+
+    p = Pipeline([Stage('first', lambda x: x), Stage('fail', fail_on_3)])
+    with raises(Exception) as got:
+        p.run(range(100))
+    assert_exception_correct(got.value, ValueError('bad item 3'))
+    # work stops shortly after the failure
+    assert len(started) < 10
+
+
+def test_pipeline_fail_construct():
+    for stages, queue_size, err in [
+        ([], 1, 'At least one stage is required'),
+        ([Stage('a', lambda x: x)], 0, 'queue_size must be > 0'),
+    ]:
+        with raises(Exception) as got:
+            Pipeline(stages, queue_size)
+        assert_exception_correct(got.value, ValueError(err))
+    with raises(Exception) as got:
+        Stage('foo', lambda x: x, threads=0)
+    assert_exception_correct(got.value, ValueError('threads must be > 0 for stage foo'))
@@ -0,0 +1,120 @@
+'''
+Unit tests for Retry.py.
+'''
+
+from unittest.mock import Mock
+
+from AssemblyUtil.Retry import Retrier, is_transient
+from conftest import assert_exception_correct
+from installed_clients.baseclient import ServerError
+from pytest import raises
+from requests.exceptions import ConnectionError, ConnectTimeout, HTTPError, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+
+def _http_error(status):
+    return HTTPError(f'{status} error', response=Mock(status_code=status))
+
+
+def test_is_transient():
+    for err in [ConnectionError('conn'), ReadTimeout('timeout'), _http_error(502),
+                _http_error(503), _http_error(504), _http_error(429),
+                ServerError('Unknown', 0, '<html>Bad gateway</html>')]:
+        assert is_transient(err) is True, err
+    for err in [ValueError('foo'), _http_error(404), _http_error(401), HTTPError('no resp'),
+                ServerError('JSONRPCError', -32500, 'Object foo not found')]:
+        assert is_transient(err) is False, err
+
+
+def _refused():
+    return ConnectionError(MaxRetryError(None, '/', NewConnectionError(None, 'refused')))
+
+
+def test_is_transient_not_idempotent():
+    # only errors where the service can't have handled the call
+    for err in [_refused(), ConnectTimeout('connect timeout'), _http_error(503),
+                _http_error(429)]:
+        assert is_transient(err, idempotent=False) is True, err
+    for err in [ConnectionError('conn reset'), ReadTimeout('timeout'), _http_error(502),
+                _http_error(504), ServerError('Unknown', 0, '<html>Bad gateway</html>'),
+                ValueError('foo'), ServerError('JSONRPCError', -32500, 'bad')]:
+        assert is_transient(err, idempotent=False) is False, err
+
+
+def _retrier(sleeps, **kwargs):
+    return Retrier(sleep=sleeps.append, rand=lambda: 0.5, **kwargs)
+
+
+def test_call_success():
+    sleeps = []
+    f = Mock(side_effect=[ConnectionError('c1'), _http_error(503), 'result'])
+    assert _retrier(sleeps, initial_delay=2).call('f', f, 1, x=2) == 'result'
+    assert f.call_count == 3
+    f.assert_called_with(1, x=2)
+    assert sleeps == [1.0, 2.0]
+
+
+def test_call_max_delay():
+    sleeps = []
+    f = Mock(side_effect=[ConnectionError('c')] * 5 + ['result'])
+    r = _retrier(sleeps, max_retries=5, initial_delay=1, max_delay=5, budget=100)
+    assert r.call('f', f) == 'result'
+    assert sleeps == [0.5, 1.0, 2.0, 2.5, 2.5]
+
+
+def test_call_not_idempotent():
+    sleeps = []
+    f = Mock(side_effect=[_refused(), 'result'])
+    assert _retrier(sleeps).call('f', f, 1, idempotent=False, x=2) == 'result'
+    f.assert_called_with(1, x=2)
+    assert sleeps == [0.5]
+
+    err = ReadTimeout('timeout')
+    f = Mock(side_effect=[err, 'result'])
+    with raises(Exception) as got:
+        _retrier(sleeps).call('f', f, idempotent=False)
+    assert got.value is err
+    assert f.call_count == 1
+
+
+def test_call_no_retry():
+    for err in [ValueError('bad'), ServerError('JSONRPCError', -32500, 'bad')]:
+        sleeps = []
+        f = Mock(side_effect=[err, 'result'])
+        with raises(Exception) as got:
+            _retrier(sleeps).call('f', f)
+        assert got.value is err
+        assert f.call_count == 1
+        assert sleeps == []
+
+
+def test_call_retries_exhausted():
+    sleeps = []
+    errs = [ConnectionError(f'c{i}') for i in range(4)]
+    f = Mock(side_effect=errs)
+    with raises(Exception) as got:
+        _retrier(sleeps, max_retries=3).call('f', f)
+    assert got.value is errs[3]
+    assert sleeps == [0.5, 1.0, 2.0]
+
+    f = Mock(side_effect=[ConnectionError('c')])
+    with raises(Exception) as got:
+        _retrier(sleeps, max_retries=0).call('f', f)
+    assert f.call_count == 1
+
+
+def test_call_budget_exhausted():
+    sleeps = []
+    errs = [ConnectionError(f'c{i}') for i in range(10)]
+    f = Mock(side_effect=errs)
+    with raises(Exception) as got:
+        _retrier(sleeps, max_retries=10, initial_delay=2, budget=6).call('f', f)
+    # the next delay of 4s would exceed the budget
+    assert sleeps == [1.0, 2.0]
+    assert got.value is errs[2]
+
+
+def test_fail_bad_max_retries():
+    with raises(Exception) as got:
+        Retrier(max_retries=-1)
+    assert_exception_correct(got.value, ValueError('max_retries must be >= 0'))
@@ -0,0 +1,195 @@
+'''
+Unit tests for ServiceClient.py.
+'''
+
+import json
+import multiprocessing
+import os
+import threading
+from http.client import HTTPMessage
+from unittest.mock import patch
+
+import requests
+from pytest import raises
+from requests.cookies import MockRequest, MockResponse
+
+from AssemblyUtil import ServiceClient
+from AssemblyUtil.ContigTable import ContigTable
+from AssemblyUtil.ServiceClient import (
+    SessionClient, _get_session, _json_body_chunks, _request_body, set_pool_size,
+    use_shared_session
+)
+from installed_clients.DataFileUtilClient import DataFileUtil
+from installed_clients.baseclient import _JSONObjectEncoder
+from conftest import assert_exception_correct
+
+
+def _contig(contig_id, length):
+    return {'contig_id': contig_id, 'name': contig_id, 'description': 'd', 'length': length,
+            'md5': '0' * 32, 'gc_content': 0.5}
+
+
+def _table(count):
+    t = ContigTable()
+    for i in range(count):
+        t.add(f'c{i}', _contig(f'c{i}', i))
+    return t
+
+
+def test_json_body_chunks_matches_dumps():
+    contigs = {f'c{i}': _contig(f'c{i}', i) for i in range(250)}
+    testcases = [
+        {},
+        [],
+        'foo',
+        {'a': 1, 'b': [1, 2.5, None, True], 'c': {'d': 'é\n"'}},
+        {'params': [{'objects': [{'data': {'contigs': contigs, 'dna_size': 3}}] * 3}]},
+        {'ints': list(range(1000)), 'tup': (1, (2, 3)), 'set': {4}, 1: 'x', None: [{}]},
+        {f'k{i}': [i, {i: 'nonstrkey'}] for i in range(150)},
+    ]
+    for obj in testcases:
+        got = b''.join(_json_body_chunks(obj, chunk_size=100))
+        assert got == json.dumps(obj, cls=_JSONObjectEncoder).encode('utf-8')
+
+
+def test_json_body_chunks_contig_table():
+    table = _table(300)
+    obj = {'params': [{'objects': [{'data': {'contigs': table}}]}]}
+    expected = json.dumps({'params': [{'objects': [{'data': {'contigs': table.to_dict()}}]}]})
+    chunks = list(_json_body_chunks(obj, chunk_size=1000))
+    assert len(chunks) > 10
+    assert all(len(c) < 2000 for c in chunks)
+    assert b''.join(chunks) == expected.encode('utf-8')
+
+
+def test_request_body_small():
+    assert _request_body({'a': [1, 2]}) == b'{"a": [1, 2]}'
+
+
+def test_request_body_large():
+    obj = {'contigs': _table(30000)}
+    body = _request_body(obj)
+    assert not isinstance(body, bytes)
+    expected = json.dumps(obj['contigs'].to_dict()).join(
+        ['{"contigs": ', '}']).encode('utf-8')
+    assert len(body) == len(expected)
+    assert b''.join(body) == expected
+    # the body can be sent again
+    assert b''.join(body) == expected
+
+
+def test_request_body_encodes_once():
+    obj = {'contigs': _table(30000)}
+    with patch.object(ServiceClient, '_json_body_chunks',
+                      wraps=ServiceClient._json_body_chunks) as chunks:
+        body = _request_body(obj)
+        b''.join(body)
+        b''.join(body)
+    assert chunks.call_count == 1
+
+
+def test_use_shared_session():
+    dfu = DataFileUtil('https://ci.kbase.us/services/fake', token='tok')
+    assert use_shared_session(dfu) is dfu
+    assert type(dfu._client) is SessionClient
+    assert dfu._client.url == 'https://ci.kbase.us/services/fake'
+    assert dfu._client._headers == {'AUTHORIZATION': 'tok'}
+    with patch.object(_get_session(), 'post') as post:
+        post.return_value.status_code = 200
+        post.return_value.headers = {'content-type': 'application/json'}
+        post.return_value.json.return_value = {'result': [{'x': 1}]}
+        assert dfu._client.call_method('Svc.meth', [{'contigs': _table(2)}]) == {'x': 1}
+    sent = json.loads(post.call_args[1]['data'])
+    assert sent['params'] == [{'contigs': _table(2).to_dict()}]
+
+
+def test_call_streams_large_body():
+    bc = SessionClient('https://ci.kbase.us/services/fake', token='tok')
+    params = {'contigs': _table(30000)}
+    with patch.object(_get_session(), 'post') as post:
+        post.return_value.status_code = 200
+        post.return_value.headers = {'content-type': 'application/json'}
+        post.return_value.json.return_value = {'result': [{'x': 1}]}
+        assert bc.call_method('Svc.meth', [params]) == {'x': 1}
+    body = post.call_args[1]['data']
+    sent = json.loads(b''.join(body))
+    assert sent['method'] == 'Svc.meth'
+    assert sent['params'] == [{'contigs': params['contigs'].to_dict()}]
+
+
+def test_call_large_body_content_length():
+    # SDK servers read the body based on the Content-Length header, so it must not be sent with
+    # chunked transfer encoding
+    bc = SessionClient('https://ci.kbase.us/services/fake', token='tok')
+    params = {'contigs': _table(30000)}
+    sent = {}
+
+    def send(request, **kwargs):
+        sent['headers'] = dict(request.headers)
+        sent['body'] = b''.join(request.body)
+        raise ConnectionError('stop')
+    with patch.object(_get_session().get_adapter('https://'), 'send', side_effect=send):
+        with raises(ConnectionError):
+            bc.call_method('Svc.meth', [params])
+    assert 'Transfer-Encoding' not in sent['headers']
+    assert int(sent['headers']['Content-Length']) == len(sent['body'])
+    assert json.loads(sent['body'])['params'] == [{'contigs': params['contigs'].to_dict()}]
+
+
+def _session_info(_):
+    _get_session()
+    return os.getpid(), ServiceClient._session_pid
+
+
+def test_session_shared():
+    s = _get_session()
+    assert _get_session() is s
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(_get_session())) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(g is s for g in got)
+    assert s.get_adapter('http://foo').poolmanager.connection_pool_kw['maxsize'] == 10
+
+
+def test_session_rejects_cookies():
+    msg = HTTPMessage()
+    msg['Set-Cookie'] = 'session=user1; Path=/'
+    req = requests.Request('POST', 'https://ci.kbase.us/services/a').prepare()
+    # a default cookie jar keeps the cookie
+    jar = requests.cookies.RequestsCookieJar()
+    jar.extract_cookies(MockResponse(msg), MockRequest(req))
+    assert len(jar) == 1
+    session = _get_session()
+    session.cookies.extract_cookies(MockResponse(msg), MockRequest(req))
+    assert len(session.cookies) == 0
+
+
+def test_session_new_after_fork():
+    parent = _get_session()
+    with multiprocessing.get_context('fork').Pool(2) as p:
+        got = p.map(_session_info, range(4))
+    for pid, session_pid in got:
+        assert pid != os.getpid()
+        assert session_pid == pid
+    assert parent is _get_session()
+
+
+def test_set_pool_size():
+    s = _get_session()
+    try:
+        set_pool_size(3)
+        s2 = _get_session()
+        assert s2 is not s
+        assert s2.get_adapter('https://foo').poolmanager.connection_pool_kw['maxsize'] == 3
+    finally:
+        set_pool_size(10)
+
+
+def test_set_pool_size_fail():
+    for size in [0, -1]:
+        with raises(Exception) as got:
+            set_pool_size(size)
+        assert_exception_correct(got.value, ValueError('pool_size must be at least 1'))
@@ -0,0 +1,104 @@
+'''
+Unit tests for UploadCache.py.
+'''
+
+import os
+from hashlib import md5
+from unittest.mock import patch
+
+from AssemblyUtil.UploadCache import UploadCache
+from conftest import assert_exception_correct
+from pytest import raises
+
+
+def test_get_put(tmp_path):
+    f = tmp_path / 'in.fa'
+    f.write_text('>c1 desc\nACGT\n')
+    cache = UploadCache(tmp_path / 'cache', 'tok')
+    assert cache.get(f, 'md5_1') is None
+    cache.put(f, 'md5_1', {'shock_id': 'n1', 'handle': {'hid': 'KBH_1'}})
+    assert cache.get(f, 'md5_1') == {'shock_id': 'n1', 'handle': {'hid': 'KBH_1'}}
+
+    # an identical file elsewhere
+    f2 = tmp_path / 'in2.fa'
+    f2.write_bytes(f.read_bytes())
+    assert cache.get(f2, 'md5_1') == {'shock_id': 'n1', 'handle': {'hid': 'KBH_1'}}
+    # a different assembly md5
+    assert cache.get(f2, 'md5_2') is None
+    # a gzipped upload
+    assert cache.get(f2, 'md5_1', gzipped=True) is None
+    cache.put(f2, 'md5_1', {'shock_id': 'n2'}, gzipped=True)
+    assert cache.get(f2, 'md5_1', gzipped=True) == {'shock_id': 'n2'}
+    assert cache.get(f2, 'md5_1') == {'shock_id': 'n1', 'handle': {'hid': 'KBH_1'}}
+    # a different token
+    assert UploadCache(tmp_path / 'cache', 'tok2').get(f2, 'md5_1') is None
+    assert UploadCache(tmp_path / 'cache').get(f2, 'md5_1') is None
+    # a different header with the same size and sequences
+    f2.write_text('>c1 dosc\nACGT\n')
+    assert cache.get(f2, 'md5_1') is None
+    # a different size
+    f2.write_text('>c1 desc\nACGT\n\n')
+    assert cache.get(f2, 'md5_1') is None
+    assert 'tok' not in ''.join(p.read_text() for p in (tmp_path / 'cache').iterdir())
+
+
+def test_put_replaces(tmp_path):
+    f = tmp_path / 'in.fa'
+    f.write_text('>c1\nACGT\n')
+    cache = UploadCache(tmp_path / 'cache', 'tok')
+    cache.put(f, 'md5_1', {'shock_id': 'n1'})
+    cache.put(f, 'md5_1', {'shock_id': 'n2'})
+    assert cache.get(f, 'md5_1') == {'shock_id': 'n2'}
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
+
+
+def test_same_sequences(tmp_path):
+    f1 = tmp_path / 'in1.fa'
+    f1.write_text('>c1\nACGT\n')
+    f2 = tmp_path / 'in2.fa'
+    f2.write_text('>c2\nACGT\n')
+    cache = UploadCache(tmp_path / 'cache', 'tok')
+    cache.put(f1, 'md5_1', {'shock_id': 'n1'})
+    cache.put(f2, 'md5_1', {'shock_id': 'n2'})
+    assert cache.get(f1, 'md5_1') == {'shock_id': 'n1'}
+    assert cache.get(f2, 'md5_1') == {'shock_id': 'n2'}
+
+
+def test_put_uses_upload_md5(tmp_path):
+    f = tmp_path / 'in.fa'
+    f.write_text('>c1\nACGT\n')
+    cache = UploadCache(tmp_path / 'cache', 'tok')
+    file_md5 = md5(f.read_bytes()).hexdigest()
+    with patch('AssemblyUtil.UploadCache._file_md5', side_effect=AssertionError('hashed')):
+        cache.put(f, 'md5_1', {'shock_id': 'n1', 'handle': {'remote_md5': file_md5.upper()}})
+    assert cache.get(f, 'md5_1') == {'shock_id': 'n1', 'handle': {'remote_md5': file_md5.upper()}}
+    # the file is hashed if the handle has no usable md5
+    for handle in ({}, {'handle': {}}, {'handle': {'remote_md5': 'fake'}}):
+        cache.put(f, 'md5_2', dict(handle, shock_id='n2'))
+        assert cache.get(f, 'md5_2') == dict(handle, shock_id='n2')
+
+
+def test_eviction(tmp_path):
+    cache = UploadCache(tmp_path / 'cache', 'tok', max_entries=2)
+    files = []
+    for i in range(3):
+        files.append(tmp_path / f'in{i}.fa')
+        files[i].write_text(f'>c{i}\nACGT\n')
+    cache.put(files[0], 'md5_0', {'shock_id': 'n0'})
+    cache.put(files[1], 'md5_1', {'shock_id': 'n1'})
+    os.utime(cache._entry_path(files[0], 'md5_0', False), (1000, 1000))
+    os.utime(cache._entry_path(files[1], 'md5_1', False), (2000, 2000))
+    # rewriting the oldest entry makes it the newest
+    cache.put(files[0], 'md5_0', {'shock_id': 'again'})
+    assert len(list((tmp_path / 'cache').iterdir())) == 2
+    cache.put(files[2], 'md5_2', {'shock_id': 'n2'})
+    assert len(list((tmp_path / 'cache').iterdir())) == 2
+    assert cache.get(files[0], 'md5_0') == {'shock_id': 'again'}
+    assert cache.get(files[1], 'md5_1') is None
+    assert cache.get(files[2], 'md5_2') == {'shock_id': 'n2'}
+
+
+def test_fail_max_entries(tmp_path):
+    with raises(Exception) as got:
+        UploadCache(tmp_path / 'cache', 'tok', max_entries=0)
+    assert_exception_correct(got.value, ValueError('max_entries must be at least 1'))
@@ -0,0 +1,128 @@
+'''
+Unit tests for WorkerPlan.py.
+'''
+
+import os
+
+from AssemblyUtil.WorkerPlan import (
+    UNKNOWN_INPUT_SIZE,
+    WORKER_BASE_MEMORY,
+    available_cpus,
+    available_memory,
+    cgroup_cpu_limit,
+    cgroup_memory_available,
+    estimate_input_memory,
+    max_workers,
+    plan_workers,
+    system_memory_available,
+)
+
+_MB = 1024 * 1024
+_TB = 1024 * 1024 * _MB
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_cgroup_v2(tmp_path):
+    _write(tmp_path / 'cpu.max', '250000 100000\n')
+    _write(tmp_path / 'memory.max', str(4096 * _MB) + '\n')
+    _write(tmp_path / 'memory.current', str(1024 * _MB) + '\n')
+    assert cgroup_cpu_limit(tmp_path) == 2.5
+    assert cgroup_memory_available(tmp_path) == 3072 * _MB
+    _write(tmp_path / 'cpu.max', 'max 100000\n')
+    _write(tmp_path / 'memory.max', 'max\n')
+    assert cgroup_cpu_limit(tmp_path) is None
+    assert cgroup_memory_available(tmp_path) is None
+
+
+def test_cgroup_v1(tmp_path):
+    _write(tmp_path / 'cpu' / 'cpu.cfs_quota_us', '150000\n')
+    _write(tmp_path / 'cpu' / 'cpu.cfs_period_us', '100000\n')
+    _write(tmp_path / 'memory' / 'memory.limit_in_bytes', str(2048 * _MB) + '\n')
+    _write(tmp_path / 'memory' / 'memory.usage_in_bytes', str(3000 * _MB) + '\n')
+    assert cgroup_cpu_limit(tmp_path) == 1.5
+    assert cgroup_memory_available(tmp_path) == 0
+    _write(tmp_path / 'cpu' / 'cpu.cfs_quota_us', '-1\n')
+    _write(tmp_path / 'memory' / 'memory.limit_in_bytes', '9223372036854771712\n')
+    assert cgroup_cpu_limit(tmp_path) is None
+    assert cgroup_memory_available(tmp_path) is None
+
+
+def test_no_cgroup(tmp_path):
+    assert cgroup_cpu_limit(tmp_path) is None
+    assert cgroup_memory_available(tmp_path) is None
+    assert available_cpus(tmp_path) == len(os.sched_getaffinity(0))
+
+
+def test_available_memory(tmp_path):
+    meminfo = tmp_path / 'meminfo'
+    _write(meminfo, 'MemTotal:       16000000 kB\nMemAvailable:    8000000 kB\n')
+    cgroup = tmp_path / 'cgroup'
+    cgroup.mkdir()
+    assert system_memory_available(meminfo) == 8000000 * 1024
+    assert available_memory(cgroup, meminfo) == 8000000 * 1024
+    _write(cgroup / 'memory.max', str(1024 * _MB))
+    assert available_memory(cgroup, meminfo) == 1024 * _MB
+    assert system_memory_available(tmp_path / 'missing') is None
+    assert available_memory(cgroup, tmp_path / 'missing') == 1024 * _MB
+    assert available_memory(tmp_path / 'missing', tmp_path / 'missing') is None
+
+
+def test_max_workers():
+    assert max_workers(1.25, 10, cpus=4) == 5
+    assert max_workers(1.25, 3, cpus=4) == 3
+    assert max_workers(0.1, 10, cpus=2.5) == 1
+    assert max_workers(1, 0, cpus=4) == 1
+    assert max_workers(1, 1000) == max(int(available_cpus()), 1)
+
+
+def test_plan_workers_cpu_and_ceilings():
+    sizes = [10 * _MB] * 20
+    assert plan_workers(1, 10, sizes, cpus=4, memory=_TB).workers == 4
+    assert plan_workers(2.5, 10, sizes, cpus=2.5, memory=_TB).workers == 6
+    assert plan_workers(1, 3, sizes, cpus=8, memory=_TB).workers == 3
+    assert plan_workers(1, 10, sizes[:2], cpus=8, memory=_TB).workers == 2
+    assert plan_workers(0.1, 10, sizes, cpus=2, memory=_TB).workers == 1
+    # the system's resources are used if not provided
+    plan = plan_workers(1, 100, sizes)
+    assert plan.cpus == available_cpus()
+    assert 1 <= plan.workers <= 20
+
+
+def test_plan_workers_memory():
+    # the largest inputs must fit in memory together
+    sizes = [4000 * _MB, 10 * _MB, 400 * _MB, 10 * _MB, 10 * _MB]
+    memory = 2000 * _MB
+    plan = plan_workers(1, 10, sizes, cpus=8, memory=1000 * _MB)
+    assert plan.workers == 1
+    assert plan.memory_workers == 0
+    assert plan.cpu_workers == 8
+    assert plan.peak_memory == estimate_input_memory(4000 * _MB)
+
+    plan = plan_workers(1, 10, sizes[1:], cpus=8, memory=memory)
+    expected = [estimate_input_memory(s) for s in (400 * _MB, 10 * _MB, 10 * _MB, 10 * _MB)]
+    assert sum(expected) < memory * 0.8
+    assert plan.workers == 4
+    plan = plan_workers(1, 10, sizes[1:], cpus=8, memory=4 * WORKER_BASE_MEMORY)
+    assert plan.workers == 2
+    assert plan.peak_memory == sum(expected[:2])
+    assert str(plan) == (
+        'worker plan: 2 workers for 4 inputs. Limits: 8 by 8 CPUs, 2 by 800MB available '
+        + f'memory, MAX_THREADS 10. Estimated peak memory {sum(expected[:2]) / _MB:.0f}MB')
+
+
+def test_plan_workers_unknown_sizes():
+    # inputs of unknown size are assumed to be as large as the largest known input
+    memory = 3 * estimate_input_memory(4 * UNKNOWN_INPUT_SIZE)
+    plan = plan_workers(1, 10, [4 * UNKNOWN_INPUT_SIZE, None, None, 10 * _MB], cpus=8,
+                        memory=memory)
+    assert plan.workers == 2
+    assert plan.peak_memory == 2 * estimate_input_memory(4 * UNKNOWN_INPUT_SIZE)
+
+    # and at least UNKNOWN_INPUT_SIZE
+    plan = plan_workers(1, 10, [None] * 6, cpus=8, memory=memory)
+    assert plan.memory_workers == int(memory * 0.8 // estimate_input_memory(UNKNOWN_INPUT_SIZE))
+    assert plan.peak_memory == plan.workers * estimate_input_memory(UNKNOWN_INPUT_SIZE)
@@ -780,4 +780,5 @@ def test_parallelize_import_fasta_mass_worker_fail(config, impl, context, scratc
     impl = AssemblyUtil(config_dict)
     with raises(Exception) as got:
         impl.save_assemblies_from_fastas(context, params)
-    assert_exception_correct(got.value, ValueError("'Object #2: Illegal character in object name ^%^%: ^'"))
\ No newline at end of file
+    assert_exception_correct(got.value, ValueError(
+        "Error importing assembly ^%^%: 'Object #1: Illegal character in object name ^%^%: ^'"))
\ No newline at end of file